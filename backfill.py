@@ -0,0 +1,24 @@
+#!flask/bin/python
+from sys import argv
+from server import create_app
+from server.common import bulk
+
+# Database and models only, API resources are not needed
+uchan = create_app(resources=False)
+
+help = """
+    Usage: backfill.py seq|pairs
+
+    Fills columns added to existing tables, for rows stored before them:
+        seq     numbers legacy chat messages, and sets sequence number of their chats and inbox entries
+        pairs   sets users pair of legacy chat requests, deleting pending duplicates
+"""
+
+if __name__ == '__main__' and argv[1:] == ['seq']:
+    print('{} chats renumbered'.format(bulk.backfill_chat_sequences()))
+
+elif __name__ == '__main__' and argv[1:] == ['pairs']:
+    print('{0} chat requests updated, {1} duplicates deleted'.format(*bulk.backfill_chat_request_pairs()))
+
+else:
+    print(help)
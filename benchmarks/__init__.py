@@ -0,0 +1,71 @@
+from base64 import b64encode
+# API related imports
+from server import create_app
+from server.models import University
+
+# Headers of every API client request (see BasicEntity.check_headers()), shared by benchmarks and checks
+headers = {
+    'uChan-Client-Type':    'android',
+    'uChan-Client-Version': 'bench',
+    'Accept':               'application/json',
+    'Content-Type':         'application/json'
+}
+
+
+def authorization(token: str):
+    """
+    Returns 'Authorization' header value of a session token.
+
+    :param token: Session token
+    :return: Basic authorization header value
+    """
+    return 'Basic ' + b64encode((token + ':X').encode('utf-8')).decode('utf-8')
+
+
+def authorized(token: str):
+    """
+    Returns client request headers, authorized with a session token.
+
+    :param token: Session token
+    :return: Dictionary of request headers
+    """
+    return dict(headers, Authorization=authorization(token))
+
+
+def get_uchan(config: str):
+    """
+    Returns Uchan application configured for a benchmark.
+    Application is a singleton, configured once per process: benchmarks with different configurations
+    (in-memory MicrobenchmarkConfig, on-disk BenchmarkConfig) run in different processes.
+
+    :param config: Configuration class name
+    :return: Configured Uchan object
+    """
+    return create_app(config)
+
+
+def reset(uchan, universities=(), boards=()):
+    """
+    Wipes benchmark database and seeds its base rows: NONAME university (general boards owner),
+    then the given universities and boards. Flushes, does not commit.
+
+    :param uchan:        Configured Uchan object (see get_uchan())
+    :param universities: University objects
+    :param boards:       Board objects
+    :return: Nothing
+    """
+    db = uchan.db
+    db.drop_all()
+    db.create_all()
+
+    db.session.add(University('NONAME', 'NOCITY', 'NODOMAIN', ''))
+    db.session.flush()
+    db.session.add_all(list(universities))
+    db.session.flush()
+    db.session.add_all(list(boards))
+    db.session.flush()
+
+
+__author__  = 'Danilo Cianfrone'
+__version__ = 'v3.0'
+__doc__     = """Uchan benchmarks, run as modules from repository root (python -m benchmarks.<name>)"""
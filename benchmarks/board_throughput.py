@@ -0,0 +1,103 @@
+#!flask/bin/python
+"""
+Board reads throughput of deployment server, 1 worker process against N (prefork mode).
+
+Needs an activated user session and a board it is subscribed to, then run from repository root:
+    python -m benchmarks.board_throughput <session token> <board id> --workers 1 4
+"""
+import argparse
+import subprocess
+from sys import executable
+from time import time, sleep
+from socket import create_connection
+from multiprocessing import cpu_count
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+from benchmarks import authorized
+
+
+def wait_server(port: int, timeout=30.0):
+    """
+    Waits until server accepts connections.
+
+    :param port:    Server port
+    :param timeout: Max. wait (seconds)
+    :return: Nothing (raises RuntimeError on timeout)
+    """
+    deadline = time() + timeout
+
+    while time() < deadline:
+        try:
+            create_connection(('localhost', port)).close()
+            return
+        except OSError:
+            sleep(0.1)
+
+    raise RuntimeError('Server did not start')
+
+
+def client(port: int, url: str, headers: dict, deadline: float):
+    """
+    Reads board page on a keep-alive connection until deadline.
+
+    :param port:     Server port
+    :param url:      Board URL
+    :param headers:  Request headers
+    :param deadline: Deadline timestamp
+    :return: Number of successful requests
+    """
+    connection, count = HTTPConnection('localhost', port), 0
+
+    while time() < deadline:
+        connection.request('GET', url, headers=headers)
+        response = connection.getresponse()
+        response.read()
+
+        if response.status != 200:
+            raise RuntimeError('Unexpected status {}'.format(response.status))
+
+        count += 1
+
+    connection.close()
+    return count
+
+
+def run(workers: int, options):
+    """
+    Starts deployment server with specified workers and measures board reads throughput.
+
+    :param workers: Worker processes
+    :param options: Command line options
+    :return: Requests per second
+    """
+    server = subprocess.Popen([executable, 'start.py', str(options.port), 'deploy', str(workers)])
+
+    try:
+        wait_server(options.port)
+        sleep(options.warmup)
+
+        headers  = authorized(options.token)
+        deadline = time() + options.duration
+
+        with ThreadPoolExecutor(options.clients) as pool:
+            counts = pool.map(lambda _: client(options.port, '/api/board/{}'.format(options.board), headers,
+                                               deadline), range(options.clients))
+            return sum(counts) / options.duration
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('token', help='Session token')
+    parser.add_argument('board', type=int, help='Board ID')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, cpu_count()], help='Worker counts to compare')
+    parser.add_argument('--clients', type=int, default=32, help='Concurrent keep-alive clients')
+    parser.add_argument('--duration', type=float, default=20.0, help='Seconds per run')
+    parser.add_argument('--warmup', type=float, default=1.0, help='Seconds before measuring')
+    parser.add_argument('--port', type=int, default=5099, help='Server port')
+    options = parser.parse_args()
+
+    for workers in options.workers:
+        print('{0:3d} workers: {1:10.1f} req/s'.format(workers, run(workers, options)))
@@ -0,0 +1,97 @@
+#!flask/bin/python
+"""
+Chat WebSocket load test: opens thousands of idle connections, then measures message fan-out latency.
+
+Start the server in deployment mode, login a chat participant (POST /api/session), then run:
+    python -m benchmarks.chat_idle ws://localhost:5000 <session token> <chat id> --connections 5000
+
+All connections belong to the same user, so every one of them receives each message.
+Raise the open files limit first (ulimit -n) for large connection counts.
+"""
+import argparse
+from time import time
+from statistics import median
+from flask import json
+from tornado import gen
+from tornado.ioloop import IOLoop
+from tornado.httpclient import HTTPRequest
+from tornado.websocket import websocket_connect
+from benchmarks import authorization
+
+
+@gen.coroutine
+def connect(url: str, token: str, count: int, batch: int):
+    """
+    Opens 'count' authorized chat sockets, 'batch' at a time.
+
+    :param url:   ChatSocket URL
+    :param token: Session token
+    :param count: Connections to open
+    :param batch: Connections opened concurrently
+    :return: List of WebSocket client connections
+    """
+    header      = authorization(token)
+    connections = []
+
+    while len(connections) < count:
+        size = min(batch, count - len(connections))
+        connections += yield [websocket_connect(HTTPRequest(url, headers={'Authorization': header}))
+                              for _ in range(size)]
+
+    return connections
+
+
+@gen.coroutine
+def fan_out(connections: list, chat: int, rounds: int):
+    """
+    Sends 'rounds' messages from the first connection, measuring time until every connection received it.
+
+    :param connections: WebSocket client connections
+    :param chat:        Chat ID
+    :param rounds:      Messages sent
+    :return: List of fan-out latencies (seconds)
+    """
+    latencies = []
+
+    for n in range(rounds):
+        start = time()
+        connections[0].write_message(json.dumps({'chat': chat, 'text': 'bench {}'.format(n)}))
+        replies = yield [connection.read_message() for connection in connections]
+
+        if any(reply is None or json.loads(reply)['code'] != 200 for reply in replies):
+            raise RuntimeError('Connection closed or message rejected')
+
+        latencies.append(time() - start)
+
+    return latencies
+
+
+@gen.coroutine
+def main(options):
+    start       = time()
+    connections = yield connect(options.base + '/api/chat/socket', options.token, options.connections,
+                                options.batch)
+    print('{0} connections opened in {1:.2f} s'.format(len(connections), time() - start))
+
+    # Idle period, connections are kept alive by server pings
+    yield gen.sleep(options.idle)
+
+    latencies = sorted((yield fan_out(connections, options.chat, options.rounds)))
+    print('fan-out to {0} sockets: p50 {1:.2f} ms, max {2:.2f} ms'.format(
+        len(connections), median(latencies) * 1000, latencies[-1] * 1000))
+
+    for connection in connections:
+        connection.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('base', help='Server base WebSocket URL (ws://host:port)')
+    parser.add_argument('token', help='Session token of a chat participant')
+    parser.add_argument('chat', type=int, help='Chat ID')
+    parser.add_argument('--connections', type=int, default=5000, help='Idle connections')
+    parser.add_argument('--batch', type=int, default=200, help='Connections opened concurrently')
+    parser.add_argument('--idle', type=float, default=60.0, help='Idle period before sending (seconds)')
+    parser.add_argument('--rounds', type=int, default=20, help='Messages sent')
+
+    IOLoop.current().run_sync(lambda: main(parser.parse_args()))
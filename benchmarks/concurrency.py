@@ -0,0 +1,194 @@
+#!flask/bin/python
+"""
+Concurrency stress test of the WSGI app, served by the deployment thread pool (see server.common.wsgipool).
+
+Seeds the BenchmarkConfig database with N users, each one with an open session and a thread of its own, then
+fires thousands of concurrent requests of random users, mixing reads and writes:
+    me       GET /api/me, must answer with the requesting user
+    threads  GET /api/me/threads, must list the requesting user thread only
+    reply    POST /api/thread/<id> (few shared threads), with a unique text: must answer with that text,
+             authored by the requesting user
+Any response of another user or request (state shared between concurrent requests) or any error fails the run.
+
+Run from repository root (benchmark database is wiped), or as a check of python -m pytest (test_concurrency.py):
+    python -m benchmarks.concurrency --users 200 --requests 5000 --clients 64 --workers 16
+"""
+import argparse
+import logging
+from sys import exit
+from uuid import uuid4
+from json import dumps, loads
+from random import Random
+from asyncio import new_event_loop, set_event_loop
+from threading import Thread as Worker, Event, local
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+from tornado.ioloop import IOLoop
+from tornado.netutil import bind_sockets
+from tornado.httpserver import HTTPServer
+from server.models import University, Board, User, Session, Thread, ThreadUser
+from server.common.routines import hashing_password
+from server.common.wsgipool import PooledWSGIContainer
+from benchmarks import get_uchan, reset, headers, authorization
+
+# Benchmark database is wiped on every seeding
+uchan = get_uchan('config.BenchmarkConfig')
+
+# Operation -> weight
+mix = {'me': 45, 'threads': 35, 'reply': 20}
+
+
+def seed(users: int, shared: int):
+    """
+    Wipes benchmark database, and seeds it with activated users, their sessions and threads.
+
+    :param users:  Number of users
+    :param shared: Number of threads replies are sent to
+    :return: List of (nickname, Authorization header, own thread ID), and list of shared thread IDs
+    """
+    db = uchan.db
+    reset(uchan, [University('Uni', 'City', 'uni.it', '')], [Board('/b/', 'Random', 1)])
+
+    board  = Board.query.filter_by(university=1).first().id
+    salt   = 'stressstressstressst'
+    seeded = [User('stress{}'.format(i), hashing_password(salt, 'Stress1'), salt, 2, 'stress{}'.format(i),
+                   'mf'[i % 2], True, str(uuid4())) for i in range(users)]
+    db.session.add_all(seeded)
+    db.session.flush()
+
+    tokens  = [str(uuid4()) for _ in seeded]
+    threads = [Thread(False, user.nickname, 'Text', 'image.png', board, user.id) for user in seeded]
+    db.session.add_all([Session('127.0.0.1', token, user.id) for user, token in zip(seeded, tokens)])
+    db.session.add_all(threads)
+    db.session.flush()
+    db.session.add_all([ThreadUser(thread.id, thread.author) for thread in threads])
+
+    clients = [(user.nickname, authorization(token), thread.id) for user, token, thread in zip(seeded, tokens, threads)]
+    db.session.commit()
+    db.session.remove()
+
+    return clients, [thread for _, _, thread in clients[:shared]]
+
+
+def serve(workers: int, queue: int):
+    """
+    Serves the WSGI app through PooledWSGIContainer, on a background IOLoop.
+
+    :param workers: WSGI thread pool size
+    :param queue:   Max. WSGI calls waiting for a thread
+    :return: Tuple of (port, IOLoop)
+    """
+    started, loop = Event(), []
+    logging.getLogger('tornado.access').setLevel(logging.ERROR)
+
+    def run():
+        set_event_loop(new_event_loop())
+        sockets = bind_sockets(0, 'localhost')
+        HTTPServer(PooledWSGIContainer(uchan.app, workers, queue)).add_sockets(sockets)
+        loop.append((sockets[0].getsockname()[1], IOLoop.current()))
+        started.set()
+        IOLoop.current().start()
+
+    Worker(target=run, daemon=True).start()
+    started.wait()
+    return loop[0]
+
+
+def check(operation: str, client: tuple, sent: str, status: int, body: bytes):
+    """
+    Checks that a response belongs to its request.
+
+    :param operation: Operation name (see mix)
+    :param client:    Requesting (nickname, Authorization header, own thread ID)
+    :param sent:      Text sent by 'reply' operation
+    :param status:    Response status
+    :param body:      Response body
+    :return: Failure description, or None
+    """
+    nickname, _, thread = client
+
+    if status not in [200, 201]:
+        return 'status {}'.format(status)
+
+    data = loads(body.decode('utf-8'))['data']
+
+    if operation == 'me' and data['nickname'] != nickname:
+        return 'got user {}'.format(data['nickname'])
+    if operation == 'threads' and [item['id'] for item in data] != [thread]:
+        return 'got threads {}'.format([item['id'] for item in data])
+    if operation == 'reply' and (data['text'] != sent or data['author'].get('nickname') != nickname):
+        return 'got post {0!r} by {1}'.format(data['text'], data['author'].get('nickname'))
+
+    return None
+
+
+def stress(port: int, clients: list, shared: list, options):
+    """
+    Fires concurrent requests of random users.
+
+    :param port:    Server port
+    :param clients: Seeded (nickname, Authorization header, own thread ID)
+    :param shared:  Thread IDs replies are sent to
+    :param options: Command line options
+    :return: Counter of outcomes, by operation
+    """
+    rng, state = Random(options.seed), local()
+    operations = rng.choices(list(mix), weights=list(mix.values()), k=options.requests)
+    requesters = [rng.choice(clients) for _ in operations]
+    targets    = [rng.choice(shared) for _ in operations]
+
+    def request(i: int):
+        if not hasattr(state, 'connection'):
+            state.connection = HTTPConnection('localhost', port, timeout=60)
+
+        operation, client = operations[i], requesters[i]
+        request_headers   = dict(headers, Authorization=client[1])
+        sent = None
+
+        if operation == 'me':
+            state.connection.request('GET', '/api/me', headers=request_headers)
+        elif operation == 'threads':
+            state.connection.request('GET', '/api/me/threads', headers=request_headers)
+        else:
+            sent = '{0} says {1}'.format(client[0], uuid4())
+            state.connection.request('POST', '/api/thread/{}'.format(targets[i]), headers=request_headers,
+                                     body=dumps({'anon': 'false', 'text': sent}))
+
+        response = state.connection.getresponse()
+        failure  = check(operation, client, sent, response.status, response.read())
+
+        if failure is not None:
+            print('{0:>8} of {1}: {2}'.format(operation, client[0], failure))
+
+        return operation, failure is None
+
+    with ThreadPoolExecutor(options.clients) as pool:
+        return Counter(pool.map(request, range(options.requests)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200, help='Seeded users')
+    parser.add_argument('--shared', type=int, default=4, help='Threads replies are sent to')
+    parser.add_argument('--requests', type=int, default=5000, help='Total requests')
+    parser.add_argument('--clients', type=int, default=64, help='Concurrent keep-alive clients')
+    parser.add_argument('--workers', type=int, default=16, help='WSGI thread pool size')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed')
+    options = parser.parse_args()
+
+    with uchan.app.app_context():
+        clients, shared = seed(options.users, options.shared)
+
+    port, loop = serve(options.workers, options.requests)
+    outcomes   = stress(port, clients, shared, options)
+    loop.add_callback(loop.stop)
+    failures   = 0
+
+    for operation in mix:
+        ok, failed = outcomes[(operation, True)], outcomes[(operation, False)]
+        failures  += failed
+        print('{0:>8}: {1:6d} ok {2:6d} failed'.format(operation, ok, failed))
+
+    # Non-zero exit status on failures, to gate merges
+    exit(1 if failures else 0)
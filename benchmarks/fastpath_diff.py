@@ -0,0 +1,148 @@
+#!flask/bin/python
+"""
+Differential test of the fast path (see server.api.fastpath): board and thread pages served by the native Tornado
+handlers must be the same responses of the Flask-RESTful resources (status, headers and body, byte-for-byte).
+
+Runs on the in-memory fixture of benchmarks.queries: every case is requested through the Flask app and through
+FastPathHandler, and responses are compared. Headers set by the HTTP server itself (Date, Server, Connection)
+are ignored.
+
+Run from repository root, or as a check of python -m pytest (test_fastpath_diff.py):
+    python -m benchmarks.fastpath_diff
+"""
+import argparse
+import logging
+from sys import exit
+from asyncio import new_event_loop, set_event_loop
+from threading import Thread, Event
+from http.client import HTTPConnection
+from tornado.ioloop import IOLoop
+from tornado.netutil import bind_sockets
+from tornado.httpserver import HTTPServer
+from tornado.web import Application
+from tornado.wsgi import WSGIContainer
+from server.api import fastpath
+from benchmarks import authorization
+from benchmarks.queries import uchan, fixture, headers
+
+# Headers of the HTTP server, not of the application
+ignored = {'date', 'server', 'connection'}
+
+# Label -> (URL, formatted with fixture IDs, request headers)
+cases = {
+    'board':             ('/api/board/{board}', headers),
+    'board page':        ('/api/board/{board}/2', headers),
+    'thread':            ('/api/thread/{thread}', headers),
+    'thread page':       ('/api/thread/{thread}/2', headers),
+    'missing board':     ('/api/board/999999', headers),
+    'missing thread':    ('/api/thread/999999', headers),
+    'wrong headers':     ('/api/board/{board}', dict(headers, Accept='text/html')),
+    'no authorization':  ('/api/thread/{thread}', {name: value for name, value in headers.items()
+                                                   if name != 'Authorization'}),
+    'wrong session':     ('/api/board/{board}', dict(headers, Authorization=authorization('no-session')))
+}
+
+
+def serve():
+    """
+    Serves the fast path handlers, as deployment_application() does with FASTPATH set, on a background IOLoop.
+
+    :return: Tuple of (port, IOLoop)
+    """
+    started, loop = Event(), []
+    logging.getLogger('tornado.access').setLevel(logging.ERROR)
+
+    def run():
+        set_event_loop(new_event_loop())
+        sockets = bind_sockets(0, 'localhost')
+        HTTPServer(Application(fastpath.handlers(WSGIContainer(uchan.app)))).add_sockets(sockets)
+        loop.append((sockets[0].getsockname()[1], IOLoop.current()))
+        started.set()
+        IOLoop.current().start()
+
+    Thread(target=run, daemon=True).start()
+    started.wait()
+    return loop[0]
+
+
+def compare(flask: tuple, fast: tuple):
+    """
+    Compares a Flask response with a fast path one.
+
+    :param flask: Tuple of (status, headers list, body) of Flask response
+    :param fast:  Tuple of (status, headers list, body) of fast path response
+    :return: List of differences
+    """
+    differences = []
+
+    if flask[0] != fast[0]:
+        differences.append('status {0} != {1}'.format(flask[0], fast[0]))
+
+    flask_headers = sorted((name.lower(), value) for name, value in flask[1] if name.lower() not in ignored)
+    fast_headers  = sorted((name.lower(), value) for name, value in fast[1] if name.lower() not in ignored)
+
+    for name, value in sorted(set(flask_headers) ^ set(fast_headers)):
+        differences.append('{0}: {1!r} only {2}'.format(name, value, 'flask' if (name, value) in flask_headers
+                                                        else 'fast path'))
+
+    if flask[2] != fast[2]:
+        differences.append('body differs ({0} != {1} bytes)'.format(len(flask[2]), len(fast[2])))
+
+    return differences
+
+
+def request(client, port: int, url: str, request_headers: dict):
+    """
+    Requests a URL through the Flask app and through the fast path.
+
+    :param client:          Flask test client
+    :param port:            Fast path port (see serve())
+    :param url:             Request URL
+    :param request_headers: Request headers
+    :return: Tuple of (Flask response, fast path response), each one a tuple of (status, headers list, body)
+    """
+    response = client.get(url, headers=request_headers)
+    flask    = response.status_code, list(response.headers.items()), response.get_data()
+
+    connection = HTTPConnection('localhost', port)
+    connection.request('GET', url, headers=request_headers)
+    answer = connection.getresponse()
+    fast   = answer.status, answer.getheaders(), answer.read()
+    connection.close()
+
+    return flask, fast
+
+
+def run(size: int):
+    """
+    Runs every case on a fixture of the given size, printing differences.
+
+    :param size: Fixture size (see benchmarks.queries.fixture())
+    :return: Number of failed cases
+    """
+    with uchan.app.app_context():
+        ids = fixture(size)
+
+    client     = uchan.app.test_client()
+    port, loop = serve()
+    failed     = 0
+
+    try:
+        for label, (url, request_headers) in cases.items():
+            flask, fast = request(client, port, url.format(**ids), request_headers)
+            differences = compare(flask, fast)
+            failed     += len(differences) > 0
+            print('{0:>18}: {1} {2}'.format(label, flask[0], '; '.join(differences) + ' FAIL' if differences else 'ok'))
+    finally:
+        loop.add_callback(loop.stop)
+
+    return failed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=25, help='Items per page of the fixture')
+    options = parser.parse_args()
+
+    # Non-zero exit status on failures, to gate merges
+    exit(1 if run(options.size) else 0)
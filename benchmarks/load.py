@@ -0,0 +1,517 @@
+#!flask/bin/python
+"""
+End-to-end load benchmark of the WSGI app, on a synthetic dataset.
+
+Seeds the BenchmarkConfig database (universities from universities.json, general boards from boards.json,
+then N users, threads, posts and chats), and drives the WSGI app through registration, login, board browsing,
+thread reading, posting with images and chat flows, from concurrent clients.
+Throughput and p50/p99 latency of each endpoint are printed and stored as JSON, so that runs can be compared.
+
+Run from repository root:
+    python -m benchmarks.load --users 500 --threads 2000 --posts 20000 --chats 300 --output before.json
+    python -m benchmarks.load --compare before.json after.json
+"""
+import argparse
+import platform
+from io import BytesIO
+from os import path, makedirs, urandom
+from time import perf_counter, strftime
+from uuid import uuid4
+from json import load, dump
+from random import Random
+from base64 import b64encode
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+from server.models import University, Board, User, Session, Thread, ThreadUser, Post, Chat, ChatInbox
+from server.common.routines import hashing_password
+from benchmarks import get_uchan, reset, headers, authorization
+
+# Benchmark database and media folders are wiped on every seeding
+uchan = get_uchan('config.BenchmarkConfig')
+
+# Password of every seeded user
+password = 'Benchmark1'
+
+words = ('lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore et '
+         'dolore magna aliqua exam lecture campus library professor thesis party coffee deadline').split()
+
+# Operation -> weight, in the default mix
+mix = {
+    'browse': 30, 'read': 25, 'media': 10, 'reply': 10, 'me': 5, 'login': 5, 'inbox': 4, 'chat': 4,
+    'thread': 3, 'register': 2, 'request_chat': 2
+}
+
+
+def sentence(rng: Random, length: int):
+    """
+    Returns random text.
+
+    :param rng:    Random generator
+    :param length: Number of words
+    :return: Random text
+    """
+    return ' '.join(rng.choice(words) for _ in range(length))
+
+
+def image(size: int):
+    """
+    Returns a noise PNG image (incompressible, as photos are).
+
+    :param size: Image side (pixels)
+    :return: PNG image bytes
+    """
+    from PIL import Image
+
+    output = BytesIO()
+    Image.frombytes('RGB', (size, size), urandom(size * size * 3)).save(output, 'PNG')
+    return output.getvalue()
+
+
+def seed(options, rng: Random):
+    """
+    Wipes benchmark database and media, and seeds them with a synthetic dataset.
+
+    :param options: Command line options
+    :param rng:     Random generator
+    :return: Nothing
+    """
+    db = uchan.db
+
+    for folder in [uchan.app.config.get('UPLOAD_FOLDER'), uchan.app.config.get('THUMBNAIL_FOLDER')]:
+        makedirs(folder, exist_ok=True)
+
+    with open(path.join(uchan.app.config.get('UPLOAD_FOLDER'), 'seed.png'), 'wb') as file:
+        file.write(image(options.image_size))
+
+    # Universities and general boards, like inject_universities.py and inject_boards.py
+    with open('universities.json', 'r') as file:
+        universities = load(file)
+    with open('boards.json', 'r') as file:
+        boards = load(file)
+
+    reset(uchan, [University(uni['name'], uni['city'], uni['mailDomain'], uni.get('mailSuggestion', ''))
+                  for uni in universities], [Board(board['memo'], board['name'], 1) for board in boards])
+    db.session.commit()
+
+    board_ids = [board.id for board in Board.query.filter_by(university=1)]
+    uni_count = len(universities)
+
+    # Activated users (implicitly subscribed to every general board), with an open session
+    salt  = 'benchmarkbenchmarkbe'
+    users = [User('benchuser{}'.format(i), hashing_password(salt, password), salt, rng.randint(2, uni_count + 1),
+                  'bench{}'.format(i), rng.choice('mf'), True, str(uuid4())) for i in range(options.users)]
+    db.session.add_all(users)
+    db.session.flush()
+
+    for user in users:
+        db.session.add(Session('127.0.0.1', str(uuid4()), user.id))
+
+    db.session.commit()
+    user_ids = [user.id for user in users]
+
+    # Threads, with their author mapping
+    threads = [Thread(rng.random() < 0.5, sentence(rng, 4)[:50], sentence(rng, 30), 'seed.png',
+                      rng.choice(board_ids), rng.choice(user_ids)) for _ in range(options.threads)]
+    db.session.add_all(threads)
+    db.session.flush()
+
+    threadusers = {(thread.id, thread.author) for thread in threads}
+
+    # Posts, with their authors mapping
+    for _ in range(options.posts):
+        thread, author = rng.choice(threads), rng.choice(user_ids)
+
+        db.session.add(Post(False, rng.random() < 0.5, sentence(rng, 15), thread.id, author, thread.board))
+        thread.replies += 1
+        threadusers.add((thread.id, author))
+
+    db.session.add_all([ThreadUser(thread, user) for thread, user in threadusers])
+    db.session.commit()
+
+    # Chats, with some messages each
+    pairs = set()
+    while len(pairs) < min(options.chats, len(user_ids) * (len(user_ids) - 1) // 2):
+        pairs.add(tuple(sorted(rng.sample(user_ids, 2))))
+
+    for user1, user2 in sorted(pairs):
+        chat = Chat(user1, user2)
+        db.session.add(chat)
+        db.session.flush()
+        ChatInbox.add_chat(chat)
+
+        for _ in range(rng.randint(1, 10)):
+            chat.add_message(rng.choice([user1, user2]), sentence(rng, 8))
+
+    db.session.commit()
+
+
+class Client:
+    """
+    Benchmark virtual user: runs random operations of the mix through its own test client.
+    """
+    def __init__(self, state: dict, results: dict, lock: Lock, rng: Random, upload: str):
+        """
+        Construct benchmark client.
+
+        :param state:   Shared dataset state (see load_state())
+        :param results: Shared results, label -> list of (latency, status code)
+        :param lock:    Results and state lock
+        :param rng:     Random generator
+        :param upload:  Base64 encoded image, for posting
+        :return: New Client object
+        """
+        self.client  = uchan.app.test_client()
+        self.state   = state
+        self.results = results
+        self.lock    = lock
+        self.rng     = rng
+        self.upload  = upload
+
+    def request(self, label: str, method: str, url: str, token=None, body=None):
+        """
+        Issues a timed request.
+
+        :param label:  Endpoint label (resource class and method)
+        :param method: HTTP method
+        :param url:    Request URL
+        :param token:  Session token
+        :param body:   JSON body
+        :return: Response status code and JSON body (None if the request failed)
+        """
+        request_headers = dict(headers)
+
+        if token is not None:
+            request_headers['Authorization'] = authorization(token)
+
+        start = perf_counter()
+
+        try:
+            response = self.client.open(url, method=method, headers=request_headers, json=body)
+            code, data = response.status_code, response.get_json(silent=True)
+        except Exception:
+            code, data = 'exception', None
+
+        with self.lock:
+            self.results.setdefault(label, []).append((perf_counter() - start, code))
+
+        return code, data
+
+    def user(self):
+        """
+        Returns a random session.
+
+        :return: (User ID, session token, nickname)
+        """
+        return self.rng.choice(self.state['sessions'])
+
+    def page(self):
+        """
+        Returns a random page, mostly the first one.
+
+        :return: Page number
+        """
+        return 1 if self.rng.random() < 0.8 else self.rng.randint(2, 4)
+
+    def browse(self):
+        """
+        Board page of a general board.
+        """
+        _, token, _ = self.user()
+        self.request('BoardAPI.get', 'GET', '/api/board/{0}/{1}'.format(self.rng.choice(self.state['boards']),
+                                                                        self.page()), token)
+
+    def read(self):
+        """
+        Thread page.
+        """
+        _, token, _ = self.user()
+        self.request('ThreadAPI.get', 'GET', '/api/thread/{0}/{1}'.format(self.rng.choice(self.state['threads']),
+                                                                          self.page()), token)
+
+    def media(self):
+        """
+        Thumbnail of a seeded thread image.
+        """
+        self.request('media', 'GET', '/api/media/seed.png?size=thumb')
+
+    def me(self):
+        """
+        Own profile.
+        """
+        _, token, _ = self.user()
+        self.request('Me.get', 'GET', '/api/me', token)
+
+    def reply(self):
+        """
+        Thread reply, with an image one time out of five.
+        """
+        _, token, _ = self.user()
+        thread = self.rng.choice(self.state['threads'])
+        body   = {'anon': 'true' if self.rng.random() < 0.5 else 'false', 'text': sentence(self.rng, 15)}
+
+        if self.rng.random() < 0.2:
+            body.update({'image': self.upload, 'image_name': 'upload.png'})
+
+        self.request('ThreadAPI.post', 'POST', '/api/thread/{}'.format(thread), token, body)
+
+    def thread(self):
+        """
+        New thread, with image.
+        """
+        _, token, _ = self.user()
+        body = {'anon': 'true', 'title': sentence(self.rng, 4)[:50], 'text': sentence(self.rng, 30),
+                'image': self.upload, 'image_name': 'upload.png'}
+
+        code, data = self.request('BoardAPI.post', 'POST', '/api/board/{}'.format(self.rng.choice(
+            self.state['boards'])), token, body)
+
+        if code == 201:
+            with self.lock:
+                self.state['threads'].append(data['data']['id'])
+
+    def login(self):
+        """
+        Login of a seeded user.
+        """
+        _, _, nickname = self.user()
+        self.request('SessionAPI.post', 'POST', '/api/session', body={'nickname': nickname, 'password': password})
+
+    def register(self):
+        """
+        Registration, activation (token is read from database, instead of email) and first login of a new user.
+        """
+        number   = self.rng.randrange(10 ** 8)
+        nickname = 'newuser{}'.format(number)
+        body     = {'nickname': nickname, 'password': password, 'gender': self.rng.choice('mf'),
+                    'university': self.rng.randint(2, 68), 'deviceId': str(number), 'email': 'new{}'.format(number)}
+
+        code, _ = self.request('Registration.post', 'POST', '/api/registration', body=body)
+
+        if code != 201:
+            return
+
+        with uchan.app.app_context():
+            token = User.query.filter_by(nickname=nickname).first().token
+            uchan.db.session.remove()
+
+        self.request('Activation.get', 'GET', '/api/activation/{}'.format(token))
+        self.request('SessionAPI.post', 'POST', '/api/session', body={'nickname': nickname, 'password': password})
+
+    def inbox(self):
+        """
+        Own chats inbox.
+        """
+        _, token, _ = self.user()
+        self.request('MeChats.get', 'GET', '/api/me/chats', token)
+
+    def chat(self):
+        """
+        Chat delta sync, from a recent sequence number.
+        """
+        if not self.state['chats']:
+            return
+
+        chat, user1, user2 = self.rng.choice(self.state['chats'])
+        token = self.state['tokens'][self.rng.choice([user1, user2])]
+        self.request('ChatAPI.get', 'GET', '/api/chat/{0}/since/{1}'.format(chat, self.rng.randint(0, 5)), token)
+
+    def request_chat(self):
+        """
+        Chat request to a thread participant, listed and accepted by the recipient.
+        """
+        user, token, _ = self.user()
+        threaduser, _, target = self.rng.choice(self.state['threadusers'])
+
+        if target == user:
+            return
+
+        code, _ = self.request('ChatRequestAPI.post', 'POST', '/api/chat/request/{}'.format(threaduser), token)
+
+        if code != 201:
+            return
+
+        target_token = self.state['tokens'][target]
+        code, data = self.request('ChatRequestAPI.get', 'GET', '/api/chat/request', target_token)
+
+        for request in (data or {}).get('data', []):
+            if request['from']['id'] == user:
+                self.request('AcceptChatAPI.post', 'POST', '/api/chat/accept/{}'.format(request['id']), target_token)
+
+    def run(self, iterations: int):
+        """
+        Runs random operations of the mix.
+
+        :param iterations: Operations to run
+        :return: Nothing
+        """
+        names   = sorted(mix)
+        weights = [mix[name] for name in names]
+
+        for name in self.rng.choices(names, weights, k=iterations):
+            getattr(self, name)()
+
+
+def load_state():
+    """
+    Loads dataset state needed by benchmark clients.
+
+    :return: State dictionary
+    """
+    with uchan.app.app_context():
+        sessions = [tuple(row) for row in uchan.db.session.query(Session.user, Session.token, User.nickname)
+                    .join(User, User.id == Session.user).order_by(Session.id)]
+        state = {
+            'sessions':    sessions,
+            'tokens':      {user: token for user, token, _ in sessions},
+            'boards':      [board.id for board in Board.query.filter_by(university=1)],
+            'threads':     [thread for thread, in uchan.db.session.query(Thread.id)],
+            'threadusers': [tuple(row) for row in uchan.db.session.query(ThreadUser.id, ThreadUser.thread,
+                                                                          ThreadUser.user)],
+            'chats':       [tuple(row) for row in uchan.db.session.query(Chat.id, Chat.user1, Chat.user2)]
+        }
+        uchan.db.session.remove()
+
+    return state
+
+
+def percentile(latencies: list, q: float):
+    """
+    Nearest-rank percentile.
+
+    :param latencies: Sorted latencies
+    :param q:         Percentile (0-100)
+    :return: Percentile value
+    """
+    return latencies[min(len(latencies) - 1, max(0, int(round(q / 100 * len(latencies) + 0.5)) - 1))]
+
+
+def summarize(results: dict, elapsed: float):
+    """
+    Computes throughput and latency percentiles of each endpoint.
+
+    :param results: Label -> list of (latency, status code)
+    :param elapsed: Run wall clock time (seconds)
+    :return: Label -> summary dictionary
+    """
+    summary = {}
+
+    for label, samples in sorted(results.items()):
+        latencies = sorted(latency for latency, _ in samples)
+        codes     = {}
+        for _, code in samples:
+            codes[str(code)] = codes.get(str(code), 0) + 1
+
+        summary[label] = {
+            'requests':   len(samples),
+            'throughput': len(samples) / elapsed,
+            'p50_ms':     percentile(latencies, 50) * 1000,
+            'p99_ms':     percentile(latencies, 99) * 1000,
+            'mean_ms':    sum(latencies) / len(latencies) * 1000,
+            'errors':     sum(count for code, count in codes.items() if not code.isdigit() or int(code) >= 500),
+            'codes':      codes
+        }
+
+    return summary
+
+
+def report(summary: dict):
+    """
+    Prints endpoints summary.
+
+    :param summary: Label -> summary dictionary (see summarize())
+    :return: Nothing
+    """
+    print('{0:>20} {1:>8} {2:>10} {3:>10} {4:>10} {5:>7}  codes'.format('endpoint', 'requests', 'req/s', 'p50 ms',
+                                                                      'p99 ms', 'errors'))
+    for label, item in summary.items():
+        print('{0:>20} {1:8d} {2:10.1f} {3:10.2f} {4:10.2f} {5:7d}  {6}'.format(
+            label, item['requests'], item['throughput'], item['p50_ms'], item['p99_ms'], item['errors'],
+            ' '.join('{0}:{1}'.format(code, count) for code, count in sorted(item['codes'].items()))))
+
+
+def compare(before: str, after: str):
+    """
+    Prints throughput and latency changes between two stored runs.
+
+    :param before: Baseline results file
+    :param after:  New results file
+    :return: Nothing
+    """
+    with open(before, 'r') as file:
+        old = load(file)['endpoints']
+    with open(after, 'r') as file:
+        new = load(file)['endpoints']
+
+    print('{0:>20} {1:>18} {2:>18} {3:>18}'.format('endpoint', 'req/s', 'p50 ms', 'p99 ms'))
+
+    for label in sorted(set(old) & set(new)):
+        changes = []
+        for key in ['throughput', 'p50_ms', 'p99_ms']:
+            changes.append('{0:8.2f} ({1:+6.1f}%)'.format(new[label][key],
+                                                         (new[label][key] / old[label][key] - 1) * 100))
+        print('{0:>20} {1} {2} {3}'.format(label, *changes))
+
+
+def main(options):
+    """
+    Seeds dataset (unless --no-seed), runs benchmark clients and reports results.
+
+    :param options: Command line options
+    :return: Nothing
+    """
+    rng = Random(options.seed)
+
+    if not options.no_seed:
+        start = perf_counter()
+        with uchan.app.app_context():
+            seed(options, rng)
+            uchan.db.session.remove()
+        print('Seeded dataset in {:.1f} s'.format(perf_counter() - start))
+
+    state   = load_state()
+    upload  = b64encode(image(options.image_size)).decode('utf-8')
+    results = {}
+    lock    = Lock()
+    clients = [Client(state, results, lock, Random(options.seed + i + 1), upload) for i in range(options.clients)]
+
+    start = perf_counter()
+    with ThreadPoolExecutor(options.clients) as pool:
+        list(pool.map(lambda client: client.run(options.iterations // options.clients), clients))
+    elapsed = perf_counter() - start
+
+    summary = summarize(results, elapsed)
+    total   = sum(item['requests'] for item in summary.values())
+    report(summary)
+    print('{0} requests in {1:.1f} s: {2:.1f} req/s'.format(total, elapsed, total / elapsed))
+
+    if options.output is not None:
+        with open(options.output, 'w') as file:
+            dump({
+                'time':      strftime('%Y-%m-%dT%H:%M:%S'),
+                'python':    platform.python_version(),
+                'dataset':   {key: getattr(options, key) for key in ['users', 'threads', 'posts', 'chats', 'seed']},
+                'run':       {'clients': options.clients, 'iterations': options.iterations, 'elapsed': elapsed,
+                              'requests': total, 'throughput': total / elapsed},
+                'endpoints': summary
+            }, file, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200, help='Seeded users')
+    parser.add_argument('--threads', type=int, default=500, help='Seeded threads')
+    parser.add_argument('--posts', type=int, default=5000, help='Seeded posts')
+    parser.add_argument('--chats', type=int, default=100, help='Seeded chats')
+    parser.add_argument('--no-seed', action='store_true', help='Reuse dataset of a previous run')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed (dataset and operations)')
+    parser.add_argument('--clients', type=int, default=4, help='Concurrent clients (threads)')
+    parser.add_argument('--iterations', type=int, default=2000, help='Operations, split among clients')
+    parser.add_argument('--image-size', type=int, default=256, help='Side of seeded and uploaded images (pixels)')
+    parser.add_argument('--output', help='Results JSON file')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='Compare two results files')
+    options = parser.parse_args()
+
+    if options.compare is not None:
+        compare(*options.compare)
+    else:
+        main(options)
@@ -0,0 +1,113 @@
+#!flask/bin/python
+"""
+API latency while large media downloads are running.
+
+Start the server (start.py for Flask builtin server, or deployment mode), then run:
+    python -m benchmarks.media_latency http://localhost:5000 --downloads 20 --size 4
+"""
+import argparse
+from os import path, makedirs, remove, urandom
+from time import time, sleep
+from uuid import uuid4
+from threading import Thread, Event
+from statistics import median
+from urllib.request import Request, urlopen
+from config import Config
+from benchmarks import headers
+
+
+def slow_download(url: str, stop: Event, chunk: int, delay: float):
+    """
+    Downloads media file as a slow client would do, until stop is set.
+
+    :param url:   Media URL
+    :param stop:  Stop event
+    :param chunk: Bytes read per step
+    :param delay: Seconds slept per step
+    :return: Nothing
+    """
+    while not stop.is_set():
+        with urlopen(url) as response:
+            while not stop.is_set() and response.read(chunk):
+                sleep(delay)
+
+
+def probe(url: str, stop: Event, latencies: list):
+    """
+    Requests API url sequentially, recording latencies, until stop is set.
+
+    :param url:       API URL
+    :param stop:      Stop event
+    :param latencies: Latencies list (seconds)
+    :return: Nothing
+    """
+    while not stop.is_set():
+        start = time()
+        with urlopen(Request(url, headers=headers)) as response:
+            response.read()
+        latencies.append(time() - start)
+
+
+def run(base: str, media: str, downloads: int, duration: float, chunk: int, delay: float):
+    """
+    Runs a benchmark round: API latency probe alongside concurrent slow media downloads.
+
+    :param base:      Server base URL
+    :param media:     Media file name
+    :param downloads: Concurrent slow downloads
+    :param duration:  Round duration (seconds)
+    :param chunk:     Bytes read per step by slow clients
+    :param delay:     Seconds slept per step by slow clients
+    :return: API latencies list (seconds)
+    """
+    stop, latencies = Event(), []
+    threads = [Thread(target=slow_download, args=(base + '/api/media/' + media, stop, chunk, delay))
+               for _ in range(downloads)]
+    threads.append(Thread(target=probe, args=(base + '/api/university', stop, latencies)))
+
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    sleep(duration)
+    stop.set()
+    return latencies
+
+
+def report(label: str, latencies: list):
+    """
+    Prints latency percentiles of a benchmark round.
+
+    :param label:     Round label
+    :param latencies: Latencies list (seconds)
+    :return: Nothing
+    """
+    ordered = sorted(latencies)
+    print('{0:>16}: {1:6d} requests, p50 {2:8.2f} ms, p99 {3:8.2f} ms, max {4:8.2f} ms'.format(
+        label, len(ordered), median(ordered) * 1000, ordered[int(len(ordered) * 0.99)] * 1000, ordered[-1] * 1000))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('base', help='Server base URL')
+    parser.add_argument('--downloads', type=int, default=20, help='Concurrent slow media downloads')
+    parser.add_argument('--size', type=int, default=4, help='Media file size (MB)')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per round')
+    parser.add_argument('--chunk', type=int, default=16 * 1024, help='Bytes read per step by slow clients')
+    parser.add_argument('--delay', type=float, default=0.05, help='Seconds slept per step by slow clients')
+    options = parser.parse_args()
+
+    # Benchmark media file, removed at the end
+    makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
+    name = 'bench-' + str(uuid4()) + '.gif'
+    file = path.join(Config.UPLOAD_FOLDER, name)
+
+    with open(file, 'wb') as media:
+        media.write(urandom(options.size * 1024 * 1024))
+
+    try:
+        report('idle', run(options.base, name, 0, options.duration, options.chunk, options.delay))
+        report('{} downloads'.format(options.downloads),
+               run(options.base, name, options.downloads, options.duration, options.chunk, options.delay))
+    finally:
+        remove(file)
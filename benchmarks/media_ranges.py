@@ -0,0 +1,238 @@
+#!flask/bin/python
+"""
+HTTP semantics of media downloads: byte ranges, conditional requests and caching headers.
+
+A media file and the thumbnail of another one are written to a temporary UPLOAD_FOLDER (thumbnails in a
+sibling THUMBNAIL_FOLDER), then every case is requested through the Flask media route and the deployment
+MediaHandler, and its status, headers and body are checked: full download, bounded, open-ended and suffix
+ranges, unsatisfiable ranges, If-Range, If-None-Match, thumbnails, and the original image served while its
+thumbnail is not ready (never cached as immutable). MediaHandler is also checked with MEDIA_OFFLOAD.
+
+Run from repository root:
+    python -m benchmarks.media_ranges
+    python -m benchmarks.media_ranges --handlers tornado
+"""
+import argparse
+import logging
+from os import path, makedirs, urandom
+from sys import exit
+from asyncio import new_event_loop, set_event_loop
+from threading import Thread, Event
+from tempfile import TemporaryDirectory
+from http.client import HTTPConnection
+from tornado.ioloop import IOLoop
+from tornado.netutil import bind_sockets
+from tornado.httpserver import HTTPServer
+from tornado.web import Application
+from server.api.media import MediaHandler
+from server.common import thumbnails
+from benchmarks import get_uchan
+
+uchan = get_uchan('config.MicrobenchmarkConfig')
+
+image  = 'range-test.gif'
+thumbs = 'thumb-test.gif'
+length = 4096
+
+# Label -> (media file, query, request headers, status, expected headers (None: must be missing), body slice)
+cases = {
+    'full':           (image, '', {}, 200, {'ETag': '"{}"'.format(image)}, slice(0, length)),
+    'bounded range':  (image, '', {'Range': 'bytes=0-9'}, 206,
+                       {'Content-Range': 'bytes 0-9/{}'.format(length), 'Accept-Ranges': 'bytes'}, slice(0, 10)),
+    'open range':     (image, '', {'Range': 'bytes=4000-'}, 206,
+                       {'Content-Range': 'bytes 4000-{0}/{1}'.format(length - 1, length)}, slice(4000, length)),
+    'suffix range':   (image, '', {'Range': 'bytes=-100'}, 206,
+                       {'Content-Range': 'bytes {0}-{1}/{2}'.format(length - 100, length - 1, length)},
+                       slice(length - 100, length)),
+    'unsatisfiable':  (image, '', {'Range': 'bytes={}-'.format(length)}, 416,
+                       {'Content-Range': 'bytes */{}'.format(length)}, None),
+    'if-range match': (image, '', {'Range': 'bytes=10-19', 'If-Range': '"{}"'.format(image)}, 206,
+                       {'Content-Range': 'bytes 10-19/{}'.format(length)}, slice(10, 20)),
+    'if-range stale': (image, '', {'Range': 'bytes=10-19', 'If-Range': '"other"'}, 200, {}, slice(0, length)),
+    'not modified':   (image, '', {'If-None-Match': '"{}"'.format(image)}, 304, {}, None),
+    'thumbnail':      (thumbs, '?size=thumb', {'Accept': 'image/*'}, 200,
+                       {'ETag': '"{}"'.format(thumbnails.thumbnail_name(thumbs, 'JPEG')), 'Vary': 'Accept'}, None),
+    'thumb fallback': (image, '?size=thumb', {'Accept': 'image/*'}, 200,
+                       {'Cache-Control': 'no-cache', 'ETag': None, 'Last-Modified': None, 'Vary': 'Accept'},
+                       slice(0, length)),
+    'fallback range': (image, '?size=thumb', {'Range': 'bytes=0-9'}, 206,
+                       {'Cache-Control': 'no-cache', 'ETag': None}, slice(0, 10))
+}
+
+# MediaHandler only, with MEDIA_OFFLOAD = 'X-Accel-Redirect'
+offload_cases = {
+    'offload full':      (image, '', {}, 200, {'X-Accel-Redirect': '/protected/media/' + image}, None),
+    'offload thumbnail': (thumbs, '?size=thumb', {}, 200,
+                          {'X-Accel-Redirect': '/protected/thumbs/' + thumbnails.thumbnail_name(thumbs, 'JPEG')},
+                          None),
+    'offload fallback':  (image, '?size=thumb', {}, 200,
+                          {'X-Accel-Redirect': '/protected/media/' + image, 'Cache-Control': 'no-cache'}, None)
+}
+
+
+def fixture(folder: str):
+    """
+    Writes the media files of the cases under a folder, in 'media' (UPLOAD_FOLDER) and 'thumbs'
+    (THUMBNAIL_FOLDER): 'image' has no thumbnail yet, 'thumbs' has its JPEG one.
+
+    :param folder: Temporary folder
+    :return: Dictionary of media file name -> contents
+    """
+    uchan.app.config['UPLOAD_FOLDER']    = path.join(folder, 'media')
+    uchan.app.config['THUMBNAIL_FOLDER'] = path.join(folder, 'thumbs')
+    makedirs(uchan.app.config['UPLOAD_FOLDER'])
+    makedirs(uchan.app.config['THUMBNAIL_FOLDER'])
+    folder = uchan.app.config['UPLOAD_FOLDER']
+
+    contents = {image: urandom(length), thumbs: urandom(length)}
+
+    with uchan.app.app_context():
+        contents[thumbnails.thumbnail_name(thumbs, 'JPEG')] = urandom(length // 2)
+        files = {path.join(folder, image): contents[image], path.join(folder, thumbs): contents[thumbs],
+                 thumbnails.thumbnail_path(thumbs, 'JPEG'): contents[thumbnails.thumbnail_name(thumbs, 'JPEG')]}
+
+    for name, data in files.items():
+        with open(name, 'wb') as file:
+            file.write(data)
+
+    return contents
+
+
+def verify(label: str, response: tuple, contents: dict):
+    """
+    Checks a case response against its expectations.
+
+    :param label:    Case label
+    :param response: Tuple of (status, case-insensitive headers, body)
+    :param contents: Dictionary of media file name -> contents (see fixture())
+    :return: List of failure descriptions
+    """
+    name, _, _, status, expected, body = cases.get(label) or offload_cases[label]
+    code, headers, data = response
+    failures = []
+
+    if code != status:
+        failures.append('status {0}, expected {1}'.format(code, status))
+
+    for header, value in expected.items():
+        if headers.get(header) != value:
+            failures.append('{0}: {1}, expected {2}'.format(header, headers.get(header), value))
+
+    if status == 200 and expected.get('Cache-Control') is None and 'immutable' not in headers.get('Cache-Control', ''):
+        failures.append('Cache-Control: {}, expected immutable'.format(headers.get('Cache-Control')))
+
+    if body is not None and data != contents[name][body]:
+        failures.append('body of {} bytes does not match'.format(len(data)))
+
+    return failures
+
+
+def flask_response(client, label: str):
+    """
+    Requests a case through the Flask media route.
+
+    :param client: Flask test client
+    :param label:  Case label
+    :return: Tuple of (status, case-insensitive headers, body)
+    """
+    name, query, headers, _, _, _ = cases[label]
+    response = client.get('/api/media/' + name + query, headers=headers)
+    return response.status_code, response.headers, response.get_data()
+
+
+def serve_media():
+    """
+    Serves MediaHandler, as deployment_application() does, on a background IOLoop.
+
+    :return: Tuple of (port, IOLoop)
+    """
+    started, loop = Event(), []
+    # Expected 4xx responses are not worth a warning
+    logging.getLogger('tornado.access').setLevel(logging.ERROR)
+
+    def serve():
+        set_event_loop(new_event_loop())
+        sockets = bind_sockets(0, 'localhost')
+        HTTPServer(Application([(r'/api/media/(.*)', MediaHandler,
+                                 {'path': uchan.app.config.get('UPLOAD_FOLDER')})])).add_sockets(sockets)
+        loop.append((sockets[0].getsockname()[1], IOLoop.current()))
+        started.set()
+        IOLoop.current().start()
+
+    Thread(target=serve, daemon=True).start()
+    started.wait()
+    return loop[0]
+
+
+def tornado_response(port: int, label: str):
+    """
+    Requests a case through MediaHandler.
+
+    :param port:  MediaHandler port
+    :param label: Case label
+    :return: Tuple of (status, case-insensitive headers, body)
+    """
+    name, query, headers, _, _, _ = cases.get(label) or offload_cases[label]
+    connection = HTTPConnection('localhost', port)
+
+    try:
+        connection.request('GET', '/api/media/' + name + query, headers=headers)
+        response = connection.getresponse()
+        return response.status, response.headers, response.read()
+    finally:
+        connection.close()
+
+
+def run(labels: list, handlers: list):
+    """
+    Runs cases against each media handler, printing their outcome.
+
+    :param labels:   Case labels
+    :param handlers: Handlers to check ('flask', 'tornado')
+    :return: Number of failed cases
+    """
+    failed = 0
+
+    def report(handler: str, label: str, failures: list):
+        print('{0:>8} {1:>18}: {2}'.format(handler, label, '; '.join(failures) + ' FAIL' if failures else 'ok'))
+        return len(failures) > 0
+
+    with TemporaryDirectory() as folder:
+        contents = fixture(folder)
+
+        if 'flask' in handlers:
+            client = uchan.app.test_client()
+
+            for label in labels:
+                failed += report('flask', label, verify(label, flask_response(client, label), contents))
+
+        if 'tornado' in handlers:
+            port, loop = serve_media()
+
+            for label in labels:
+                failed += report('tornado', label, verify(label, tornado_response(port, label), contents))
+
+            uchan.app.config['MEDIA_OFFLOAD'] = 'X-Accel-Redirect'
+
+            try:
+                for label in offload_cases:
+                    failed += report('tornado', label, verify(label, tornado_response(port, label), contents))
+            finally:
+                uchan.app.config['MEDIA_OFFLOAD'] = None
+                loop.add_callback(loop.stop)
+
+    return failed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('cases', nargs='*', help='Cases to run (default: all): ' + ', '.join(cases))
+    parser.add_argument('--handlers', nargs='+', choices=['flask', 'tornado'], default=['flask', 'tornado'],
+                        help='Media handlers to check')
+    options = parser.parse_args()
+
+    if set(options.cases) - set(cases):
+        parser.error('unknown cases: ' + ', '.join(sorted(set(options.cases) - set(cases))))
+
+    # Non-zero exit status on failures, to gate merges
+    exit(1 if run(options.cases or list(cases), options.handlers) else 0)
@@ -0,0 +1,213 @@
+#!flask/bin/python
+"""
+Microbenchmarks of hot helper functions: JSON representations, headers checks, authorization parsing,
+authid and password hashing, input validation and Base64 decoding of 4MB uploads.
+
+Representations run against an in-memory SQLite fixture (MicrobenchmarkConfig), reloading their objects
+from a clean session on every call, as a request would do: 'fixture load' is that reload alone.
+Every case is timed with timeit (garbage collector disabled) over several repetitions; the best one is
+the stable figure to compare, the median shows the noise.
+
+Run from repository root:
+    python -m benchmarks.micro --output before.json
+    python -m benchmarks.micro --compare before.json after.json --tolerance 10
+"""
+import argparse
+import platform
+from os import urandom
+from sys import exit
+from json import load, dump
+from time import strftime
+from timeit import Timer
+from base64 import b64encode
+from statistics import median
+from server.api import BasicEntity, AuthEntity
+from server.models import University, Board, User, Thread, ThreadUser, Post
+from server.common import JSONRepresentation, routines
+from benchmarks import get_uchan, reset, authorized
+
+uchan = get_uchan('config.MicrobenchmarkConfig')
+
+headers = authorized('0123abcd-4567-89ef-0123-456789abcdef')
+
+
+def fixture():
+    """
+    Creates in-memory database: a university, a board, two users, an anonymous and a public thread
+    with a reply each.
+
+    :return: Dictionary of fixture object IDs
+    """
+    db = uchan.db
+    reset(uchan, [University('Uni', 'City', 'uni.it', '')], [Board('/b/', 'Random', 1)])
+
+    author = User('benchauthor', routines.hashing_password('salt', 'Benchmark1'), 'salt', 2, 'author', 'm', True,
+                  'author-token')
+    viewer = User('benchviewer', routines.hashing_password('salt', 'Benchmark1'), 'salt', 2, 'viewer', 'f', True,
+                  'viewer-token')
+    db.session.add_all([author, viewer])
+    db.session.flush()
+
+    ids = {'author': author.id, 'viewer': viewer.id}
+
+    for anon in [True, False]:
+        thread = Thread(anon, 'Benchmark thread', 'Lorem ipsum ' * 50, 'image.png', 1, author.id)
+        db.session.add(thread)
+        db.session.flush()
+        db.session.add_all([ThreadUser(thread.id, author.id), ThreadUser(thread.id, viewer.id)])
+
+        post = Post(False, anon, 'Lorem ipsum ' * 20, thread.id, viewer.id, 1)
+        db.session.add(post)
+        db.session.flush()
+
+        key = 'anon' if anon else 'public'
+        ids[key + '_thread'], ids[key + '_post'] = thread.id, post.id
+
+    db.session.commit()
+    return ids
+
+
+def reload(*objects):
+    """
+    Loads fixture objects from a clean session.
+
+    :param objects: Tuples of (model, ID)
+    :return: List of loaded objects
+    """
+    uchan.db.session.expunge_all()
+    return [model.query.get(id) for model, id in objects]
+
+
+def checked_entity():
+    """
+    Returns an AuthEntity whose headers have been checked (see AuthEntity.get_authorization()).
+
+    :return: AuthEntity object
+    """
+    entity = AuthEntity()
+    entity.check_headers()
+    return entity
+
+
+def cases(ids: dict):
+    """
+    Returns benchmark cases.
+    Needs application and request contexts.
+
+    :param ids: Fixture object IDs (see fixture())
+    :return: List of (label, function)
+    """
+    def thread(kind):
+        return lambda: JSONRepresentation.thread(*reload((Thread, ids[kind + '_thread']), (User, ids['viewer'])))
+
+    def post(kind):
+        return lambda: JSONRepresentation.post(*reload((Post, ids[kind + '_post']), (Thread, ids[kind + '_thread']),
+                                                       (User, ids['author'])))
+
+    entity  = checked_entity()
+    payload = b64encode(urandom(4 * 1024 * 1024)).decode('utf-8')
+
+    return [
+        ('fixture load',                     lambda: reload((Thread, ids['anon_thread']), (User, ids['viewer']))),
+        ('JSONRepresentation.thread anon',   thread('anon')),
+        ('JSONRepresentation.thread public', thread('public')),
+        ('JSONRepresentation.post anon',     post('anon')),
+        ('JSONRepresentation.post public',   post('public')),
+        ('JSONRepresentation.me',            lambda: JSONRepresentation.me(*reload((User, ids['viewer'])))),
+        ('BasicEntity.check_headers',        lambda: BasicEntity().check_headers()),
+        ('AuthEntity.check_headers',         lambda: AuthEntity().check_headers()),
+        ('AuthEntity.get_authorization',     entity.get_authorization),
+        ('routines.calculate_authid',        lambda: routines.calculate_authid(ids['anon_thread'], ids['viewer'])),
+        ('routines.hashing_password',        lambda: routines.hashing_password('0123456789abcdef0123', 'Benchmark1')),
+        ('routines.is_valid_nick',           lambda: routines.is_valid_nick('benchmark_user.1')),
+        ('routines.is_valid_pass',           lambda: routines.is_valid_pass('Benchmark1Password')),
+        ('routines.is_valid_email',          lambda: routines.is_valid_email('name.surname')),
+        ('routines.is_valid_file',           lambda: routines.is_valid_file('picture.jpeg')),
+        ('routines.decode_file 4MB',         lambda: routines.decode_file(payload))
+    ]
+
+
+def measure(function, repeat: int, min_time: float):
+    """
+    Times a function: calls per repetition are chosen so that a repetition lasts at least min_time.
+
+    :param function: Measured function
+    :param repeat:   Repetitions
+    :param min_time: Min. repetition duration (seconds)
+    :return: Per call timings (seconds) of every repetition
+    """
+    timer = Timer(function)
+    number, elapsed = timer.autorange()
+
+    if elapsed < min_time:
+        number = int(number * min_time / max(elapsed, 1e-9)) + 1
+
+    return [elapsed / number for elapsed in timer.repeat(repeat, number)]
+
+
+def compare(before: str, after: str, tolerance: float):
+    """
+    Prints changes of best timings between two stored runs.
+
+    :param before:    Baseline results file
+    :param after:     New results file
+    :param tolerance: Slowdown percentage reported as regression
+    :return: Number of regressions
+    """
+    with open(before, 'r') as file:
+        old = load(file)['cases']
+    with open(after, 'r') as file:
+        new = load(file)['cases']
+
+    regressions = 0
+
+    for label in [label for label in new if label in old]:
+        change = (new[label]['best_us'] / old[label]['best_us'] - 1) * 100
+        flag   = 'REGRESSION' if change > tolerance else ''
+        regressions += change > tolerance
+        print('{0:>34} {1:12.2f} us -> {2:12.2f} us ({3:+6.1f}%) {4}'.format(
+            label, old[label]['best_us'], new[label]['best_us'], change, flag))
+
+    return regressions
+
+
+def main(options):
+    """
+    Creates fixture, runs cases (optionally filtered) and reports results.
+
+    :param options: Command line options
+    :return: Nothing
+    """
+    results = {}
+
+    with uchan.app.app_context(), uchan.app.test_request_context(headers=headers):
+        for label, function in cases(fixture()):
+            if options.filter is not None and options.filter not in label:
+                continue
+
+            timings = measure(function, options.repeat, options.min_time)
+            results[label] = {'best_us': min(timings) * 1e6, 'median_us': median(timings) * 1e6}
+            print('{0:>34}: best {1:12.2f} us, median {2:12.2f} us'.format(
+                label, results[label]['best_us'], results[label]['median_us']))
+
+    if options.output is not None:
+        with open(options.output, 'w') as file:
+            dump({'time': strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(), 'cases': results},
+                 file, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=7, help='Repetitions per case')
+    parser.add_argument('--min-time', type=float, default=0.2, help='Min. repetition duration (seconds)')
+    parser.add_argument('--filter', help='Only run cases containing this text')
+    parser.add_argument('--output', help='Results JSON file')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='Compare two results files')
+    parser.add_argument('--tolerance', type=float, default=10.0, help='Slowdown percentage reported as regression')
+    options = parser.parse_args()
+
+    if options.compare is not None:
+        # Non-zero exit status on regressions, to gate deploys
+        exit(1 if compare(options.compare[0], options.compare[1], options.tolerance) else 0)
+    else:
+        main(options)
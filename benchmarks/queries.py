@@ -0,0 +1,267 @@
+#!flask/bin/python
+"""
+Query-count budgets of API endpoints, against N+1 regressions.
+
+Every GET endpoint of the registered resources is requested on in-memory SQLite fixtures (MicrobenchmarkConfig)
+of several sizes, where size is the number of items the endpoint returns (threads of a board page, posts of a
+thread page, boards of 'me', chats of the inbox, ...), and the SQL statements of each request are counted.
+
+Budgets are declared in benchmarks/query_budgets.json, by endpoint ('<resource class>.<method>'):
+    "BoardAPI.get": {"base": 6, "per_item": 0}
+means at most 6 + 0 * size statements, and no growth at all with size. An endpoint growing faster than its
+'per_item', exceeding its budget at any size, or missing from the budget file (every registered GET resource
+must be covered) fails the run. Budgets don't allow growth (--update always writes 'per_item' 0): known N+1
+debts are declared apart, in 'known_debts' (endpoint -> description), and still fail the run until fixed:
+    "known_debts": {"BoardAPI.get": "ThreadUser lookup per thread (routines.get_request)"}
+
+Run from repository root, or as a check of python -m pytest (test_queries.py):
+    python -m benchmarks.queries
+    python -m benchmarks.queries --update    (rewrites budgets from measured counts, to review in the diff)
+"""
+import argparse
+from os import path
+from sys import exit
+from json import load, dump
+from sqlalchemy import event
+from server.models import University, Board, User, UserBoard, Session, Thread, ThreadUser, Post
+from server.models import ChatRequest, Chat, ChatInbox
+from server.common import routines, nicknames
+from benchmarks import get_uchan, reset, authorized
+
+uchan = get_uchan('config.MicrobenchmarkConfig')
+
+budgets_file = path.join(path.dirname(path.abspath(__file__)), 'query_budgets.json')
+
+# Requests of the fixture viewer
+headers = authorized('viewer-session')
+
+# Endpoint label -> URL (formatted with fixture IDs), every one returning 'size' items
+scenarios = {
+    'Activation.get':     '/api/activation/pending-token',
+    'BoardAPI.get':       '/api/board/{board}',
+    'ChatAPI.get':        '/api/chat/{chat}/since/0',
+    'ChatRequestAPI.get': '/api/chat/request',
+    'DecoratedHello.get': '/',
+    'Me.get':             '/api/me',
+    'MeChats.get':        '/api/me/chats',
+    'MeThreads.get':      '/api/me/threads',
+    'NicknameAPI.get':    '/api/registration/nickname/viewer',
+    'ThreadAPI.get':      '/api/thread/{thread}',
+    'UniversityAPI.get':  '/api/university'
+}
+
+
+def fixture(size: int):
+    """
+    Recreates in-memory database, with 'size' items for every endpoint: universities, general boards (the viewer
+    is implicitly subscribed to), threads of a board page and posts of a thread page (by distinct authors, anonymous
+    and public; the thread page and every fourth board page thread are legacy threads, with stored authids),
+    threads of the viewer, chats of the viewer (the first one with 'size' messages), pending
+    chat requests to the viewer, and a user to activate.
+
+    :param size: Items per endpoint
+    :return: Dictionary of fixture object IDs
+    """
+    db = uchan.db
+    nicknames.reset()
+
+    password = routines.hashing_password('salt', 'Budget1')
+
+    # General boards, and viewer threads board (not subscribed)
+    reset(uchan, [University('Uni{}'.format(i), 'City', 'uni{}.it'.format(i), '') for i in range(size)],
+          [Board('/b{}/'.format(i), 'Board {}'.format(i), 1) for i in range(size)] + [Board('/uni/', 'University', 2)])
+
+    def user(name: str, university: int, activated=True):
+        return User(name, password, 'salt', university, name, 'f', activated, name + '-token')
+
+    viewer  = user('viewer', 2)
+    authors = [user('author{}'.format(i), 2 + i) for i in range(size)]
+    senders = [user('sender{}'.format(i), 2 + i) for i in range(size)]
+    db.session.add_all([viewer, user('pending', 2, False)] + authors + senders)
+    db.session.flush()
+
+    general = [board.id for board in Board.query.filter_by(university=1)]
+    own     = Board.query.filter_by(university=2).first().id
+
+    db.session.add(Session('127.0.0.1', 'viewer-session', viewer.id))
+    db.session.add(UserBoard(viewer.id, own))
+
+    # Board page threads and thread page posts
+    threads = [Thread(i % 2 == 0, 'Thread {}'.format(i), 'Text', 'image.png', general[0], author.id)
+               for i, author in enumerate(authors)]
+    threads += [Thread(False, 'Own {}'.format(i), 'Text', 'image.png', own, viewer.id) for i in range(size)]
+    db.session.add_all(threads)
+    db.session.flush()
+
+    db.session.add_all([ThreadUser(thread.id, thread.author) for thread in threads])
+    db.session.add_all([ThreadUser(threads[0].id, author.id) for author in authors[1:]] +
+                       [ThreadUser(threads[0].id, viewer.id)])
+    db.session.flush()
+
+    # Threads created before keyed authids (see Thread.keyed_authids), with stored random authids
+    legacy = [thread.id for thread in threads[:size:4]]
+    Thread.query.filter(Thread.id.in_(legacy)).update({'keyed_authids': False}, synchronize_session='fetch')
+
+    for threaduser in ThreadUser.query.filter(ThreadUser.thread.in_(legacy)):
+        threaduser.authid = '{:08x}'.format(threaduser.id)
+
+    db.session.add_all([Post(False, i % 2 == 0, 'Post {}'.format(i), threads[0].id, author.id, general[0])
+                        for i, author in enumerate(authors)])
+    threads[0].replies = size
+
+    # Chats with authors, pending requests from senders
+    chats = [Chat(viewer.id, author.id) for author in authors]
+    db.session.add_all(chats)
+    db.session.add_all([ChatRequest(sender.id, viewer.id) for sender in senders])
+    db.session.flush()
+
+    for chat in chats:
+        ChatInbox.add_chat(chat)
+        chat.add_message(chat.user2, 'Hello')
+
+    for i in range(size - 1):
+        chats[0].add_message(viewer.id, 'Message {}'.format(i))
+
+    ids = {'board': general[0], 'thread': threads[0].id, 'chat': chats[0].id}
+    db.session.commit()
+    db.session.remove()
+
+    return ids
+
+
+def measure(sizes: list):
+    """
+    Counts SQL statements of every scenario request, at every fixture size.
+
+    :param sizes: Fixture sizes
+    :return: Endpoint label -> list of statement counts (one per size)
+    """
+    client = uchan.app.test_client()
+    counts = {label: [] for label in scenarios}
+    count  = [0]
+
+    def counter(*args):
+        count[0] += 1
+
+    with uchan.app.app_context():
+        engine = uchan.db.engine
+
+    for size in sizes:
+        with uchan.app.app_context():
+            ids = fixture(size)
+
+        for label, url in scenarios.items():
+            event.listen(engine, 'before_cursor_execute', counter)
+            count[0] = 0
+
+            try:
+                response = client.get(url.format(**ids), headers=headers)
+            finally:
+                event.remove(engine, 'before_cursor_execute', counter)
+
+            if response.status_code >= 300:
+                raise AssertionError('{} ({}): {} {}'.format(label, size, response.status_code, response.data))
+
+            counts[label].append(count[0])
+
+    return counts
+
+
+def get_resources():
+    """
+    Returns labels of every registered resource GET method.
+
+    :return: Set of endpoint labels
+    """
+    return {view.view_class.__name__ + '.get' for view in uchan.app.view_functions.values()
+            if 'GET' in (getattr(getattr(view, 'view_class', None), 'methods', None) or ())}
+
+
+def growth(sizes: list, counts: list):
+    """
+    Returns the max. growth of statements per returned item, between consecutive sizes.
+
+    :param sizes:  Fixture sizes
+    :param counts: Statement counts, one per size
+    :return: Statements per item
+    """
+    return max([(counts[i + 1] - counts[i]) / (sizes[i + 1] - sizes[i]) for i in range(len(sizes) - 1)] or [0])
+
+
+def check(sizes: list, counts: dict, budgets: dict, debts: dict):
+    """
+    Prints measured counts against budgets.
+
+    :param sizes:   Fixture sizes
+    :param counts:  Endpoint label -> statement counts (see measure())
+    :param budgets: Endpoint label -> budget
+    :param debts:   Endpoint label -> known N+1 debt description
+    :return: Number of failures
+    """
+    failures = 0
+
+    for label in sorted(get_resources() - set(scenarios)):
+        print('{0:>20}: no scenario FAIL'.format(label))
+        failures += 1
+
+    for label in sorted(counts):
+        budget  = budgets.get(label)
+        slope   = growth(sizes, counts[label])
+        measure = ' '.join('{:4d}'.format(count) for count in counts[label])
+
+        if budget is None:
+            status = 'no budget FAIL'
+        elif slope > budget['per_item']:
+            status = 'grows {0:+.1f}/item (budget {1:+d}) FAIL'.format(slope, budget['per_item'])
+        elif any(count > budget['base'] + budget['per_item'] * size for size, count in zip(sizes, counts[label])):
+            status = 'over budget {0} + {1}/item FAIL'.format(budget['base'], budget['per_item'])
+        else:
+            status = 'ok ({0} + {1}/item)'.format(budget['base'], budget['per_item'])
+
+        failed    = status.endswith('FAIL')
+        failures += failed
+        print('{0:>20}: {1}   {2}'.format(label, measure, status))
+
+        if failed and label in debts:
+            print('{0:>20}  known debt: {1}'.format('', debts[label]))
+
+    return failures
+
+
+def update(sizes: list, counts: dict):
+    """
+    Returns budgets matching measured counts, with no growth allowed: an endpoint growing with size gets the budget
+    of its smallest size, and keeps failing until fixed (see 'known_debts').
+
+    :param sizes:  Fixture sizes
+    :param counts: Endpoint label -> statement counts (see measure())
+    :return: Endpoint label -> budget
+    """
+    return {label: {'base': measured[0] if growth(sizes, measured) > 0 else max(measured), 'per_item': 0}
+            for label, measured in sorted(counts.items())}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--budgets', default=budgets_file, help='Budgets JSON file')
+    parser.add_argument('--sizes', type=int, nargs='+', help='Fixture sizes (default: from budgets file)')
+    parser.add_argument('--update', action='store_true', help='Rewrite budgets from measured counts')
+    options = parser.parse_args()
+
+    with open(options.budgets, 'r') as file:
+        declared = load(file)
+
+    sizes  = sorted(options.sizes or declared['sizes'])
+    counts = measure(sizes)
+    print('{0:>20}  {1}'.format('statements at size', ' '.join('{:4d}'.format(size) for size in sizes)))
+
+    if options.update:
+        with open(options.budgets, 'w') as file:
+            dump({'sizes': sizes, 'budgets': update(sizes, counts), 'known_debts': declared.get('known_debts', {})},
+                 file, indent=2)
+            file.write('\n')
+
+        declared['budgets'] = update(sizes, counts)
+
+    # Non-zero exit status on failures, to gate merges
+    exit(1 if check(sizes, counts, declared['budgets'], declared.get('known_debts', {})) else 0)
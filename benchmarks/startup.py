@@ -0,0 +1,50 @@
+#!flask/bin/python
+"""
+Import and startup time of the server and of the maintenance scripts, each measured in fresh interpreters.
+
+Run from repository root:
+    python -m benchmarks.startup --repeat 10
+"""
+import argparse
+import subprocess
+from sys import executable
+from statistics import median
+
+# Label -> code measured in a fresh interpreter
+scenarios = [
+    ('import server', 'from server import create_app'),
+    ('maintenance script', 'from server import create_app; create_app(resources=False)'),
+    ('server (WSGI app)', 'from server import create_app; create_app()'),
+    ('server (deployment)', 'from server import create_app; create_app().deployment_application()')
+]
+
+# Wraps measured code, printing its duration
+template = """
+from time import perf_counter
+start = perf_counter()
+{}
+print(perf_counter() - start)
+"""
+
+
+def measure(code: str, repeat: int):
+    """
+    Runs code in 'repeat' fresh interpreters.
+
+    :param code:   Python code
+    :param repeat: Repetitions
+    :return: List of durations (seconds)
+    """
+    return [float(subprocess.check_output([executable, '-c', template.format(code)]).decode('utf-8').split()[-1])
+            for _ in range(repeat)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=10, help='Fresh interpreters per scenario')
+    options = parser.parse_args()
+
+    for label, code in scenarios:
+        durations = measure(code, options.repeat)
+        print('{0:>20}: median {1:8.1f} ms, min {2:8.1f} ms'.format(
+            label, median(durations) * 1000, min(durations) * 1000))
@@ -0,0 +1,19 @@
+"""
+Concurrency stress check (see benchmarks.concurrency), collected by pytest.
+
+The stress test seeds the on-disk BenchmarkConfig database, while the other checks use in-memory
+MicrobenchmarkConfig: application is configured once per process, so the stress test runs in a process of its own.
+"""
+import subprocess
+from os import path
+from sys import executable
+
+root = path.dirname(path.dirname(path.abspath(__file__)))
+
+
+def test_concurrent_requests_are_isolated():
+    result = subprocess.run([executable, '-m', 'benchmarks.concurrency', '--users', '50', '--requests', '1000',
+                             '--clients', '16', '--workers', '8'],
+                            cwd=root, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=600)
+
+    assert result.returncode == 0, result.stdout.decode('utf-8', 'replace')
@@ -0,0 +1,24 @@
+"""
+Fast path differential test (see benchmarks.fastpath_diff), collected by pytest: one test per case.
+"""
+import pytest
+from benchmarks.fastpath_diff import uchan, fixture, cases, serve, request, compare
+
+
+@pytest.fixture(scope='module')
+def served():
+    with uchan.app.app_context():
+        ids = fixture(25)
+
+    port, loop = serve()
+    yield uchan.app.test_client(), port, ids
+    loop.add_callback(loop.stop)
+
+
+@pytest.mark.parametrize('label', sorted(cases))
+def test_fast_path_matches_flask(served, label):
+    client, port, ids    = served
+    url, request_headers = cases[label]
+    flask, fast          = request(client, port, url.format(**ids), request_headers)
+
+    assert compare(flask, fast) == []
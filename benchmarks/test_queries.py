@@ -0,0 +1,36 @@
+"""
+Query-count budgets (see benchmarks.queries), collected by pytest: one test per endpoint.
+"""
+import pytest
+from json import load
+from benchmarks.queries import budgets_file, scenarios, measure, get_resources, growth
+
+with open(budgets_file, 'r') as file:
+    declared = load(file)
+
+sizes = sorted(declared['sizes'])
+debts = declared.get('known_debts', {})
+
+
+@pytest.fixture(scope='module')
+def counts():
+    return measure(sizes)
+
+
+def test_every_resource_has_a_scenario():
+    assert sorted(get_resources() - set(scenarios)) == []
+
+
+def test_every_scenario_has_a_budget():
+    assert sorted(set(scenarios) - set(declared['budgets'])) == []
+
+
+@pytest.mark.parametrize('label', sorted(scenarios))
+def test_query_budget(counts, label):
+    budget   = declared['budgets'].get(label, {'base': 0, 'per_item': 0})
+    measured = counts[label]
+    debt     = debts.get(label, '')
+
+    assert growth(sizes, measured) <= budget['per_item'], debt
+    for size, count in zip(sizes, measured):
+        assert count <= budget['base'] + budget['per_item'] * size, debt
@@ -0,0 +1,83 @@
+#!flask/bin/python
+"""
+Bulk data generator and loader, built on SQLAlchemy Core executemany in chunked transactions.
+
+    bulk_load.py generate --users 100000 --threads 200000 --posts 1000000 --chats 50000 --messages 1000000
+        Generates a synthetic dataset (see server.common.bulk.generate()) on top of existing universities
+        and general boards (inject_universities.py, inject_boards.py).
+
+    bulk_load.py import <table> <file>
+        Imports rows from a CSV file (header with column names) or a JSON lines file (one object per line)
+        into user, userboard, thread, threaduser, post, chatrequest, chat, chatinbox or message table.
+"""
+import csv
+import argparse
+from json import loads
+from time import perf_counter
+from random import Random
+from server import create_app
+from server.common import bulk
+from server.common.routines import hashing_password
+
+# Database and models only, API resources are not needed
+uchan = create_app(resources=False)
+
+
+def read_rows(filename: str):
+    """
+    Reads rows from a CSV or JSON lines file.
+
+    :param filename: File name (.csv for CSV, JSON lines otherwise)
+    :return: Rows iterator
+    """
+    with open(filename, 'r', newline='') as file:
+        if filename.endswith('.csv'):
+            yield from csv.DictReader(file)
+        else:
+            yield from (loads(line) for line in file if line.strip())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chunk', type=int, default=bulk.chunk_size, help='Rows inserted per transaction')
+    commands = parser.add_subparsers(dest='command')
+
+    generate = commands.add_parser('generate', help='Generate a synthetic dataset')
+    generate.add_argument('--users', type=int, default=1000)
+    generate.add_argument('--threads', type=int, default=2000)
+    generate.add_argument('--posts', type=int, default=20000)
+    generate.add_argument('--chats', type=int, default=500)
+    generate.add_argument('--messages', type=int, default=10000)
+    generate.add_argument('--password', default='Password1', help='Password of generated users')
+    generate.add_argument('--seed', type=int, default=42, help='Random seed')
+
+    load = commands.add_parser('import', help='Import rows from a CSV or JSON lines file')
+    load.add_argument('table')
+    load.add_argument('file')
+
+    options = parser.parse_args()
+    loader  = bulk.Loader(options.chunk)
+    start   = perf_counter()
+
+    if options.command == 'generate':
+        salt = 'bulkloadbulkloadbulk'
+        bulk.generate(loader, Random(options.seed), options.users, options.threads, options.posts, options.chats,
+                      options.messages, hashing_password(salt, options.password), salt)
+    elif options.command == 'import':
+        try:
+            bulk.import_rows(loader, options.table, read_rows(options.file))
+        except ValueError as msg:
+            parser.error(str(msg))
+    else:
+        parser.print_help()
+        parser.exit()
+
+    counts  = loader.finish()
+    elapsed = perf_counter() - start
+    total   = sum(counts.values())
+
+    for table, count in counts.items():
+        if count:
+            print('{0:>12}: {1:10d} rows'.format(table, count))
+
+    print('{0} rows in {1:.1f} s: {2:.0f} rows/s'.format(total, elapsed, total / elapsed))
@@ -2,6 +2,9 @@ import os.path
 
 basedir    = os.path.abspath(os.path.dirname(__file__)) + '/server/database'
 staticdir  = os.path.abspath(os.path.dirname(__file__)) + '/server/static'
+logdir     = os.path.abspath(os.path.dirname(__file__)) + '/server/logs'
+profiledir = os.path.abspath(os.path.dirname(__file__)) + '/server/profiles'
+benchdir   = os.path.abspath(os.path.dirname(__file__)) + '/server/benchmark'
 
 
 class Config:
@@ -19,10 +22,88 @@ class Config:
     SQLALCHEMY_MIGRATE_REPO = os.path.join(basedir, 'repository')
 
     SECRET_KEY = 'Insert Secret Key'
+    # Anonymous authids HMAC key, required (see Uchan.configure()): changing it changes every computed authid.
+    # Deployments computing authids with the SECRET_KEY fallback keep them by setting it to that SECRET_KEY
+    AUTHID_KEY = None
 
     UPLOAD_FOLDER = staticdir
     ALLOWED_EXTENSIONS = {'png', 'PNG', 'jpg', 'JPG', 'jpeg', 'JPEG', 'gif', 'GIF'}
-    MAX_CONTENT_LENGHT = 4 * 1024 * 1024  # 4MB lenght upper bound
+    MAX_CONTENT_LENGTH = (4 * 1024 * 1024) * 4 // 3 + 64 * 1024  # 4MB image (Base64 encoded) plus JSON fields
+
+    # Upload admission control, per worker process: prefork mode multiplies slots and quotas by the workers
+    UPLOAD_THRESHOLD       = 64 * 1024          # Request bodies bigger than this are considered uploads
+    MAX_CONCURRENT_UPLOADS = 4                  # Uploads processed at the same time
+    UPLOAD_QUOTA_BYTES     = 64 * 1024 * 1024   # Bytes a user can upload...
+    UPLOAD_QUOTA_WINDOW    = 60 * 60            # ...in this rolling window (seconds)
+
+    MEDIA_CACHE_MAX_AGE = 365 * 24 * 60 * 60  # Media names are immutable, cache them for a year
+    # Deployment only: None (Tornado serves media), 'X-Accel-Redirect' (nginx) or 'X-Sendfile' (Apache, lighttpd)
+    MEDIA_OFFLOAD        = None
+    MEDIA_OFFLOAD_PREFIX       = '/protected/media/'   # X-Accel-Redirect internal location mapped to UPLOAD_FOLDER
+    MEDIA_OFFLOAD_THUMB_PREFIX = '/protected/thumbs/'  # X-Accel-Redirect internal location mapped to THUMBNAIL_FOLDER
+
+    LOG_FOLDER = logdir  # Deployment prefork mode: one log file per worker
+
+    # Request, database and cache metrics of each worker process (and WSGI pool samples), exposed at /metrics:
+    # not authenticated, like /status/wsgi, so only enabled behind a proxy restricting access to it
+    METRICS = False
+
+    # Request profiling (cProfile stats files, see server.common.profiling)
+    PROFILE               = False               # No profiling hooks at all when disabled
+    PROFILE_RATE          = 0.0                 # Fraction of requests profiled...
+    PROFILE_HEADER        = 'uChan-Profile'     # ...plus requests carrying a signed token (see profile_token.py)...
+    PROFILE_TOKEN_MAX_AGE = 60 * 60             # ...not older than this (seconds)
+    PROFILE_FOLDER        = profiledir
+
+    # Deployment only: WSGI calls thread pool size (None runs them on the IOLoop thread)...
+    WSGI_POOL_SIZE   = None
+    WSGI_POOL_QUEUE  = 256      # ...max. calls waiting for a thread, then 503 Service Unavailable...
+    WSGI_POOL_STATUS = False    # ...and unauthenticated JSON metrics at /status/wsgi (also at /metrics, see METRICS)
+
+    # Deployment only: native Tornado GET handlers for board and thread pages, and their database thread pool size
+    FASTPATH           = False
+    FASTPATH_POOL_SIZE = 8
+
+    WEBSOCKET_PING_INTERVAL = 30  # Deployment only: keeps idle chat sockets alive behind proxies (seconds)
+    REALTIME_POOL_SIZE      = 4   # Deployment only: database threads of chat sockets and thread events
+
+    # Thread events stream (deployment only)
+    EVENTS_HEARTBEAT    = 15    # Seconds between SSE heartbeats
+    EVENTS_POLL_TIMEOUT = 30    # Seconds a long-poll request waits for new posts
+    EVENTS_BATCH        = 50    # Max. posts sent per wake up
+
+    # Orphaned media garbage collector (see media_gc.py)
+    MEDIA_GC_GRACE    = 24 * 60 * 60    # Unreferenced files younger than this (seconds) are kept
+    MEDIA_GC_BATCH    = 100             # Files deleted before pausing...
+    MEDIA_GC_PAUSE    = 0.1             # ...for this many seconds, to bound disk I/O
+    MEDIA_GC_INTERVAL = None            # Deployment only: seconds between background runs, None to disable
+
+    # Outgoing emails, queued in the outbox table and delivered in background (see server.common.outbox)
+    MAIL_SERVER         = 'localhost'
+    MAIL_PORT           = 25
+    MAIL_USE_TLS        = False
+    MAIL_USERNAME       = None
+    MAIL_PASSWORD       = None
+    MAIL_TIMEOUT        = 30
+    MAIL_SENDER         = 'uChan <noreply@uchan.it>'
+    MAIL_ACTIVATION_URL = 'http://localhost:5000'   # Base URL of activation links
+    MAIL_BATCH          = 50                        # Emails sent per SMTP connection...
+    MAIL_RATE           = 10                        # ...max. this many per second
+    MAIL_MAX_ATTEMPTS   = 5                         # Failed deliveries are retried with exponential backoff...
+    MAIL_RETRY_DELAY    = 60                        # ...starting from this delay (seconds)
+    MAIL_LEASE          = 30 * 60                   # Seconds a sender holds claimed emails (longer than a batch)
+    MAIL_INTERVAL       = 10                        # Seconds between background runs, None to disable
+
+    # Nickname availability filter, one per worker process (see server.common.nicknames)
+    NICKNAME_FILTER_CAPACITY = 100000   # Expected nicknames, the filter is rebuilt twice as big when exceeded
+    NICKNAME_FILTER_ERROR    = 0.01     # False positive rate (false positives are looked up in database)
+    NICKNAME_FILTER_REFRESH  = 30       # Seconds between loads of nicknames registered by other workers
+
+    THUMBNAIL_FOLDER  = os.path.join(staticdir, 'thumbs')
+    THUMBNAIL_SIZE    = (320, 320)          # Bounding box, aspect ratio is preserved
+    THUMBNAIL_FORMATS = ['JPEG', 'WEBP']    # First one is the fallback for clients without WebP support
+    THUMBNAIL_QUALITY = 75
+    THUMBNAIL_WORKERS = 2                   # Process pool size for thumbnail generation
 
 
 class DevelopmentConfig(Config):
@@ -31,9 +112,35 @@ class DevelopmentConfig(Config):
     """
     DEBUG = True
 
+    AUTHID_KEY = 'Development AuthID Key'
+
+    MAIL_PORT = 8025  # SMTP stub, see smtp_stub.py
+
 
 class TestingConfig(Config):
     """
     Subclassed from Config, serves for testing stage.
     """
     TESTING = True
+
+    AUTHID_KEY = 'Testing AuthID Key'
+
+    MAIL_PORT = 8025  # SMTP stub, see smtp_stub.py
+
+
+class BenchmarkConfig(TestingConfig):
+    """
+    Subclassed from TestingConfig, serves for load benchmarks (see benchmarks.load).
+    Database and media are kept apart, since benchmark runs wipe them.
+    """
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(benchdir, 'benchmark.db')
+    UPLOAD_FOLDER      = os.path.join(benchdir, 'media')
+    THUMBNAIL_FOLDER   = os.path.join(benchdir, 'media', 'thumbs')
+    UPLOAD_QUOTA_BYTES = 1024 * 1024 * 1024     # Benchmark users upload way more than real ones
+
+
+class MicrobenchmarkConfig(BenchmarkConfig):
+    """
+    Subclassed from BenchmarkConfig, serves for microbenchmarks (see benchmarks.micro): in-memory database.
+    """
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
@@ -1,9 +1,12 @@
 #!flask/bin/python
 import os.path
-from server import uchan
+from server import create_app
 from config import Config
 from migrate.versioning import api
 
+# Database and models only, API resources are not needed
+uchan = create_app(resources=False)
+
 # Crea il database
 uchan.db.create_all()
 
@@ -1,9 +1,12 @@
 #!flask/bin/python
 import imp
-from server import uchan
+from server import create_app
 from config import Config
 from migrate.versioning import api
 
+# Database and models only, API resources are not needed
+uchan = create_app(resources=False)
+
 # Database
 db = uchan.db
 
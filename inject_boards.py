@@ -1,8 +1,11 @@
 #!flask/bin/python
-from server import uchan
+from server import create_app
 from server.models import Board
 from flask import json
 
+# Database and models only, API resources are not needed
+uchan = create_app(resources=False)
+
 with open('boards.json', 'r') as general_boards:
     boards_list = json.load(general_boards)
 
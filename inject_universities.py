@@ -1,8 +1,11 @@
 #!flask/bin/python
 from flask import json
-from server import uchan
+from server import create_app
 from server.models import University
 
+# Database and models only, API resources are not needed
+uchan = create_app(resources=False)
+
 
 with open('universities.json', 'r') as uni_file:
     uni_list = json.load(uni_file)
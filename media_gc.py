@@ -0,0 +1,26 @@
+#!flask/bin/python
+from sys import argv
+from server import create_app
+from server.common import mediagc
+
+# Database and models only, API resources are not needed
+uchan = create_app(resources=False)
+
+help = """
+    Usage: media_gc.py [--dry-run]
+
+    Deletes media files not referenced by threads, posts, messages or profile pictures,
+    and older than MEDIA_GC_GRACE seconds.
+"""
+
+if __name__ == '__main__' and len(argv) <= 2 and argv[1:] in [[], ['--dry-run']]:
+    dry_run = len(argv) == 2
+    deleted = mediagc.collect(dry_run)
+
+    for name in deleted:
+        print(name)
+
+    print(('Would delete ' if dry_run else 'Deleted ') + str(len(deleted)) + ' orphaned media files')
+
+else:
+    print(help)
@@ -0,0 +1,21 @@
+#!flask/bin/python
+from sys import argv
+from server import create_app
+from server.common import profiling
+
+# Database and models only, API resources are not needed
+uchan = create_app(resources=False)
+
+help = """
+    Usage: profile_token.py
+
+    Prints a signed token, valid for PROFILE_TOKEN_MAX_AGE seconds: requests carrying it
+    in the PROFILE_HEADER header are profiled (if PROFILE is set), e.g.
+        curl -H "uChan-Profile: <token>" ...
+"""
+
+if __name__ == '__main__' and len(argv) == 1:
+    print(profiling.new_token())
+
+else:
+    print(help)
@@ -0,0 +1,20 @@
+#!flask/bin/python
+from sys import argv
+from server import create_app
+from server.common import bulk
+
+# Database and models only, API resources are not needed
+uchan = create_app(resources=False)
+
+help = """
+    Usage: prune_userboards.py
+
+    Deletes general boards subscriptions stored before implicit membership (see User.board_subscribed()):
+    only university boards subscriptions and general boards opt-outs are kept.
+"""
+
+if __name__ == '__main__' and len(argv) == 1:
+    print('{} subscriptions deleted'.format(bulk.prune_general_subscriptions()))
+
+else:
+    print(help)
@@ -0,0 +1,23 @@
+#!flask/bin/python
+from sys import argv
+from server import create_app
+from server.common import outbox
+
+# Database and models only, API resources are not needed
+uchan = create_app(resources=False)
+
+help = """
+    Usage: send_outbox.py [--loop]
+
+    Delivers due outbox emails (e.g. activation emails queued by registrations) through MAIL_SERVER;
+    with --loop, keeps delivering every MAIL_INTERVAL seconds (like deployment background sender).
+"""
+
+if __name__ == '__main__' and argv[1:] == []:
+    print('Sent {0} emails, {1} failed'.format(*outbox.send_all()))
+
+elif __name__ == '__main__' and argv[1:] == ['--loop']:
+    outbox.start_background(uchan.app.config.get('MAIL_INTERVAL') or 10).join()
+
+else:
+    print(help)
@@ -1,34 +1,68 @@
+import logging
+from os import path, makedirs, environ
 from flask import Flask
 from flask_restful import Api
 from flask_sqlalchemy import SQLAlchemy
 
-# Import for full deployment
-from tornado.wsgi import WSGIContainer
-from tornado.httpserver import HTTPServer
-from tornado.ioloop import IOLoop
+# Default configuration, if not specified with UCHAN_CONFIG environment variable
+default_config = 'config.DevelopmentConfig'
+
+# SECRET_KEY of config.Config, never a valid key
+placeholder_key = 'Insert Secret Key'
 
 
 class Uchan:
     """
     Uchan wrapping class for api, WSGI app and database.
     Intended for singleton use (even if it's unnecessary).
+
+    Object is constructed unconfigured at import time (so that models can be declared);
+    see create_app() for configuration and resources registration.
     """
-    app    = Flask(__name__)
-    api    = Api(app)
-    db     = None
-    config = None
+    app        = Flask(__name__)
+    api        = Api(app)
+    db         = None
+    config     = None
+    registered = False
 
-    def __init__(self, config: str):
+    def __init__(self):
         """
-        Construct Uchan class using specified configuration.
+        Construct Uchan class, with an unbound database.
 
-        :param config: Configuration class name
         :return: New Uchan object
         """
-        self.config = config
+        self.db = SQLAlchemy()
+
+    def configure(self, config: str):
+        """
+        Configures app and binds database to it.
+        Refuses configurations without an explicit AUTHID_KEY: anonymous authids (see routines.calculate_authid())
+        keyed with a missing or public key could be recomputed by anyone.
+
+        :param config: Configuration class name
+        :return: Nothing
+        """
         # App configuration
-        self.app.config.from_object(self.config)
-        self.db = SQLAlchemy(self.app)
+        self.app.config.from_object(config)
+
+        if self.app.config.get('AUTHID_KEY') in (None, '', placeholder_key):
+            raise ValueError('{} has no AUTHID_KEY: set it to a secret value'.format(config))
+
+        self.config = config
+        self.db.init_app(self.app)
+        # Bind database to app like SQLAlchemy(app) does, so that scripts can use it outside app context
+        self.db.app = self.app
+
+    def register_resources(self):
+        """
+        Imports API modules and registers their resources and hooks.
+
+        :return: Nothing
+        """
+        from server.api import register_resources
+
+        register_resources(self.api)
+        self.registered = True
 
     def commit(self):
         """
@@ -72,23 +106,168 @@ class Uchan:
         :param _port: Server port
         :return: Nothing
         """
+        # Outbox sender runs in the serving process only, not in the reloader one
+        if self.app.config.get('MAIL_INTERVAL') is not None and \
+                (not self.app.debug or environ.get('WERKZEUG_RUN_MAIN') == 'true'):
+            from server.common import outbox
+            outbox.start_background(self.app.config.get('MAIL_INTERVAL'))
+
         self.app.run(host='0.0.0.0', port=_port)
 
-    def deployment_start(self, _port: int):
+    def deployment_application(self):
+        """
+        Builds Tornado application for deployment.
+        Media files (see server.api.media.MediaHandler), chat WebSocket (see server.api.chatsocket.ChatSocket),
+        thread events (see server.api.events.ThreadEvents) and, if FASTPATH is set, board and thread pages
+        (see server.api.fastpath) are served natively by Tornado; everything else falls back to the WSGI app.
+
+        :return: Tornado Application object
+        """
+        from tornado.web import Application, FallbackHandler
+        from tornado.wsgi import WSGIContainer
+        from server.api.media import MediaHandler
+        from server.api.chatsocket import ChatSocket
+        from server.api.events import ThreadEvents
+        from server.common.wsgipool import PooledWSGIContainer, PoolStatsHandler
+        from server.common import metrics
+
+        handlers = [
+            (r'/api/media/(.*)', MediaHandler, {'path': self.app.config.get('UPLOAD_FOLDER')}),
+            (r'/api/chat/socket', ChatSocket),
+            (r'/api/thread/(\d+)/events', ThreadEvents)
+        ]
+
+        if self.app.config.get('WSGI_POOL_SIZE') is None:
+            # WSGI calls run on the IOLoop thread
+            container = WSGIContainer(self.app)
+        else:
+            # WSGI calls run on a bounded thread pool, see server.common.wsgipool
+            container = PooledWSGIContainer(self.app, self.app.config.get('WSGI_POOL_SIZE'),
+                                            self.app.config.get('WSGI_POOL_QUEUE'))
+
+            if self.app.config.get('WSGI_POOL_STATUS'):
+                handlers.append((r'/status/wsgi', PoolStatsHandler, {'container': container}))
+
+            if self.app.config.get('METRICS'):
+                metrics.add_collector(container.samples)
+
+        if self.app.config.get('FASTPATH'):
+            # Native Tornado GET handlers for board and thread pages, see server.api.fastpath
+            from server.api import fastpath
+            handlers += fastpath.handlers(container)
+
+        handlers.append((r'.*', FallbackHandler, {'fallback': container}))
+
+        settings = {'websocket_ping_interval': self.app.config.get('WEBSOCKET_PING_INTERVAL')}
+
+        if self.app.config.get('METRICS'):
+            # Requests served natively by Tornado handlers, see server.common.metrics.log_request()
+            settings['log_function'] = metrics.log_request
+
+        return Application(handlers, **settings)
+
+    def after_fork(self, task_id: int):
+        """
+        Prepares a forked worker process: database connections and metrics inherited from the parent process
+        are dropped (each worker opens its own pool and keeps its own metrics), and worker logs are written
+        to their own file in LOG_FOLDER.
+
+        :param task_id: Worker ID (from 0 to workers - 1)
+        :return: Nothing
+        """
+        from server.common import metrics
+
+        self.db.engine.dispose()
+        metrics.reset()
+
+        folder = self.app.config.get('LOG_FOLDER')
+        makedirs(folder, exist_ok=True)
+
+        log_handler = logging.FileHandler(path.join(folder, 'worker-{}.log'.format(task_id)))
+        log_handler.setFormatter(logging.Formatter('%(asctime)s [worker {}] %(levelname)s %(name)s: %(message)s'
+                                                   .format(task_id)))
+        logging.getLogger().addHandler(log_handler)
+        logging.getLogger().setLevel(logging.INFO)
+        self.app.logger.addHandler(log_handler)
+
+    def deployment_start(self, _port: int, workers=1):
         """
         Starts Uchan webserver app with Tornado Async WSGI server engine.
         Intended for production phase and full deployment solution.
 
-        :param _port: Server port
+        workers = 1 (default) serves from a single process, without forking. Prefork mode is opt-in: with workers
+        different than 1, server socket is bound once and shared by 'workers' forked processes (0 for one per CPU),
+        and parent process only monitors and restarts workers.
+        Prefork mode is not suitable for real-time features: chat sockets and thread events (see server.common.pubsub)
+        are only delivered to clients of the same worker process.
+
+        :param _port:   Server port
+        :param workers: Number of worker processes (0 for CPU count)
         :return: Nothing
         """
-        http_server = HTTPServer(WSGIContainer(self.app))
-        http_server.listen(_port)
+        from tornado.httpserver import HTTPServer
+        from tornado.ioloop import IOLoop
+        from tornado.netutil import bind_sockets
+        from tornado.process import fork_processes
+        from server.api.admission import AdmissionDelegate
+
+        sockets = bind_sockets(_port)
+        task_id = 0
+
+        if workers != 1:
+            task_id = fork_processes(workers)
+            self.after_fork(task_id)
+
+        if self.app.config.get('MEDIA_GC_INTERVAL') is not None and task_id == 0:
+            from server.common import mediagc
+            mediagc.start_background(self.app.config.get('MEDIA_GC_INTERVAL'))
+
+        if self.app.config.get('MAIL_INTERVAL') is not None and task_id == 0:
+            from server.common import outbox
+            outbox.start_background(self.app.config.get('MAIL_INTERVAL'))
+
+        # Each worker loads its own nicknames filter before serving
+        from server.common import nicknames
+
+        with self.app.app_context():
+            nicknames.load()
+            self.db.session.remove()
+
+        # Upload admission runs on request headers, before bodies are buffered (see server.api.admission);
+        # bodies of unknown length over MAX_CONTENT_LENGTH are refused by Tornado too (default 100MB)
+        http_server = HTTPServer(AdmissionDelegate(self.deployment_application()),
+                                 max_body_size=self.app.config['MAX_CONTENT_LENGTH'])
+        http_server.add_sockets(sockets)
         IOLoop.instance().start()
 
-uchan = Uchan('config.DevelopmentConfig')
 
-from server.api import *
+def create_app(config=None, resources=True):
+    """
+    Uchan application factory.
+    Configures the Uchan singleton and, if requested, registers API resources.
+
+    Maintenance scripts only need database and models, so they can skip resources registration
+    (and API modules import).
+
+    :param config:    Configuration class name (default: UCHAN_CONFIG environment variable, or default_config)
+    :param resources: Registers API resources
+    :return: Configured Uchan object
+    """
+    if config is None:
+        config = environ.get('UCHAN_CONFIG', default_config)
+
+    if uchan.config is None:
+        uchan.configure(config)
+    elif uchan.config != config:
+        raise ValueError('Uchan already configured with {}'.format(uchan.config))
+
+    if resources and not uchan.registered:
+        uchan.register_resources()
+
+    return uchan
+
+uchan = Uchan()
+
 from server.common import *
 
 __author__  = 'Danilo Cianfrone'
@@ -3,7 +3,7 @@ from functools import wraps
 from base64 import b64decode
 from flask_restful import Resource, reqparse, request
 # API related imports
-from server.common import responses
+from server.common import responses, thumbnails
 from server.common.routines import get_user
 from server.common.routines import new_filename, is_valid_file, decode_file
 from server.models import Session
@@ -66,6 +66,25 @@ def handler_args(method):
     return wrapped
 
 
+def authorized_request(session: Session, func, *args, **kwargs):
+    """
+    Calls session oriented request closure with the User bind to an authorized session.
+    See AuthEntity.session_oriented_request().
+
+    :param session: Authorized Session object
+    :param func:    HTTP method implementation function
+    :param args:    Arguments
+    :param kwargs:  Assigned arguments
+    :return: Closure result, or 404 Not Found if session user does not exist
+    """
+    user = get_user(session.user)
+
+    if user is None:
+        return responses.client_error(404, 'User not found')
+
+    return func(user, *args, **kwargs)
+
+
 class AuthException(Exception):
     """
     AuthEntity authorization exception.
@@ -82,11 +101,10 @@ class BasicEntity(Resource):
     It assures basic headers checks using a RequestParser from Flask-RESTful framework.
     Any resource intended to be accessible from outside without an OAuth mechanism, needs to be
     subclassed from this class.
+
+    Flask-RESTful constructs a new resource object for every request, so all request state (parsers, parsed
+    headers and arguments) lives in the resource object and is never shared between concurrent requests.
     """
-    form    = reqparse.RequestParser()
-    parser  = reqparse.RequestParser()
-    headers = None
-    args    = None
     clients = ['android', 'ios', 'windows']
 
     def __init__(self):
@@ -98,6 +116,11 @@ class BasicEntity(Resource):
 
         :return: New BasicEntity resource object
         """
+        self.form    = reqparse.RequestParser()
+        self.parser  = reqparse.RequestParser()
+        self.headers = None
+        self.args    = None
+
         self.parser.add_argument('uChan-Client-Type', location='headers')
         self.parser.add_argument('uChan-Client-Version', location='headers')
         self.parser.add_argument('Accept', location='headers')
@@ -115,12 +138,24 @@ class BasicEntity(Resource):
         if request.method in ['POST', 'PUT']:
             self.args = self.form.parse_args()
 
-        uchan_type = self.headers['uChan-Client-Type']
-        uchan_vers = self.headers['uChan-Client-Version']
-        uchan_acc  = self.headers['Accept']
-        uchan_cont = self.headers['Content-Type'] if cont_type else 'application/json'
+        return self.valid_headers(self.headers, cont_type)
+
+    @classmethod
+    def valid_headers(cls, headers, cont_type=False):
+        """
+        Checks if basic headers values are correct.
+        Usable outside Flask-RESTful as well (see server.api.fastpath).
+
+        :param headers:   Headers mapping (parsed arguments or raw request headers)
+        :param cont_type: Content-Type header flag, checked if it's set to True
+        :return: If basic headers are correct
+        """
+        uchan_type = headers.get('uChan-Client-Type')
+        uchan_vers = headers.get('uChan-Client-Version')
+        uchan_acc  = headers.get('Accept')
+        uchan_cont = headers.get('Content-Type') if cont_type else 'application/json'
 
-        check_type = uchan_type is not None and uchan_type in self.clients
+        check_type = uchan_type is not None and uchan_type in cls.clients
         check_vers = uchan_vers is not None
         check_acc  = uchan_acc  is not None and 'application/json' in uchan_acc
         check_cont = uchan_cont is not None and 'application/json' in uchan_cont
@@ -155,18 +190,20 @@ class AuthEntity(BasicEntity):
         super().__init__()
         self.parser.add_argument('Authorization', location='headers')
 
-    def check_headers(self, cont_type=False):
+    @classmethod
+    def valid_headers(cls, headers, cont_type=False):
         """
         Checks basic headers calling the superclass, and then checks the integrity
         of the 'Authorization' header (base64 value).
 
+        :param headers:   Headers mapping (parsed arguments or raw request headers)
         :param cont_type: Content-Type header flag, checked if it's set to True
         :return: If basic headers and Authorization header are correct
         """
-        if not super().check_headers(cont_type):
+        if not super().valid_headers(headers, cont_type):
             return False
 
-        uchan_auth = self.headers['Authorization']
+        uchan_auth = headers.get('Authorization')
         return uchan_auth is not None and 'Basic ' in uchan_auth
 
     def get_authorization(self):
@@ -180,13 +217,26 @@ class AuthEntity(BasicEntity):
         if self.headers is None:
             raise AssertionError('Must call check_headers() first')
         else:
-            auth_key = self.headers['Authorization'].replace('Basic ', '', 1)
+            return self.parse_authorization(self.headers['Authorization'])
+
+    @staticmethod
+    def parse_authorization(authorization: str):
+        """
+        Extracts the session key from an 'Authorization' header value.
+
+        :param authorization: Authorization header value ('Basic ' + Base64 of 'token:X')
+        :return: Session key, or None if header value is not valid
+        """
+        try:
+            auth_key = authorization.replace('Basic ', '', 1)
             sess_key = b64decode(auth_key).decode('utf-8').split(':')
+        except (ValueError, AttributeError):
+            return None
 
-            if sess_key[1] in ['X', 'x']:
-                return sess_key[0]
-            else:
-                return None
+        if len(sess_key) > 1 and sess_key[1] in ['X', 'x']:
+            return sess_key[0]
+        else:
+            return None
 
     def check_authorization(self):
         """
@@ -226,13 +276,7 @@ class AuthEntity(BasicEntity):
         :return:
         """
         try:
-            session = self.check_authorization()
-            user    = get_user(session.user)
-
-            if user is None:
-                return responses.client_error(404, 'User not found')
-
-            return func(user, *args, **kwargs)
+            return authorized_request(self.check_authorization(), func, *args, **kwargs)
         except AuthException as ae:
             return responses.client_error(401, '{}'.format(ae))
 
@@ -242,8 +286,9 @@ class AuthEntity(BasicEntity):
         Defines a subroutine for media handling in Authorization-driven resources POST methods.
         It checks for argument parsing integrity first (see handler_args decorator), then validate
         file field and goes on with securing filename, decoding image string in binary and write it.
+        Thumbnails generation is then scheduled on the thumbnails process pool.
 
-        :return: None
+        :return: New image name
         """
         if not is_valid_file(self.args['image_name']):
             raise ValueError('Image not allowed')
@@ -254,14 +299,29 @@ class AuthEntity(BasicEntity):
         with open(path, 'wb') as file:
             file.write(image)
 
+        thumbnails.submit(name, path)
         return name
 
 
 # Module related imports
-from server.api import activation, board, hello, me, media
+from server.common import metrics, profiling
+from server.api import admission
+from server.api import activation, board, chat, hello, me, media
 from server.api import post, registration, session, thread, university
 
 
+def register_resources(api):
+    """
+    Registers every API module resources and hooks to API routing.
+
+    :param api: Flask-RESTful Api object
+    :return: Nothing
+    """
+    for module in [metrics, profiling, admission, activation, board, chat, hello, me, media, post, registration,
+                   session, thread, university]:
+        module.register(api)
+
+
 __author__  = 'Danilo Cianfrone'
 __version__ = 'v3.0'
 __doc__     = """Uchan API Resource entities and routings"""
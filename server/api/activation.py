@@ -23,17 +23,6 @@ class Activation(Resource):
         """
         return User.query.filter_by(token=token).first()
 
-    @staticmethod
-    def add_to_general_boards(user: User):
-        """
-        Adds specified user to general boards (university.id = 1).
-
-        :param user: User activating object
-        :return: Nothing
-        """
-        for board in Board.query.filter_by(university=1).all():
-            uchan.add_to_db(UserBoard(user.id, board.id), False)
-
     @staticmethod
     def add_to_university_board(user: User):
         """
@@ -61,12 +50,19 @@ class Activation(Resource):
         if user.activated:
             return responses.client_error(409, 'User already activated')
 
-        # Activate user and add it to boards
+        # Activate user (general boards are implicit, see User.board_subscribed()) and add it to university board
         user.activated = True
-        self.add_to_general_boards(user)
         self.add_to_university_board(user)
 
         uchan.commit()
         return responses.successful(200, 'User {} activated'.format(user.nickname))
 
-uchan.api.add_resource(Activation, '/api/activation/<token>')
+
+def register(api):
+    """
+    Registers activation resources to API routing.
+
+    :param api: Flask-RESTful Api object
+    :return: Nothing
+    """
+    api.add_resource(Activation, '/api/activation/<token>')
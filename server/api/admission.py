@@ -0,0 +1,405 @@
+from time import time
+from collections import deque
+from threading import Lock, BoundedSemaphore
+# Flask related imports
+from flask import request, jsonify, json, g
+# Tornado related imports
+from tornado import gen, httputil
+# API related imports
+from server import uchan
+from server.api import AuthEntity
+from server.common import responses, pubsub
+from server.models import Session
+
+# Upload slots for this worker process (see register())
+slots = None
+
+# Set in deployment mode, where admission runs on request headers at the Tornado layer (see AdmissionDelegate)
+on_headers = False
+
+# User ID -> deque of (timestamp, bytes) admitted in the rolling window, by this worker process:
+# in prefork mode, a user can upload up to UPLOAD_QUOTA_BYTES times the number of workers
+quotas       = {}
+quotas_lock  = Lock()
+quotas_swept = 0.0
+
+
+def rejection(code: int, details: str):
+    """
+    Client or server error body of a rejected request.
+
+    :param code:    HTTP Error response code
+    :param details: Error details
+    :return: JSON error response object and code
+    """
+    return responses.client_error(code, details) if code < 500 else responses.server_error(code, details)
+
+
+def rejected(code: int, details: str):
+    """
+    Error response usable outside Flask-RESTful resources.
+
+    :param code:    HTTP Error response code
+    :param details: Error details
+    :return: JSON error response and code
+    """
+    body, code = rejection(code, details)
+    return jsonify(body), code
+
+
+def request_user(authorization: str):
+    """
+    Returns the ID of the user issuing a request.
+
+    :param authorization: Request 'Authorization' header
+    :return: User ID, or None if request is not authorized
+    """
+    sess_key = AuthEntity.parse_authorization(authorization)
+
+    if sess_key is None:
+        return None
+
+    session = Session.query.filter_by(token=sess_key).first()
+    return session.user if session is not None else None
+
+
+def expire(history: deque, since: float):
+    """
+    Forgets uploads out of the rolling window.
+
+    :param history: Deque of (timestamp, bytes)
+    :param since:   Window start timestamp
+    :return: Nothing
+    """
+    while history and history[0][0] <= since:
+        history.popleft()
+
+
+def charge_quota(user: int, length: int):
+    """
+    Charges request body length on user rolling upload quota (of this worker process).
+
+    Users without uploads in the rolling window are dropped: the requesting one right away, the others
+    once per window, so that quotas don't grow with every user who ever uploaded.
+
+    :param user:   User ID
+    :param length: Request body length
+    :return: If user quota allows this upload
+    """
+    global quotas_swept
+
+    now    = time()
+    window = uchan.app.config.get('UPLOAD_QUOTA_WINDOW')
+    limit  = uchan.app.config.get('UPLOAD_QUOTA_BYTES')
+
+    with quotas_lock:
+        if now - quotas_swept > window:
+            for key, history in list(quotas.items()):
+                expire(history, now - window)
+
+                if not history:
+                    del quotas[key]
+
+            quotas_swept = now
+
+        history = quotas.pop(user, deque())
+        expire(history, now - window)
+
+        if sum(size for _, size in history) + length > limit:
+            if history:
+                quotas[user] = history
+
+            return False
+
+        history.append((now, length))
+        quotas[user] = history
+        return True
+
+
+def check_headers(method: str, length, chunked: bool):
+    """
+    Admission checks on request headers.
+
+    Rejects chunked POST and PUT requests without Content-Length (411) or bigger than MAX_CONTENT_LENGTH (413).
+    Bodies bigger than UPLOAD_THRESHOLD are uploads, to be admitted by admit_upload().
+
+    :param method:  Request method
+    :param length:  Request Content-Length (None if missing)
+    :param chunked: Request body is chunked
+    :return: Tuple of (error code, details) if rejected, else None; and if the request is an upload
+    """
+    if method not in ['POST', 'PUT']:
+        return None, False
+
+    if length is None:
+        # Bodies of unknown length cannot be admitted before reading them
+        return ((411, 'Content-Length header is required') if chunked else None), False
+
+    if length > uchan.app.config.get('MAX_CONTENT_LENGTH'):
+        return (413, 'Request body is too large'), False
+
+    return None, length > uchan.app.config.get('UPLOAD_THRESHOLD')
+
+
+def admit_upload(user, length: int):
+    """
+    Takes an upload slot of this worker process, and charges the upload on user rolling quota.
+    Rejects with 503 if all worker upload slots are taken, or with 429 if user quota is exhausted.
+    Slots and quotas are kept by each worker process, so in prefork mode they are multiplied by the workers.
+
+    :param user:   Requesting User ID (None if not authorized)
+    :param length: Request body length
+    :return: Tuple of (error code, details) if rejected, else None (slot taken, see slots.release())
+    """
+    if not slots.acquire(blocking=False):
+        return 503, 'Too many uploads, retry later'
+
+    if user is not None and not charge_quota(user, length):
+        slots.release()
+        return 429, 'Upload quota exceeded, retry later'
+
+    return None
+
+
+def admission():
+    """
+    Upload admission control, executed before request body is read by Flask (see check_headers() and
+    admit_upload()). In deployment mode, Tornado buffers whole bodies before the WSGI app runs, so admission
+    is done on request headers by AdmissionDelegate instead.
+
+    :return: None if request is admitted, else error response
+    """
+    if on_headers:
+        return None
+
+    error, upload = check_headers(request.method, request.content_length,
+                                  'chunked' in request.headers.get('Transfer-Encoding', ''))
+
+    if error is None and upload:
+        error = admit_upload(request_user(request.headers.get('Authorization')), request.content_length)
+        # Slot is released on teardown
+        g.upload_slot = error is None
+
+    return rejected(*error) if error is not None else None
+
+
+def release_upload_slot(exception=None):
+    """
+    Releases upload slot taken by admission(), if any.
+
+    :param exception: Unhandled request exception
+    :return: Nothing
+    """
+    if g.pop('upload_slot', False):
+        slots.release()
+
+
+def register(api):
+    """
+    Registers upload admission control hooks, and creates upload slots from configuration.
+
+    :param api: Flask-RESTful Api object
+    :return: Nothing
+    """
+    global slots
+
+    slots = BoundedSemaphore(api.app.config.get('MAX_CONCURRENT_UPLOADS'))
+    api.app.before_request(admission)
+    api.app.teardown_request(release_upload_slot)
+
+
+def session_user(authorization: str):
+    """
+    Returns the ID of the user issuing a request, outside Flask requests (see request_user()).
+    Runs inside a realtime pool thread.
+
+    :param authorization: Request 'Authorization' header
+    :return: User ID, or None if request is not authorized
+    """
+    with uchan.app.app_context():
+        try:
+            return request_user(authorization)
+        finally:
+            uchan.db.session.remove()
+
+
+class SlotConnection:
+    """
+    Request connection of an admitted upload: its upload slot is released when the response is finished.
+    Every other attribute is the wrapped HTTP1Connection one.
+    """
+    def __init__(self, connection, release):
+        """
+        Wraps request connection.
+
+        :param connection: HTTP1Connection object
+        :param release:    Function releasing upload slot
+        :return: New SlotConnection object
+        """
+        self.connection = connection
+        self.release    = release
+
+    def __getattr__(self, name: str):
+        return getattr(self.connection, name)
+
+    def finish(self):
+        """
+        Finishes response, and releases upload slot.
+
+        :return: Nothing
+        """
+        try:
+            self.connection.finish()
+        finally:
+            self.release()
+
+
+class AdmissionRequest(httputil.HTTPMessageDelegate):
+    """
+    Admission control of a single request, on its headers (see AdmissionDelegate): admitted requests are passed
+    on to the application, rejected ones are answered and their body is never read (connection is closed).
+    """
+    def __init__(self, application: httputil.HTTPServerConnectionDelegate, server_conn: object,
+                 request_conn: httputil.HTTPConnection):
+        """
+        Construct request admission.
+
+        :param application:  Tornado Application object
+        :param server_conn:  Server connection
+        :param request_conn: Request connection
+        :return: New AdmissionRequest object
+        """
+        self.application  = application
+        self.server_conn  = server_conn
+        self.request_conn = request_conn
+        self.delegate     = None
+        self.slot         = False
+
+    def headers_received(self, start_line: httputil.RequestStartLine, headers: httputil.HTTPHeaders):
+        """
+        Checks request headers, admitting uploads asynchronously (see admit()).
+
+        :param start_line: Request start line
+        :param headers:    Request headers
+        :return: None, or awaitable if the request is an upload
+        """
+        try:
+            length = int(headers['Content-Length']) if 'Content-Length' in headers else None
+        except ValueError:
+            # Malformed, refused by HTTP1Connection
+            length = None
+
+        error, upload = check_headers(start_line.method, length, 'chunked' in headers.get('Transfer-Encoding', ''))
+
+        if error is not None:
+            return self.reject(length, *error)
+
+        if upload:
+            return self.admit(start_line, headers, length)
+
+        return self.pass_on(start_line, headers)
+
+    @gen.coroutine
+    def admit(self, start_line: httputil.RequestStartLine, headers: httputil.HTTPHeaders, length: int):
+        """
+        Admits an upload: requesting user is looked up in the realtime pool, off the IOLoop.
+
+        :param start_line: Request start line
+        :param headers:    Request headers
+        :param length:     Request body length
+        :return: Nothing
+        """
+        user  = yield pubsub.get_executor().submit(session_user, headers.get('Authorization'))
+        error = admit_upload(user, length)
+
+        if error is not None:
+            return self.reject(length, *error)
+
+        self.slot = True
+        future    = self.pass_on(start_line, headers)
+
+        if future is not None:
+            yield future
+
+    def pass_on(self, start_line: httputil.RequestStartLine, headers: httputil.HTTPHeaders):
+        """
+        Passes an admitted request on to the application.
+
+        :param start_line: Request start line
+        :param headers:    Request headers
+        :return: Application delegate headers_received() result
+        """
+        connection    = SlotConnection(self.request_conn, self.release) if self.slot else self.request_conn
+        self.delegate = self.application.start_request(self.server_conn, connection)
+        return self.delegate.headers_received(start_line, headers)
+
+    def reject(self, length, code: int, details: str):
+        """
+        Answers a rejected request. Its body is not read: connection is closed once the response is sent.
+
+        :param length:  Request body length (None if unknown)
+        :param code:    HTTP Error response code
+        :param details: Error details
+        :return: Nothing
+        """
+        body, code = rejection(code, details)
+        data       = json.dumps(body).encode('utf-8')
+        headers    = httputil.HTTPHeaders({'Content-Type': 'application/json', 'Content-Length': str(len(data))})
+
+        if length is not None:
+            # Not refused again (400) by HTTP1Connection, on top of this response
+            self.request_conn.set_max_body_size(length)
+
+        self.request_conn.write_headers(httputil.ResponseStartLine('HTTP/1.1', code, body['error']), headers,
+                                        chunk=data)
+        self.request_conn.finish()
+
+    def release(self):
+        """
+        Releases upload slot, if taken.
+
+        :return: Nothing
+        """
+        if self.slot:
+            self.slot = False
+            slots.release()
+
+    def data_received(self, chunk: bytes):
+        if self.delegate is not None:
+            return self.delegate.data_received(chunk)
+
+    def finish(self):
+        if self.delegate is not None:
+            self.delegate.finish()
+
+    def on_connection_close(self):
+        self.release()
+
+        if self.delegate is not None:
+            self.delegate.on_connection_close()
+
+
+class AdmissionDelegate(httputil.HTTPServerConnectionDelegate):
+    """
+    Upload admission control for deployment mode, on request headers: HTTP1Connection and WSGIContainer buffer
+    whole request bodies before Flask runs, so admission() would only run once memory is already spent.
+    Wraps Tornado Application as HTTPServer delegate: see check_headers() and admit_upload(), same checks
+    of admission(), which is then skipped. Upload slots are held until the response is finished.
+    """
+    def __init__(self, application: httputil.HTTPServerConnectionDelegate):
+        """
+        Wraps Tornado application.
+
+        :param application: Tornado Application object
+        :return: New AdmissionDelegate object
+        """
+        global on_headers
+
+        self.application = application
+        on_headers       = True
+
+    def start_request(self, server_conn: object, request_conn: httputil.HTTPConnection):
+        return AdmissionRequest(self.application, server_conn, request_conn)
+
+    def on_close(self, server_conn: object):
+        self.application.on_close(server_conn)
@@ -42,6 +42,24 @@ def board_routine(user: User, func, id: int, *args, **kwargs):
     return func(user, board, *args, **kwargs)
 
 
+def board_page_routine(user: User, board: Board, page: int):
+    """
+    Returns Board's threads list, in JSON representation.
+    Shared by BoardAPI GET method and its native fast path (see server.api.fastpath).
+
+    :param user:  Requesting User object
+    :param board: Board object
+    :param page:  Board page query
+    :return: Board's threads list
+    """
+    threads     = board.get_threads(page)
+    authors     = User.get_authors(thread.author for thread in threads)
+    threadusers = ThreadUser.get_ids((thread.id, thread.author) for thread in threads)
+
+    return responses.successful(200, [JSONRepresentation.thread(thread, user, *authors[thread.author],
+                                                                threadusers=threadusers) for thread in threads])
+
+
 class BoardAPI(AuthEntity):
     """
     Board API Resource entity.
@@ -95,18 +113,7 @@ class BoardAPI(AuthEntity):
         :param page: Board page query
         :return: JSON response (200 OK - Board's threads list, for other errors, see "session_oriented_request")
         """
-        def routine(user: User, board: Board):
-            """
-            Returns Board's threads list, in JSON representation.
-
-            :param user:  Requesting User object
-            :param board: Board object
-            :return: Board's threads list
-            """
-            return responses.successful(200, [JSONRepresentation.thread(thread, user)
-                                              for thread in board.get_threads(page)])
-
-        return self.session_oriented_request(board_routine, routine, id)
+        return self.session_oriented_request(board_routine, board_page_routine, id, page)
 
     @handler_data
     def post(self, id: int):
@@ -150,4 +157,11 @@ class BoardAPI(AuthEntity):
         return self.session_oriented_request(board_routine, routine, id)
 
 
-uchan.api.add_resource(BoardAPI, '/api/board/<int:id>', '/api/board/<int:id>/<int:page>')
+def register(api):
+    """
+    Registers board resources to API routing.
+
+    :param api: Flask-RESTful Api object
+    :return: Nothing
+    """
+    api.add_resource(BoardAPI, '/api/board/<int:id>', '/api/board/<int:id>/<int:page>')
@@ -1,7 +1,10 @@
+# Database related imports
+from sqlalchemy.exc import IntegrityError
+# API related imports
 from server import uchan
 from server.api import AuthEntity
 from server.api import handler, handler_data, handler_args
-from server.models import User, ThreadUser, ChatRequest, Chat, Message
+from server.models import User, ThreadUser, ChatRequest, Chat, ChatInbox, Message
 from server.common import responses, JSONRepresentation
 from server.common.routines import str_to_bool
 
@@ -18,8 +21,8 @@ class ChatRequestAPI(AuthEntity):
     @handler
     def get(self):
         def requests_routine(user: User):
-            return responses.successful(200, [JSONRepresentation.chatrequest(req)
-                                              for req in user.get_requests() if req.accepted is False])
+            return responses.successful(200, [JSONRepresentation.chatrequest(req, sender, university)
+                                              for req, sender, university in user.get_requests()])
 
         return self.session_oriented_request(requests_routine)
 
@@ -34,15 +37,19 @@ class ChatRequestAPI(AuthEntity):
             if user.has_requested_chat(threaduser.user):
                 return responses.client_error(409, 'Chat already requested')
 
-            request = ChatRequest(user.id, threaduser.user)
-            uchan.add_to_db(request)
+            try:
+                request = ChatRequest(user.id, threaduser.user)
+                uchan.add_to_db(request)
+            except IntegrityError:
+                # Concurrent request between the same users
+                uchan.db.session.rollback()
+                return responses.client_error(409, 'Chat already requested')
 
             return responses.successful(201, 'Chat request sent')
 
         return self.session_oriented_request(request_routine)
 
 
-uchan.api.add_resource(ChatRequestAPI, '/api/chat/request', '/api/chat/request/<int:id>')
 # --------------------------------------------------------------------------------------------------------------------->
 
 
@@ -53,13 +60,13 @@ def accept_chat_routine(user: User, func, id: int, *args, **kwargs):
     chatrequest = AcceptChatAPI.get_chatrequest(id)
 
     if chatrequest is None:
-        responses.client_error(404, 'Chat request does not exists')
+        return responses.client_error(404, 'Chat request does not exists')
 
     if chatrequest.u_to != user.id:
-        responses.client_error(401, 'Cannot use this chat request')
+        return responses.client_error(401, 'Cannot use this chat request')
 
     if chatrequest.accepted:
-        responses.client_error(409, 'Chat request already accepted')
+        return responses.client_error(409, 'Chat request already accepted')
 
     return func(user, chatrequest, *args, **kwargs)
 
@@ -80,7 +87,12 @@ class AcceptChatAPI(AuthEntity):
             # Define new Chat entity
             chat = Chat(chatrequest.u_from, chatrequest.u_to)
             chatrequest.accept()
-            uchan.add_to_db(chat)
+            uchan.add_to_db(chat, False)
+
+            # Add chat to both participants inbox
+            uchan.db.session.flush()
+            ChatInbox.add_chat(chat)
+            uchan.commit()
 
             # Return new chat
             return responses.successful(201, 'Chat request accepted')
@@ -96,5 +108,61 @@ class AcceptChatAPI(AuthEntity):
 
         return self.session_oriented_request(accept_chat_routine, deleting_routine, id)
 
-uchan.api.add_resource(AcceptChatAPI, '/api/chat/accept/<int:id>')
 # --------------------------------------------------------------------------------------------------------------------->
+
+
+# --------------------------------------------------------------------------------------------------------------------->
+#  Chat messages  # --------------------------------------------------------------------------------------------------->
+# --------------------------------------------------------------------------------------------------------------------->
+def chat_routine(user: User, func, id: int, *args, **kwargs):
+    chat = ChatAPI.get_chat(id)
+
+    if chat is None:
+        return responses.client_error(404, 'Chat does not exists')
+
+    if not chat.has_user(user.id):
+        return responses.client_error(401, 'Cannot read this chat')
+
+    return func(user, chat, *args, **kwargs)
+
+
+class ChatAPI(AuthEntity):
+
+    @staticmethod
+    def get_chat(id: int):
+        return Chat.query.get(id)
+
+    @handler
+    def get(self, id: int, seq: int):
+        """
+        GET method implementation for ChatAPI resource entity (delta sync).
+
+        :param id:  Chat ID
+        :param seq: Last message sequence number known by client
+        :return: 200 OK - Messages newer than seq, oldest first (max. 100, repeat with last seq to get more)
+        """
+        def since_routine(user: User, chat: Chat):
+            messages = [JSONRepresentation.message(message) for message in chat.get_messages_since(seq)]
+
+            # Client is now up to date (or already was)
+            if seq >= chat.seq or (len(messages) > 0 and messages[-1]['seq'] >= chat.seq):
+                ChatInbox.mark_read(chat.id, user.id)
+                uchan.commit()
+
+            return responses.successful(200, messages)
+
+        return self.session_oriented_request(chat_routine, since_routine, id)
+
+# --------------------------------------------------------------------------------------------------------------------->
+
+
+def register(api):
+    """
+    Registers chat resources to API routing.
+
+    :param api: Flask-RESTful Api object
+    :return: Nothing
+    """
+    api.add_resource(ChatRequestAPI, '/api/chat/request', '/api/chat/request/<int:id>')
+    api.add_resource(AcceptChatAPI, '/api/chat/accept/<int:id>')
+    api.add_resource(ChatAPI, '/api/chat/<int:id>/since/<int:seq>')
@@ -0,0 +1,166 @@
+from flask import json
+# Tornado related imports
+from tornado import gen
+from tornado.websocket import WebSocketHandler
+# API related imports
+from server import uchan
+from server.api import AuthEntity
+from server.models import Session, Chat
+from server.common import responses, pubsub, JSONRepresentation
+
+# User ID -> open ChatSocket handlers of that user (in this process)
+sockets = {}
+
+
+def publish(participants: set, payload: str):
+    """
+    Pushes new chat message, serialized once, to every open socket of both chat participants.
+
+    :param participants: User IDs of chat participants
+    :param payload:      Serialized message
+    :return: Nothing
+    """
+    for user in participants:
+        for socket in list(sockets.get(user, ())):
+            socket.write_message(payload)
+
+
+def session_user(sess_key: str):
+    """
+    Returns the user of a session.
+    Runs inside a realtime pool thread.
+
+    :param sess_key: Session token
+    :return: User ID, or None if session does not exist
+    """
+    with uchan.app.app_context():
+        try:
+            session = Session.query.filter_by(token=sess_key).first()
+            return session.user if session is not None else None
+        finally:
+            uchan.db.session.remove()
+
+
+def persist(user: int, chat_id: int, text: str):
+    """
+    Persists a message through Chat.add_message() and serializes its push payload.
+    Runs inside a realtime pool thread.
+
+    :param user:    Sender user ID
+    :param chat_id: Chat ID
+    :param text:    Message text
+    :return: Tuple of (participants, payload), or of (None, (code, details)) on client errors
+    """
+    with uchan.app.app_context():
+        try:
+            chat = Chat.query.get(chat_id)
+
+            if chat is None:
+                return None, (404, 'Chat does not exist')
+
+            if not chat.has_user(user):
+                return None, (401, 'User cannot write in this chat')
+
+            message = chat.add_message(user, text)
+            uchan.commit()
+
+            body, _ = responses.successful(200, {'chat': chat.id, 'message': JSONRepresentation.message(message)})
+            return {chat.user1, chat.user2}, json.dumps(body)
+        finally:
+            uchan.db.session.remove()
+
+
+class ChatSocket(WebSocketHandler):
+    """
+    Real-time chat WebSocket, served by Tornado next to the WSGI app in deployment mode.
+
+    Handshake is authorized with the same 'Authorization' header of AuthEntity resources.
+    Client sends messages as JSON objects:
+        >>> {"chat": 1, "text": "Hello m8"}
+
+    Every message is persisted through Chat.add_message() and pushed to both participants as
+    {"code": 200, "data": {"chat": <chat id>, "message": <message>}}; errors are sent back to the sender only,
+    with the same format of client_error() responses. Database work runs on the realtime thread pool.
+    """
+    user = None
+
+    def check_origin(self, origin: str):
+        """
+        Native clients do not send meaningful Origin headers.
+
+        :param origin: Origin header value
+        :return: True
+        """
+        return True
+
+    @gen.coroutine
+    def prepare(self):
+        """
+        Authorizes the handshake before upgrading connection.
+
+        :return: Nothing (401 Unauthorized if Authorization header is invalid)
+        """
+        sess_key = AuthEntity.parse_authorization(self.request.headers.get('Authorization'))
+
+        if sess_key is not None:
+            self.user = yield pubsub.get_executor().submit(session_user, sess_key)
+
+        if self.user is None:
+            self.send_error(401)
+
+    def open(self):
+        """
+        Registers socket for its user.
+
+        :return: Nothing
+        """
+        sockets.setdefault(self.user, set()).add(self)
+
+    def on_close(self):
+        """
+        Unregisters socket.
+
+        :return: Nothing
+        """
+        user_sockets = sockets.get(self.user, set())
+        user_sockets.discard(self)
+
+        if not user_sockets:
+            sockets.pop(self.user, None)
+
+    def reply_error(self, code: int, details: str):
+        """
+        Sends client error to this socket only.
+
+        :param code:    HTTP Client Error code
+        :param details: Client Error details
+        :return: Nothing
+        """
+        body, _ = responses.client_error(code, details)
+        self.write_message(json.dumps(body))
+
+    @gen.coroutine
+    def on_message(self, data: str):
+        """
+        Persists incoming message and pushes it to chat participants.
+        Next messages of this socket are not handled until this one is persisted, so they keep their order.
+
+        :param data: Message JSON object
+        :return: Nothing
+        """
+        try:
+            payload = json.loads(data)
+            chat_id = int(payload['chat'])
+            text    = payload['text']
+        except (ValueError, KeyError, TypeError):
+            return self.reply_error(400, 'Invalid message')
+
+        if not isinstance(text, str) or len(text) > 1250:
+            return self.reply_error(400, 'Invalid parameter: text')
+
+        participants, payload = yield pubsub.get_executor().submit(persist, self.user, chat_id, text)
+
+        if participants is None:
+            return self.reply_error(*payload)
+
+        publish(participants, payload)
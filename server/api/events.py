@@ -0,0 +1,291 @@
+from datetime import timedelta
+from flask import json
+# Tornado related imports
+from tornado import gen
+from tornado.locks import Event
+from tornado.ioloop import IOLoop
+from tornado.web import RequestHandler
+from tornado.iostream import StreamClosedError
+# API related imports
+from server import uchan
+from server.api import AuthEntity
+from server.models import Session, User, Thread, Post, ThreadUser
+from server.common import responses, pubsub, JSONRepresentation
+from server.common.routines import get_user
+
+# (thread ID, last seen post ID, last published post ID) -> pending load of the subscribers woken up by a publish,
+# so that new posts are queried and rendered once for all of them
+loads = {}
+
+
+def load_posts(thread_id: int, last: int):
+    """
+    Returns posts of a thread newer than last seen, rendered for any viewer (see personalize()).
+    Runs inside a realtime pool thread.
+
+    :param thread_id: Thread ID
+    :param last:      Last seen post ID
+    :return: List of (post ID, anon, author ID, post JSON representation)
+    """
+    with uchan.app.app_context():
+        try:
+            thread = Thread.query.get(thread_id)
+
+            if thread is None:
+                return []
+
+            posts = Post.query.filter(Post.thread == thread.id, Post.id > last)\
+                .order_by(Post.id).limit(uchan.app.config.get('EVENTS_BATCH')).all()
+
+            # Authors, their ThreadUser IDs and authids are loaded once for the batch, as thread_page_routine() does
+            authors     = User.get_authors(post.author for post in posts)
+            threadusers = ThreadUser.get_ids((thread.id, post.author) for post in posts)
+
+            # Rendered as seen by their authors, viewer dependent fields are set by personalize()
+            return [(post.id, post.anon, post.author,
+                     JSONRepresentation.post(post, thread, authors[post.author][0], *authors[post.author],
+                                             threadusers=threadusers)) for post in posts]
+        finally:
+            uchan.db.session.remove()
+
+
+def personalize(post: dict, anon: bool, author: int, user: int, admin: bool):
+    """
+    Sets viewer dependent fields of a post rendered by load_posts(), as JSONRepresentation.post() does.
+
+    :param post:   Post JSON representation
+    :param anon:   Post is anonymous
+    :param author: Post author ID
+    :param user:   Viewer user ID
+    :param admin:  Viewer is an admin
+    :return: Post JSON representation for the viewer
+    """
+    return dict(post, anon=not admin and anon, delete=admin or author == user)
+
+
+class ThreadEvents(RequestHandler):
+    """
+    New posts stream of a watched thread, served by Tornado in deployment mode.
+
+    Client supplies last seen post ID with 'Last-Event-ID' header or 'last' query argument, and receives only newer
+    posts, in the same JSON representation of ThreadAPI GET method.
+    By default posts are streamed as Server-Sent Events ('post' events, with post ID as event ID); with 'poll'
+    query argument the request is answered once (long-poll), as soon as new posts are available or on timeout.
+
+    Handler waits on an in-process pub/sub topic fed by ThreadAPI POST method, so idle connections
+    do not hold database sessions nor poll the database. Database work runs on the realtime thread pool,
+    and posts are loaded once per publish for every subscriber woken up by it.
+    """
+    def initialize(self):
+        """
+        Initializes per-connection state.
+
+        :return: Nothing
+        """
+        self.user      = None
+        self.admin     = False
+        self.thread    = None
+        self.last      = 0
+        self.published = 0
+        self.closed    = False
+        self.event     = Event()
+
+    def reply_error(self, code: int, details: str):
+        """
+        Finishes request with client error JSON response.
+
+        :param code:    HTTP Client Error code
+        :param details: Client Error details
+        :return: Nothing
+        """
+        body, code = responses.client_error(code, details)
+        self.set_status(code)
+        self.set_header('Content-Type', 'application/json')
+        self.finish(json.dumps(body))
+
+    def authorize(self, thread_id: int):
+        """
+        Checks authorization and thread access, like thread_routine() does for ThreadAPI.
+        Runs inside a realtime pool thread.
+
+        :param thread_id: Thread ID
+        :return: None if authorized, else (code, details) error tuple
+        """
+        with uchan.app.app_context():
+            try:
+                sess_key = AuthEntity.parse_authorization(self.request.headers.get('Authorization'))
+                session  = Session.query.filter_by(token=sess_key).first() if sess_key is not None else None
+
+                if session is None:
+                    return 401, 'Invalid authorization'
+
+                user   = get_user(session.user)
+                thread = Thread.query.get(thread_id)
+
+                if user is None:
+                    return 404, 'User not found'
+
+                if thread is None:
+                    return 404, 'Thread does not exist'
+
+                if not user.board_subscribed(thread.board):
+                    return 401, 'User is not authorized to see this thread'
+
+                self.user, self.admin, self.thread = user.id, user.admin, thread.id
+                return None
+            finally:
+                uchan.db.session.remove()
+
+    @gen.coroutine
+    def pending(self, shared=False):
+        """
+        Returns posts newer than last seen, in JSON representation, and moves last seen post forward.
+
+        :param shared: Load is due to a publish, and shared with the other subscribers woken up by it
+        :return: List of (post ID, post JSON representation)
+        """
+        key  = (self.thread, self.last, self.published)
+        load = loads.get(key) if shared else None
+
+        if load is None:
+            load = pubsub.get_executor().submit(load_posts, self.thread, self.last)
+
+            if shared:
+                def done(_):
+                    if loads.get(key) is load:
+                        del loads[key]
+
+                loads[key] = load
+                IOLoop.current().add_future(load, done)
+
+        posts    = yield load
+        rendered = [(post_id, personalize(post, anon, author, self.user, self.admin))
+                    for post_id, anon, author, post in posts]
+
+        if rendered:
+            self.last = rendered[-1][0]
+
+        return rendered
+
+    def notify(self, data: int):
+        """
+        Pub/sub callback, wakes up the waiting request.
+
+        :param data: Published post ID
+        :return: Nothing
+        """
+        self.published = max(self.published, data)
+        self.event.set()
+
+    def on_connection_close(self):
+        """
+        Wakes up the waiting request, so that it can terminate.
+
+        :return: Nothing
+        """
+        self.closed = True
+        self.event.set()
+
+    @gen.coroutine
+    def wait(self, seconds: float):
+        """
+        Waits for a pub/sub notification, or timeout.
+
+        :param seconds: Timeout (seconds)
+        :return: If a notification has been received
+        """
+        try:
+            yield self.event.wait(timeout=timedelta(seconds=seconds))
+            return True
+        except gen.TimeoutError:
+            return False
+
+    @gen.coroutine
+    def get(self, id: str):
+        """
+        GET method implementation for ThreadEvents.
+
+        :param id: Thread ID
+        :return: Server-Sent Events stream, or 200 OK - Posts list (long-poll),
+                 (401 Unauthorized, 404 Not Found, 400 Bad Request - invalid last post ID)
+        """
+        try:
+            self.last = int(self.request.headers.get('Last-Event-ID') or self.get_argument('last', '0'))
+        except ValueError:
+            return self.reply_error(400, 'Invalid parameter: last')
+
+        error = yield pubsub.get_executor().submit(self.authorize, int(id))
+
+        if error is not None:
+            return self.reply_error(*error)
+
+        topic = pubsub.thread_topic(self.thread)
+        pubsub.subscribe(topic, self.notify)
+
+        try:
+            if self.get_argument('poll', None) is not None:
+                yield self.long_poll()
+            else:
+                yield self.stream()
+        finally:
+            pubsub.unsubscribe(topic, self.notify)
+
+    @gen.coroutine
+    def long_poll(self):
+        """
+        Answers with new posts as soon as they're available, or on timeout.
+        Database is queried again on timeout too, for posts published by other worker processes.
+
+        :return: Nothing
+        """
+        posts = yield self.pending()
+
+        if not posts:
+            notified = yield self.wait(uchan.app.config.get('EVENTS_POLL_TIMEOUT'))
+
+            if self.closed:
+                return
+
+            posts = yield self.pending(notified)
+
+        if self.closed:
+            return
+
+        body, code = responses.successful(200, [post for _, post in posts])
+        self.set_header('Content-Type', 'application/json')
+        self.finish(json.dumps(body))
+
+    @gen.coroutine
+    def stream(self):
+        """
+        Streams new posts as Server-Sent Events until client disconnects.
+        A comment line is sent every EVENTS_HEARTBEAT seconds without new posts.
+
+        :return: Nothing
+        """
+        self.set_header('Content-Type', 'text/event-stream')
+        self.set_header('Cache-Control', 'no-cache')
+
+        batch, notified = uchan.app.config.get('EVENTS_BATCH'), False
+
+        while not self.closed:
+            self.event.clear()
+
+            posts = yield self.pending(notified)
+
+            while posts:
+                for post_id, post in posts:
+                    self.write('id: {0}\nevent: post\ndata: {1}\n\n'.format(post_id, json.dumps(post)))
+
+                # Only a full batch may be followed by more posts
+                posts = (yield self.pending(notified)) if len(posts) == batch else []
+
+            try:
+                yield self.flush()
+            except StreamClosedError:
+                return
+
+            notified = yield self.wait(uchan.app.config.get('EVENTS_HEARTBEAT'))
+
+            if not notified and not self.closed:
+                self.write(': heartbeat\n\n')
@@ -0,0 +1,133 @@
+from concurrent.futures import ThreadPoolExecutor
+# Flask related imports
+from flask_restful.representations.json import output_json
+# Tornado related imports
+from tornado import gen
+from tornado.web import FallbackHandler
+# API related imports
+from server import uchan
+from server.api import AuthEntity, authorized_request
+from server.api.board import board_routine, board_page_routine
+from server.api.thread import thread_routine, thread_page_routine
+from server.models import Session
+from server.common import responses
+
+# Database work of fast path requests runs here, never on the IOLoop
+executor = None
+
+
+def get_executor():
+    """
+    Returns fast path thread pool, created on first use (after prefork).
+
+    :return: ThreadPoolExecutor object
+    """
+    global executor
+
+    if executor is None:
+        executor = ThreadPoolExecutor(max_workers=uchan.app.config.get('FASTPATH_POOL_SIZE'))
+
+    return executor
+
+
+def fast_request(headers, resource_routine, page_routine, id: int, page: int):
+    """
+    Same checks and routines of an AuthEntity GET method (see handler decorator and session_oriented_request()),
+    on raw request headers; then serializes response exactly like Flask-RESTful does (Api.make_response() sets
+    Content-Type to the representation media type, after output_json()). Runs inside a fast path pool thread.
+
+    :param headers:          Request headers
+    :param resource_routine: Resource routine (board_routine or thread_routine)
+    :param page_routine:     Page routine (board_page_routine or thread_page_routine)
+    :param id:               Resource ID
+    :param page:             Page query
+    :return: Response status code, Content-Type and body
+    """
+    with uchan.app.app_context():
+        try:
+            if not AuthEntity.valid_headers(headers):
+                data, code = responses.client_error(400, 'Wrong format request')
+            else:
+                sess_key = AuthEntity.parse_authorization(headers.get('Authorization'))
+                session  = Session.query.filter_by(token=sess_key).first() if sess_key is not None else None
+
+                if session is None:
+                    data, code = responses.client_error(401, 'Invalid authorization')
+                else:
+                    data, code = authorized_request(session, resource_routine, page_routine, id, page)
+
+            return code, 'application/json', output_json(data, code).get_data()
+        finally:
+            uchan.db.session.remove()
+
+
+class FastPathHandler(FallbackHandler):
+    """
+    Native Tornado GET handler for a paginated AuthEntity resource, skipping WSGIContainer, Flask routing
+    and reqparse. Responses are the same, byte-for-byte, of the Flask-RESTful resource (see
+    benchmarks.fastpath_diff). Other HTTP methods fall back to the WSGI app.
+
+    Flask request hooks do not run: upload admission (it only checks POST and PUT, which fall back anyway)
+    and profiling (sampled and token requests are not profiled on the fast path). Request metrics are
+    recorded by the Tornado application log function instead.
+    """
+    def initialize(self, fallback, resource_routine, page_routine):
+        """
+        Initializes handler with WSGI fallback and resource routines.
+
+        :param fallback:         WSGI container
+        :param resource_routine: Resource routine (board_routine or thread_routine)
+        :param page_routine:     Page routine (board_page_routine or thread_page_routine)
+        :return: Nothing
+        """
+        super().initialize(fallback)
+        self.resource_routine = resource_routine
+        self.page_routine     = page_routine
+
+    def compute_etag(self):
+        """
+        Flask-RESTful resources send no ETag, so neither does the fast path.
+
+        :return: None
+        """
+        return None
+
+    def prepare(self):
+        """
+        Falls back to the WSGI app for methods other than GET.
+
+        :return: Nothing
+        """
+        if self.request.method != 'GET':
+            super().prepare()
+
+    @gen.coroutine
+    def get(self, id: str, page=None):
+        """
+        GET method implementation, database work is done on the fast path thread pool.
+
+        :param id:   Resource ID
+        :param page: Page query
+        :return: Same response of the Flask-RESTful resource GET method
+        """
+        code, content_type, body = yield get_executor().submit(fast_request, self.request.headers,
+                                                               self.resource_routine, self.page_routine,
+                                                               int(id), int(page) if page is not None else 1)
+        self.set_status(code)
+        self.set_header('Content-Type', content_type)
+        self.finish(body)
+
+
+def handlers(fallback):
+    """
+    Returns fast path Tornado routes.
+
+    :param fallback: WSGI container, for methods other than GET
+    :return: List of Tornado routes
+    """
+    return [
+        (r'/api/board/(\d+)(?:/(\d+))?', FastPathHandler,
+         {'fallback': fallback, 'resource_routine': board_routine, 'page_routine': board_page_routine}),
+        (r'/api/thread/(\d+)(?:/(\d+))?', FastPathHandler,
+         {'fallback': fallback, 'resource_routine': thread_routine, 'page_routine': thread_page_routine})
+    ]
@@ -1,4 +1,3 @@
-from server import uchan
 from server.api import BasicEntity
 from server.common import responses
 
@@ -7,4 +6,12 @@ class DecoratedHello(BasicEntity):
     def get(self):
         return 'Hello m8'
 
-uchan.api.add_resource(DecoratedHello, '/')
+
+def register(api):
+    """
+    Registers hello resources to API routing.
+
+    :param api: Flask-RESTful Api object
+    :return: Nothing
+    """
+    api.add_resource(DecoratedHello, '/')
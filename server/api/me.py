@@ -1,9 +1,8 @@
 # Flask related imports
 # API related imports
-from server import uchan
 from server.api import handler
 from server.api import AuthEntity
-from server.models import User
+from server.models import User, ThreadUser
 from server.common import responses
 from server.common import JSONRepresentation
 
@@ -43,10 +42,45 @@ class MeThreads(AuthEntity):
         :return: JSON response (200 OK, 404 Not Found, 401 Unauthorized)
         """
         def routine(user: User):
-            return responses.successful(200, [JSONRepresentation.thread(thread, user)
-                                              for thread in user.get_threads(page)])
+            threads     = user.get_threads(page)
+            authors     = User.get_authors(thread.author for thread in threads)
+            threadusers = ThreadUser.get_ids((thread.id, thread.author) for thread in threads)
+
+            return responses.successful(200, [JSONRepresentation.thread(thread, user, *authors[thread.author],
+                                                                        threadusers=threadusers)
+                                              for thread in threads])
 
         return self.session_oriented_request(routine)
 
-uchan.api.add_resource(Me, '/api/me')
-uchan.api.add_resource(MeThreads, '/api/me/threads', '/api/me/threads/<int:page>')
+
+class MeChats(AuthEntity):
+    """
+    API Resource entity for 'me' resource.
+    It's used to retrieve user-specific informations, so it needs to be subclassed from AuthEntity class.
+
+    This is used to retrieve authorized user chats inbox, most recent first.
+    """
+    @handler
+    def get(self, page=1):
+        """
+        GET method implementation for MeChats API resource entity.
+
+        :param page: Page requested for chat inbox paginated query
+        :return: JSON response (200 OK, 404 Not Found, 401 Unauthorized)
+        """
+        def routine(user: User):
+            return responses.successful(200, [JSONRepresentation.inbox(entry) for entry in user.get_chats(page)])
+
+        return self.session_oriented_request(routine)
+
+
+def register(api):
+    """
+    Registers me resources to API routing.
+
+    :param api: Flask-RESTful Api object
+    :return: Nothing
+    """
+    api.add_resource(Me, '/api/me')
+    api.add_resource(MeThreads, '/api/me/threads', '/api/me/threads/<int:page>')
+    api.add_resource(MeChats, '/api/me/chats', '/api/me/chats/<int:page>')
@@ -1,21 +1,56 @@
-from os.path import join, exists
+from os.path import join, exists, basename, getsize, relpath, sep
 # Flask related imports
-from flask import send_file
+from flask import send_file, request
+# Tornado related imports
+from tornado.web import StaticFileHandler
 # API related imports
 from server import uchan
+from server.common import thumbnails
 
-folder = uchan.app.config.get('UPLOAD_FOLDER')
+
+def cacheable(response, path: str, vary=False, fallback=False):
+    """
+    Adds HTTP caching semantics to a media file response, and resolves conditional and Range requests.
+
+    Media files are named after uuids and never rewritten, so the served file name is a strong ETag
+    and responses can be cached as immutable. The original image served in place of a thumbnail not
+    generated yet is not: it's sent with 'no-cache' and no validators, so that the thumbnail URL
+    serves the thumbnail as soon as it's ready.
+
+    :param response: Flask send_file() response
+    :param path:     Served file path
+    :param vary:     Response depends on Accept header (thumbnails)
+    :param fallback: Original image served in place of its thumbnail
+    :return: 200 OK, 206 Partial Content, 304 Not Modified or 416 Range Not Satisfiable response
+    """
+    if fallback:
+        del response.headers['ETag']
+        del response.headers['Last-Modified']
+        response.headers['Cache-Control'] = 'no-cache'
+    else:
+        response.set_etag(basename(path))
+        response.headers['Cache-Control'] = 'public, max-age={}, immutable'\
+            .format(uchan.app.config.get('MEDIA_CACHE_MAX_AGE'))
+
+    if vary:
+        response.vary.add('Accept')
+
+    return response.make_conditional(request, accept_ranges=True, complete_length=getsize(path))
 
 
-# Using Flask decorator router to avoid JSON serialization of server response
-@uchan.app.route('/api/media/<filename>', methods=['GET'])
 def media(filename: str):
     """
     Routing function for static media files download from server.
 
+    With '?size=thumb' query argument, the image thumbnail is returned; if thumbnail is not ready yet,
+    original image is returned instead.
+
     :param filename: Media file name
-    :return: (200 OK - Media file, 404 Not Found, 500 Internal Server Error - cannot read from configuration file)
+    :return: (200 OK - Media file, 206 Partial Content, 304 Not Modified, 404 Not Found,
+              500 Internal Server Error - cannot read from configuration file)
     """
+    folder = uchan.app.config.get('UPLOAD_FOLDER')
+
     if folder is None:
         # Cannot read from configuration file
         return 'Internal Server Error', 500
@@ -23,9 +58,187 @@ def media(filename: str):
     path = join(folder, filename)
 
     if exists(path):
+        thumb = request.args.get('size') == 'thumb'
+        found = None
+
+        if thumb:
+            # Thumbnail requested, fallback to original image if not generated yet
+            found = thumbnails.find_thumbnail(filename, request.headers.get('Accept'))
+            path  = found if found is not None else path
+
         # If path exists, return file by Flask-based routine
-        return send_file(path), 200
+        return cacheable(send_file(path), path, thumb, thumb and found is None)
     else:
         # ...else, throws 404 Not Found
         return 'Not Found', 404
 
+
+class MediaHandler(StaticFileHandler):
+    """
+    Native Tornado handler for static media files, used in deployment mode.
+
+    Files are streamed in chunks by the IOLoop instead of going through WSGIContainer, so slow media
+    downloads do not block API requests. Same semantics as media() routing function: strong ETags,
+    immutable caching, Range requests and '?size=thumb' thumbnails with fallback (not cached).
+
+    If MEDIA_OFFLOAD is configured, file transfer is offloaded to the reverse proxy.
+    """
+    @staticmethod
+    def thumbnails_root(absolute_path: str):
+        """
+        Returns THUMBNAIL_FOLDER if a path is inside it.
+
+        :param absolute_path: File absolute path
+        :return: THUMBNAIL_FOLDER path, or None
+        """
+        thumbs = uchan.app.config.get('THUMBNAIL_FOLDER')
+
+        if thumbs is not None and absolute_path.startswith(thumbs.rstrip(sep) + sep):
+            return thumbs
+
+        return None
+
+    def is_fallback(self):
+        """
+        Checks if the original image is served in place of a thumbnail not generated yet.
+
+        :return: If response is a thumbnail fallback
+        """
+        return self.get_argument('size', None) == 'thumb' and self.thumbnails_root(self.absolute_path) is None
+
+    def parse_url_path(self, url_path: str):
+        """
+        Resolves requested file name, replacing it with its thumbnail absolute path if requested and ready.
+
+        :param url_path: Media file name
+        :return: File path, relative to UPLOAD_FOLDER or absolute
+        """
+        if self.get_argument('size', None) == 'thumb' and exists(join(self.root, url_path)):
+            thumb = thumbnails.find_thumbnail(url_path, self.request.headers.get('Accept'))
+
+            if thumb is not None:
+                return thumb
+
+        return url_path
+
+    def validate_absolute_path(self, root: str, absolute_path: str):
+        """
+        Validates requested file path, allowing thumbnails folder as well.
+
+        :param root:          UPLOAD_FOLDER path
+        :param absolute_path: Requested file absolute path
+        :return: Validated absolute path (raises 404 Not Found if file does not exist)
+        """
+        return super().validate_absolute_path(self.thumbnails_root(absolute_path) or root, absolute_path)
+
+    @classmethod
+    def get_content_version(cls, abspath: str):
+        """
+        Media names are immutable uuids, so the file name is used as version (instead of hashing contents).
+
+        :param abspath: File absolute path
+        :return: File version, used as strong ETag
+        """
+        return basename(abspath)
+
+    def compute_etag(self):
+        """
+        Thumbnail fallbacks have no ETag, since the thumbnail replaces them at the same URL.
+
+        :return: Strong ETag, or None
+        """
+        return None if self.is_fallback() else super().compute_etag()
+
+    def get_modified_time(self):
+        """
+        Thumbnail fallbacks have no Last-Modified header, for the same reason.
+
+        :return: Modification datetime, or None
+        """
+        return None if self.is_fallback() else super().get_modified_time()
+
+    def set_extra_headers(self, path: str):
+        """
+        Sets immutable caching headers ('no-cache' for thumbnail fallbacks).
+
+        :param path: Requested file path
+        :return: Nothing
+        """
+        if self.is_fallback():
+            self.set_header('Cache-Control', 'no-cache')
+        else:
+            self.set_header('Cache-Control', 'public, max-age={}, immutable'
+                            .format(uchan.app.config.get('MEDIA_CACHE_MAX_AGE')))
+
+        if self.get_argument('size', None) == 'thumb':
+            self.set_header('Vary', 'Accept')
+
+    def check_if_range(self, path: str):
+        """
+        Resolves If-Range, which StaticFileHandler ignores: unless it matches the ETag of the served file,
+        Range header is dropped and the whole file is sent.
+
+        :param path: Media file name
+        :return: Nothing
+        """
+        if_range = self.request.headers.get('If-Range')
+
+        if if_range is None or 'Range' not in self.request.headers:
+            return
+
+        served = self.parse_url_path(path)
+
+        # Thumbnail fallbacks have no ETag, so they never match
+        if (self.get_argument('size', None) == 'thumb' and served == path) or \
+                if_range != '"{}"'.format(basename(served)):
+            del self.request.headers['Range']
+
+    def get(self, path: str, include_body=True):
+        """
+        GET method implementation for media files.
+        Without MEDIA_OFFLOAD, file is streamed by StaticFileHandler.
+
+        :param path:         Media file name
+        :param include_body: False for HEAD requests
+        :return: Media file (200 OK, 206 Partial Content, 304 Not Modified), or offload header, or 404 Not Found
+        """
+        offload = uchan.app.config.get('MEDIA_OFFLOAD')
+
+        if offload is None:
+            self.check_if_range(path)
+            return super().get(path, include_body)
+
+        self.path          = self.parse_url_path(path)
+        self.absolute_path = self.validate_absolute_path(self.root, self.get_absolute_path(self.root, self.path))
+
+        if self.absolute_path is None:
+            return
+
+        self.set_extra_headers(self.path)
+        self.set_header('Content-Type', self.get_content_type())
+
+        if offload == 'X-Accel-Redirect':
+            # Thumbnails are mapped by their own internal location, THUMBNAIL_FOLDER may be outside UPLOAD_FOLDER
+            thumbs = self.thumbnails_root(self.absolute_path)
+
+            if thumbs is not None:
+                self.set_header(offload, uchan.app.config.get('MEDIA_OFFLOAD_THUMB_PREFIX') +
+                                relpath(self.absolute_path, thumbs))
+            else:
+                self.set_header(offload, uchan.app.config.get('MEDIA_OFFLOAD_PREFIX') +
+                                relpath(self.absolute_path, self.root))
+        else:
+            self.set_header(offload, self.absolute_path)
+
+        self.finish()
+
+
+def register(api):
+    """
+    Registers media routing function.
+    Using Flask router to avoid JSON serialization of server response.
+
+    :param api: Flask-RESTful Api object
+    :return: Nothing
+    """
+    api.app.add_url_rule('/api/media/<filename>', 'media', media, methods=['GET'])
@@ -43,4 +43,11 @@ class PostAPI(AuthEntity):
         return self.session_oriented_request(routine)
 
 
-uchan.api.add_resource(PostAPI, '/api/post/<int:id>')
+def register(api):
+    """
+    Registers post resources to API routing.
+
+    :param api: Flask-RESTful Api object
+    :return: Nothing
+    """
+    api.add_resource(PostAPI, '/api/post/<int:id>')
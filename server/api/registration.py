@@ -6,8 +6,8 @@ from sqlalchemy.exc import IntegrityError
 # API related imports
 from server import uchan
 from server.api import BasicEntity
-from server.api import handler_data, handler_args
-from server.common import responses, routines
+from server.api import handler, handler_data, handler_args
+from server.common import responses, routines, outbox, nicknames
 # DB Models related imports
 from server.models import User
 
@@ -70,10 +70,11 @@ class Registration(BasicEntity):
     def check_existing_nickname(self):
         """
         Check if there are not existing nicknames conflicting with nickname specified.
+        Database is only queried if the nicknames filter may contain it (see server.common.nicknames).
 
         :return: If nickname specified in request body is not already registered
         """
-        return User.query.filter_by(nickname=self.args['nickname']).first() is None
+        return nicknames.is_available(self.args['nickname'])
 
     @staticmethod
     def generate_salt():
@@ -128,11 +129,12 @@ class Registration(BasicEntity):
             user = User(self.args['nickname'], routines.hashing_password(salt, self.args['password']), salt,
                         self.args['university'], self.args['email'], self.args['gender'], False, token)
 
-            # TODO: remove this and insert email sending
-            print(user.token)
+            # Add new entity to database, with its activation email (delivered in background)
+            uchan.add_to_db(user, False)
+            outbox.enqueue_activation(user)
+            uchan.commit()
 
-            # Add new entity to database
-            uchan.add_to_db(user)
+            nicknames.add(user.nickname)
             return responses.successful(201, 'Registration sent')
         except ValueError as msg:
             # Arguments validation error
@@ -142,5 +144,33 @@ class Registration(BasicEntity):
             return responses.client_error(409, 'Registration error, check your JSON or contact server manteiner'
                                           .format(msg))
 
-# Add resource to API routing
-uchan.api.add_resource(Registration, '/api/registration')
+
+class NicknameAPI(BasicEntity):
+    """
+    API Nickname availability resource, for sign-up forms.
+    Subclassed from BasicEntity, which means there are no OAuth lookups for this API routing.
+    """
+    @handler
+    def get(self, nickname: str):
+        """
+        GET method implementation for API Nickname resource entity.
+        Answered from the nicknames filter, database is only queried if it may contain the nickname.
+
+        :param nickname: Nickname to check
+        :return: JSON response (200 OK - nickname and its availability, 400 Bad Request - invalid nickname)
+        """
+        if not routines.is_valid_nick(nickname):
+            return responses.client_error(400, 'Invalid parameter: nickname')
+
+        return responses.successful(200, {'nickname': nickname, 'available': nicknames.is_available(nickname)})
+
+
+def register(api):
+    """
+    Registers registration resources to API routing.
+
+    :param api: Flask-RESTful Api object
+    :return: Nothing
+    """
+    api.add_resource(Registration, '/api/registration')
+    api.add_resource(NicknameAPI, '/api/registration/nickname/<nickname>')
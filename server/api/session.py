@@ -128,4 +128,12 @@ class SessionAPI(BasicEntity):
         uchan.delete_from_db(session)
         return '', 204
 
-uchan.api.add_resource(SessionAPI, '/api/session', '/api/session/<token>')
+
+def register(api):
+    """
+    Registers session resources to API routing.
+
+    :param api: Flask-RESTful Api object
+    :return: Nothing
+    """
+    api.add_resource(SessionAPI, '/api/session', '/api/session/<token>')
@@ -3,7 +3,7 @@ from server import uchan
 from server.api import AuthEntity
 from server.api import handler, handler_data, handler_args
 from server.models import Thread, User, Post, ThreadUser
-from server.common import responses
+from server.common import responses, pubsub
 from server.common import JSONRepresentation
 from server.common.routines import str_to_bool
 
@@ -39,6 +39,24 @@ def thread_routine(user: User, func, id: int, *args, **kwargs):
     return func(user, thread, *args, **kwargs)
 
 
+def thread_page_routine(user: User, thread: Thread, page: int):
+    """
+    Returns Thread's Posts list in JSON object representation.
+    Shared by ThreadAPI GET method and its native fast path (see server.api.fastpath).
+
+    :param user:   Requesting User object
+    :param thread: Thread object
+    :param page:   Thread page (for pagination query)
+    :return: Thread's Posts list in JSON
+    """
+    posts       = thread.get_posts(page)
+    authors     = User.get_authors(post.author for post in posts)
+    threadusers = ThreadUser.get_ids((thread.id, post.author) for post in posts)
+
+    return responses.successful(200, [JSONRepresentation.post(post, thread, user, *authors[post.author],
+                                                              threadusers=threadusers) for post in posts])
+
+
 class ThreadAPI(AuthEntity):
     """
     Thread API resource entity.
@@ -109,18 +127,7 @@ class ThreadAPI(AuthEntity):
         :param page: Thread page (for pagination query)
         :return: 200 OK - Thread's Posts list (for other errors see AuthEntity.session_oriented_request())
         """
-        def routine(user: User, thread: Thread):
-            """
-            Returns Thread's Posts list in JSON object representation.
-
-            :param user:   Requesting User object
-            :param thread: Thread ID
-            :return: Thread's Posts list in JSON
-            """
-            return responses.successful(200, [JSONRepresentation.post(post, thread, user)
-                                              for post in thread.get_posts(page)])
-
-        return self.session_oriented_request(thread_routine, routine, id)
+        return self.session_oriented_request(thread_routine, thread_page_routine, id, page)
 
     @handler_data
     def post(self, id: int):
@@ -161,7 +168,10 @@ class ThreadAPI(AuthEntity):
                 thread.incr_replies((image is not None))
                 uchan.commit()
 
-                return responses.successful(201, JSONRepresentation.post(thread.get_last_post(), thread, user))
+                # Wake up thread events subscribers
+                pubsub.publish(pubsub.thread_topic(thread.id), post.id)
+
+                return responses.successful(201, JSONRepresentation.post(post, thread, user))
             except ValueError as msg:
                 return responses.client_error(400, '{}'.format(msg))
 
@@ -189,4 +199,11 @@ class ThreadAPI(AuthEntity):
         return self.session_oriented_request(thread_routine, routine, id)
 
 
-uchan.api.add_resource(ThreadAPI, '/api/thread/<int:id>', '/api/thread/<int:id>/<int:page>')
+def register(api):
+    """
+    Registers thread resources to API routing.
+
+    :param api: Flask-RESTful Api object
+    :return: Nothing
+    """
+    api.add_resource(ThreadAPI, '/api/thread/<int:id>', '/api/thread/<int:id>/<int:page>')
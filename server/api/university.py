@@ -1,4 +1,3 @@
-from server import uchan
 from server.models import University
 from server.api import BasicEntity
 from server.api import handler
@@ -55,5 +54,12 @@ class UniversityAPI(BasicEntity):
             else:
                 return responses.successful(200, JSONRepresentation.university(university))
 
-uchan.api.add_resource(UniversityAPI, '/api/university', '/api/university/<int:id>')
 
+def register(api):
+    """
+    Registers university resources to API routing.
+
+    :param api: Flask-RESTful Api object
+    :return: Nothing
+    """
+    api.add_resource(UniversityAPI, '/api/university', '/api/university/<int:id>')
@@ -1,4 +1,4 @@
-from server.models import University, User, Board, Thread, Post, ChatRequest, Chat, Message
+from server.models import University, User, Board, Thread, Post, ChatRequest, Chat, ChatInbox, Message
 from server.common.routines import get_request
 
 
@@ -57,12 +57,16 @@ def me(user: User):
 ############################################
 # Thread representation                    #
 ############################################
-def thread_author(thread: Thread, user=None):
+def thread_author(thread: Thread, user=None, university=None, threadusers=None):
     """
     Thread author JSON representation, from Thread object.
+    Author University name, ThreadUser IDs and authids can be passed if already loaded (see User.get_authors(),
+    ThreadUser.get_ids()).
 
-    :param thread: Thread object
-    :param user:   Requesting User object
+    :param thread:      Thread object
+    :param user:        Requesting (or author) User object
+    :param university:  Author University name
+    :param threadusers: Dictionary of (Thread ID, User ID) -> (ThreadUser ID, authid)
     :return: Thread author object JSON representation
     """
     if user is None or user.id != thread.author:
@@ -75,23 +79,32 @@ def thread_author(thread: Thread, user=None):
     elif thread.anon:
         # If Anonymous is set, returns gender and authid
         # TODO: implement chat requests
-        return {'gender': user.get_gender(), 'authid': thread.get_author_authid(), 'chat': get_request(thread, user)}
+        return {
+            'gender': user.get_gender(),
+            'authid': thread.get_author_authid(threadusers),
+            'chat':   get_request(thread, user, threadusers)
+        }
     else:
         # TODO: implement chat requests
         return {
             'nickname':   user.nickname,
-            'university': University.query.get(user.university).name,
+            'university': university if university is not None else University.query.get(user.university).name,
             'gender':     user.gender,
-            'chat':       get_request(thread, user)
+            'chat':       get_request(thread, user, threadusers)
         }
 
 
-def thread(thread: Thread, user: User):
+def thread(thread: Thread, user: User, author=None, university=None, threadusers=None):
     """
     Thread Object representation from Thread Database Object.
-
-    :param thread: Thread Database Object
-    :param user:   Requesting User object
+    Author User object, University name, ThreadUser IDs and authids can be passed if already loaded
+    (see User.get_authors(), ThreadUser.get_ids()).
+
+    :param thread:      Thread Database Object
+    :param user:        Requesting User object
+    :param author:      Author User object
+    :param university:  Author University name
+    :param threadusers: Dictionary of (Thread ID, User ID) -> (ThreadUser ID, authid)
     :return: Thread Object JSON representation
     """
     return {
@@ -101,24 +114,29 @@ def thread(thread: Thread, user: User):
         'title':   thread.title,
         'text':    thread.text,
         'image':   thread.get_image(),
+        'thumb':   thread.get_thumbnail(),
         'posted':  str(thread.posted),
         'replies': thread.replies,
         'images':  thread.images,
         'delete':  user.admin or (thread.author == user.id),
-        'author':  thread_author(thread, user)
+        'author':  thread_author(thread, author if author is not None else user, university, threadusers)
     }
 
 
 ############################################
 # Post representation                      #
 ############################################
-def post_author(post: Post, thread: Thread, user=None):
+def post_author(post: Post, thread: Thread, user=None, university=None, threadusers=None):
     """
     Post author JSON representation, from Post object.
-
-    :param post:   Post object
-    :param thread: Thread parent object
-    :param user:   Requesting User object
+    Author University name, ThreadUser IDs and authids can be passed if already loaded (see User.get_authors(),
+    ThreadUser.get_ids()).
+
+    :param post:        Post object
+    :param thread:      Thread parent object
+    :param user:        Requesting (or author) User object
+    :param university:  Author University name
+    :param threadusers: Dictionary of (Thread ID, User ID) -> (ThreadUser ID, authid)
     :return: Post author object JSON representation
     """
     if user is None or user.id != post.author:
@@ -127,24 +145,33 @@ def post_author(post: Post, thread: Thread, user=None):
     if user is None:
         raise AssertionError('Author has to be present')
     elif post.anon:
-        return {'gender': user.get_gender(), 'authid': post.get_authid(), 'chat': get_request(thread, user)}
+        return {
+            'gender': user.get_gender(),
+            'authid': post.get_authid(thread, threadusers),
+            'chat':   get_request(thread, user, threadusers)
+        }
     else:
         # TODO: implement chat requests
         return {
             'nickname':   user.nickname,
-            'university': University.query.get(user.university).name,
+            'university': university if university is not None else University.query.get(user.university).name,
             'gender':     user.gender,
-            'chat':       get_request(thread, user)
+            'chat':       get_request(thread, user, threadusers)
         }
 
 
-def post(post: Post, thread: Thread, user: User):
+def post(post: Post, thread: Thread, user: User, author=None, university=None, threadusers=None):
     """
     Post Object representation from Post Database Object.
-
-    :param post:   Post object
-    :param thread: Thread parent object
-    :param user:   Requesting User object
+    Author User object, University name, ThreadUser IDs and authids can be passed if already loaded
+    (see User.get_authors(), ThreadUser.get_ids()).
+
+    :param post:        Post object
+    :param thread:      Thread parent object
+    :param user:        Requesting User object
+    :param author:      Author User object
+    :param university:  Author University name
+    :param threadusers: Dictionary of (Thread ID, User ID) -> (ThreadUser ID, authid)
     :return: Post Object JSON representation
     """
     return {
@@ -153,9 +180,10 @@ def post(post: Post, thread: Thread, user: User):
         'anon':   not user.admin and post.anon,
         'text':   post.text,
         'image':  post.get_image(),
+        'thumb':  post.get_thumbnail(),
         'op':     post.op,
         'reply':  post.reply,
-        'author': post_author(post, user),
+        'author': post_author(post, thread, author if author is not None else user, university, threadusers),
         'delete': user.admin or post.author == user.id
     }
 
@@ -163,22 +191,32 @@ def post(post: Post, thread: Thread, user: User):
 ############################################
 # Chat representation                      #
 ############################################
-def chatuser(user: User):
+def chatuser(user: User, university=None):
     return {
         'id':         user.id,
         'nickname':   user.nickname,
-        'university': University.query.get(user.university).name,
+        'university': university if university is not None else University.query.get(user.university).name,
         'gender':     user.get_gender(),
         'profilepic': user.profilepic
     }
 
 
-def chatrequest(chatrequest: ChatRequest):
-    user = User.query.get(chatrequest.u_from)
+def chatrequest(chatrequest: ChatRequest, user=None, university=None):
+    """
+    ChatRequest representation.
+    Sender User object and University name can be passed if already loaded (see User.get_requests()).
+
+    :param chatrequest: ChatRequest object
+    :param user:        Sender User object
+    :param university:  Sender University name
+    :return: ChatRequest JSON representation
+    """
+    if user is None:
+        user = User.query.get(chatrequest.u_from)
 
     return {
         'id':   chatrequest.id,
-        'from': chatuser(user),
+        'from': chatuser(user, university),
     }
 
 
@@ -186,13 +224,38 @@ def chat(chat: Chat, user: User):
     return {
         'id':   chat.id,
         'last': str(chat.last),
+        'seq':  chat.seq,
         'user': chatuser(User.query.get(chat.user1) if chat.user2 == user.id else User.query.get(chat.user2))
     }
 
 
+def inbox(entry: ChatInbox):
+    """
+    Chat inbox entry representation, without further queries.
+    Same fields of chat() representation, plus unread messages counter.
+
+    :param entry: ChatInbox object
+    :return: Chat inbox entry JSON representation
+    """
+    return {
+        'id':     entry.chat,
+        'last':   str(entry.last),
+        'seq':    entry.seq,
+        'unread': entry.unread,
+        'user':   {
+            'id':         entry.other,
+            'nickname':   entry.other_nickname,
+            'university': entry.other_university,
+            'gender':     entry.get_gender(),
+            'profilepic': entry.other_profilepic
+        }
+    }
+
+
 def message(message: Message):
     return {
         'id':    message.id,
+        'seq':   message.seq,
         'from':  message.u_from,
         'to':    message.u_to,
         'image': message.image,
@@ -0,0 +1,406 @@
+from uuid import uuid4
+from random import Random
+from itertools import groupby
+from datetime import datetime, timedelta
+from dateutil.parser import parse as parse_datetime
+# Database related imports
+from sqlalchemy import func, select, false, bindparam
+
+# Rows inserted per transaction
+chunk_size = 10000
+
+
+def insertion_order():
+    """
+    Returns bulk loadable tables, parents first (so foreign keys are always satisfied).
+
+    :return: List of SQLAlchemy Core tables
+    """
+    return [User.__table__, UserBoard.__table__, Thread.__table__, ThreadUser.__table__, Post.__table__,
+            ChatRequest.__table__, Chat.__table__, ChatInbox.__table__, Message.__table__]
+
+
+def next_id(table):
+    """
+    Returns first free primary key of a table, so that related rows can be generated without round trips.
+
+    :param table: SQLAlchemy Core table
+    :return: First free ID
+    """
+    return (uchan.db.session.query(func.max(table.c.id)).scalar() or 0) + 1
+
+
+def execute_many(connection, table, rows: list):
+    """
+    Inserts rows with DBAPI executemany: INSERT statement is compiled once by SQLAlchemy Core and values are
+    converted by column types bind processors, skipping SQLAlchemy per-row parameters processing.
+
+    :param connection: SQLAlchemy Connection object, in a transaction
+    :param table:      SQLAlchemy Core table
+    :param rows:       Rows, by column name (rows with the same columns are inserted together)
+    :return: Nothing
+    """
+    dialect = connection.dialect
+    cursor  = connection.connection.cursor()
+
+    try:
+        for keys, group in groupby(rows, key=tuple):
+            compiled = table.insert().compile(dialect=dialect, column_keys=list(keys))
+            # Bind parameters order (positional DBAPI paramstyles) or column names, with their type processors
+            names      = compiled.positiontup if compiled.positional else keys
+            processors = [(name, table.c[name].type.dialect_impl(dialect).bind_processor(dialect)) for name in names]
+
+            if compiled.positional:
+                params = [tuple(processor(row[name]) if processor else row[name] for name, processor in processors)
+                          for row in group]
+            else:
+                params = [{name: processor(row[name]) if processor else row[name] for name, processor in processors}
+                          for row in group]
+
+            cursor.executemany(str(compiled), params)
+    finally:
+        cursor.close()
+
+
+class Loader:
+    """
+    Bulk rows loader, built on SQLAlchemy Core and executemany (no ORM objects, no per-row round trips).
+
+    Rows are buffered by table, and every 'chunk' rows all buffers are inserted in a single transaction,
+    parents first; a failure only rolls back the current chunk.
+    """
+    def __init__(self, chunk=chunk_size):
+        """
+        Construct bulk loader.
+
+        :param chunk: Rows inserted per transaction
+        :return: New Loader object
+        """
+        self.chunk   = chunk
+        self.tables  = insertion_order()
+        self.buffers = {table.name: [] for table in self.tables}
+        self.counts  = {table.name: 0 for table in self.tables}
+        self.pending = 0
+
+    def add(self, table, row: dict):
+        """
+        Buffers a row, flushing buffers when chunk is full.
+
+        :param table: SQLAlchemy Core table
+        :param row:   Row values, by column name
+        :return: Nothing
+        """
+        self.buffers[table.name].append(row)
+        self.pending += 1
+
+        if self.pending >= self.chunk:
+            self.flush()
+
+    def flush(self):
+        """
+        Inserts every buffered row, in a single transaction.
+
+        :return: Nothing
+        """
+        if self.pending == 0:
+            return
+
+        with uchan.db.engine.begin() as connection:
+            for table in self.tables:
+                rows = self.buffers[table.name]
+
+                if rows:
+                    execute_many(connection, table, rows)
+                    self.counts[table.name] += len(rows)
+                    self.buffers[table.name] = []
+
+        self.pending = 0
+
+    def finish(self):
+        """
+        Flushes remaining rows and moves PostgreSQL sequences past explicitly generated IDs.
+
+        :return: Inserted rows, by table name
+        """
+        self.flush()
+
+        if uchan.db.engine.dialect.name == 'postgresql':
+            with uchan.db.engine.begin() as connection:
+                for table in self.tables:
+                    if self.counts[table.name]:
+                        connection.execute("SELECT setval(pg_get_serial_sequence('\"{0}\"', 'id'), "
+                                           "(SELECT MAX(id) FROM \"{0}\"))".format(table.name))
+
+        return self.counts
+
+
+def generate(loader: Loader, rng: Random, users: int, threads: int, posts: int, chats: int, messages: int,
+             password_hash: str, salt: str):
+    """
+    Generates a synthetic dataset on top of existing universities and boards: activated users (implicitly
+    subscribed to general boards), threads with posts (written by a few participants each, with their authids),
+    and accepted chats with messages (with sequence numbers and inbox entries).
+
+    Counters (thread replies, chat sequence numbers, inbox unread messages) are consistent with generated rows.
+
+    :param loader:        Loader object
+    :param rng:           Random generator
+    :param users:         Users to generate
+    :param threads:       Threads to generate
+    :param posts:         Posts to generate (spread over generated threads)
+    :param chats:         Chats to generate (between generated users)
+    :param messages:      Messages to generate (spread over generated chats)
+    :param password_hash: Password hash of every generated user (see routines.hashing_password())
+    :param salt:          Salt of every generated user
+    :return: Nothing
+    """
+    universities = dict(uchan.db.session.query(University.id, University.name).filter(University.id > 1))
+    boards       = [board for board, in uchan.db.session.query(Board.id).filter_by(university=1)]
+    now          = datetime.now()
+
+    if not universities or not boards:
+        raise ValueError('Universities and general boards are needed (see inject_universities.py, inject_boards.py)')
+
+    # Users (implicitly subscribed to general boards, see User.board_subscribed())
+    first_user = next_id(User.__table__)
+    user_ids   = list(range(first_user, first_user + users))
+    genders    = {}
+    homes      = {}
+    uni_ids    = list(universities)
+
+    for id in user_ids:
+        genders[id], homes[id] = rng.random() < 0.5, rng.choice(uni_ids)
+        loader.add(User.__table__, {
+            'id': id, 'nickname': 'user{}'.format(id), 'password': password_hash, 'salt': salt,
+            'university': homes[id], 'profilepic': None, 'email': 'user{}'.format(id), 'gender': genders[id],
+            'activated': True, 'token': str(uuid4()), 'admin': False
+        })
+
+    if not user_ids:
+        return
+
+    # Threads, each one with its posts and participants
+    thread_id     = next_id(Thread.__table__)
+    post_id       = next_id(Post.__table__)
+    threaduser_id = next_id(ThreadUser.__table__)
+    replies       = [0] * threads
+
+    for _ in range(posts if threads else 0):
+        replies[rng.randrange(threads)] += 1
+
+    for i in range(threads):
+        author = rng.choice(user_ids)
+        posted = now - timedelta(minutes=threads - i)
+        board  = rng.choice(boards)
+        others = rng.sample(user_ids, min(len(user_ids), 8, replies[i]))
+        participants = [author] + [user for user in others if user != author]
+
+        loader.add(Thread.__table__, {
+            'id': thread_id, 'anon': rng.random() < 0.5, 'title': 'Thread {}'.format(thread_id),
+            'text': 'Generated thread {}'.format(thread_id), 'image': 'bulk.png', 'pinned': False, 'posted': posted,
+            'replies': replies[i], 'images': 0, 'board': board, 'author': author, 'keyed_authids': True
+        })
+
+        for user in participants:
+            loader.add(ThreadUser.__table__, {'id': threaduser_id, 'thread': thread_id, 'user': user, 'follow': True,
+                                              'authid': calculate_authid(thread_id, user)})
+            threaduser_id += 1
+
+        for n in range(replies[i]):
+            loader.add(Post.__table__, {
+                'id': post_id, 'op': False, 'anon': rng.random() < 0.5, 'text': 'Generated post {}'.format(post_id),
+                'image': None, 'posted': posted + timedelta(seconds=n + 1), 'reply': None, 'thread': thread_id,
+                'author': rng.choice(participants), 'board': board
+            })
+            post_id += 1
+
+        thread_id += 1
+
+    # Accepted chats, between distinct pairs of users
+    pairs = set()
+    while len(pairs) < min(chats, len(user_ids) * (len(user_ids) - 1) // 2):
+        pairs.add(tuple(sorted(rng.sample(user_ids, 2))))
+
+    chat_id    = next_id(Chat.__table__)
+    request_id = next_id(ChatRequest.__table__)
+    inbox_id   = next_id(ChatInbox.__table__)
+    message_id = next_id(Message.__table__)
+    sizes      = [0] * len(pairs)
+
+    for _ in range(messages if pairs else 0):
+        sizes[rng.randrange(len(pairs))] += 1
+
+    for (user1, user2), size in zip(sorted(pairs), sizes):
+        start  = now - timedelta(minutes=size + 1)
+        last   = start + timedelta(minutes=size)
+        unread = {user1: 0, user2: 0}
+
+        loader.add(ChatRequest.__table__, {'id': request_id, 'u_from': user1, 'u_to': user2, 'accepted': True,
+                                           'u_low': user1, 'u_high': user2})
+        loader.add(Chat.__table__, {'id': chat_id, 'user1': user1, 'user2': user2, 'last': last, 'seq': size})
+
+        for seq in range(1, size + 1):
+            sender = rng.choice([user1, user2])
+            receiver = user2 if sender == user1 else user1
+            # Recipient has read all but the last few messages
+            unread[receiver] += seq > size - 3
+
+            loader.add(Message.__table__, {
+                'id': message_id, 'chat': chat_id, 'seq': seq, 'u_from': sender, 'u_to': receiver,
+                'text': 'Generated message {}'.format(message_id), 'image': None,
+                'sent': start + timedelta(minutes=seq)
+            })
+            message_id += 1
+
+        for user, other in [(user1, user2), (user2, user1)]:
+            loader.add(ChatInbox.__table__, {
+                'id': inbox_id, 'user': user, 'chat': chat_id, 'last': last, 'seq': size, 'unread': unread[user],
+                'other': other, 'other_nickname': 'user{}'.format(other),
+                'other_university': universities[homes[other]], 'other_gender': genders[other],
+                'other_profilepic': None
+            })
+            inbox_id += 1
+
+        chat_id    += 1
+        request_id += 1
+
+
+def coerce(table, row: dict):
+    """
+    Converts imported values (e.g. CSV strings) to table columns types.
+
+    :param table: SQLAlchemy Core table
+    :param row:   Imported row, by column name
+    :return: Row with converted values (empty values become NULL)
+    """
+    converted = {}
+
+    for name, value in row.items():
+        column = table.c[name]
+
+        if value is None or value == '':
+            converted[name] = None
+        elif not isinstance(value, str):
+            converted[name] = value
+        elif isinstance(column.type, uchan.db.Boolean):
+            converted[name] = value.lower() in ['1', 'true', 't', 'yes']
+        elif isinstance(column.type, uchan.db.Integer):
+            converted[name] = int(value)
+        elif isinstance(column.type, uchan.db.DateTime):
+            converted[name] = parse_datetime(value)
+        else:
+            converted[name] = value
+
+    return converted
+
+
+def import_rows(loader: Loader, table_name: str, rows):
+    """
+    Imports rows into a bulk loadable table.
+
+    :param loader:     Loader object
+    :param table_name: Table name (see insertion_order())
+    :param rows:       Iterable of rows, by column name
+    :return: Nothing
+    """
+    tables = {table.name: table for table in loader.tables}
+
+    if table_name not in tables:
+        raise ValueError('Table not bulk loadable: {}'.format(table_name))
+
+    for row in rows:
+        loader.add(tables[table_name], coerce(tables[table_name], row))
+
+
+def prune_general_subscriptions():
+    """
+    Deletes UserBoard rows of general boards that are not opt-outs: general boards are implicit
+    (see User.board_subscribed()), so these rows, from before implicit membership, are redundant.
+
+    :return: Deleted rows
+    """
+    table   = UserBoard.__table__
+    general = select([Board.id]).where(Board.university == 1)
+
+    with uchan.db.engine.begin() as connection:
+        return connection.execute(table.delete().where(table.c.board.in_(general))
+                                  .where(table.c.optout == false())).rowcount
+
+
+def backfill_chat_sequences():
+    """
+    Numbers messages stored before chat sequence numbers (NULL seq), so that delta sync returns them
+    (see Chat.get_messages_since()). Messages of each affected chat are renumbered from 1, legacy ones first
+    by send time, then the already numbered ones in order; chat and inbox entries sequence numbers are set to
+    the last one. Every chat is renumbered in its own transaction; run with the server stopped, since clients
+    may have seen the old numbers.
+
+    :return: Renumbered chats
+    """
+    chats, messages, inbox = Chat.__table__, Message.__table__, ChatInbox.__table__
+    renumber = messages.update().where(messages.c.id == bindparam('message')).values(seq=bindparam('number'))
+
+    with uchan.db.engine.connect() as connection:
+        legacy = [chat for chat, in connection.execute(select([messages.c.chat]).where(messages.c.seq.is_(None))
+                                                           .distinct())]
+
+        for chat in legacy:
+            with connection.begin():
+                ordered = connection.execute(select([messages.c.id]).where(messages.c.chat == chat)
+                                             .order_by(messages.c.seq.isnot(None), messages.c.seq, messages.c.sent,
+                                                       messages.c.id)).fetchall()
+
+                # Cleared first, so that renumbering never conflicts with the unique (chat, seq) index
+                connection.execute(messages.update().where(messages.c.chat == chat).values(seq=None))
+                connection.execute(renumber, [{'message': message, 'number': number}
+                                              for number, (message,) in enumerate(ordered, 1)])
+                connection.execute(chats.update().where(chats.c.id == chat).values(seq=len(ordered)))
+                connection.execute(inbox.update().where(inbox.c.chat == chat).values(seq=len(ordered)))
+
+        # Chats without messages
+        connection.execute(chats.update().where(chats.c.seq.is_(None)).values(seq=0))
+
+    return len(legacy)
+
+
+def backfill_chat_request_pairs():
+    """
+    Sets unordered users pair (u_low, u_high) of chat requests stored before it, so that they conflict with
+    requests in the opposite direction (see ChatRequest.between()). Of requests between the same users, the accepted
+    one (or else the oldest) gets the pair: the other pending ones are deleted, the other accepted ones are left
+    without pair.
+
+    :return: Tuple of (updated, deleted) requests
+    """
+    table = ChatRequest.__table__
+
+    with uchan.db.engine.begin() as connection:
+        taken  = {tuple(pair) for pair in connection.execute(select([table.c.u_low, table.c.u_high])
+                                                             .where(table.c.u_low.isnot(None)))}
+        legacy = connection.execute(select([table.c.id, table.c.u_from, table.c.u_to, table.c.accepted])
+                                    .where(table.c.u_low.is_(None))
+                                    .order_by(table.c.accepted.desc(), table.c.id)).fetchall()
+        updates, deletes = [], []
+
+        for request, u_from, u_to, accepted in legacy:
+            pair = (min(u_from, u_to), max(u_from, u_to))
+
+            if pair not in taken:
+                taken.add(pair)
+                updates.append({'request': request, 'low': pair[0], 'high': pair[1]})
+            elif not accepted:
+                deletes.append(request)
+
+        if updates:
+            connection.execute(table.update().where(table.c.id == bindparam('request'))
+                               .values(u_low=bindparam('low'), u_high=bindparam('high')), updates)
+        if deletes:
+            connection.execute(table.delete().where(table.c.id.in_(deletes)))
+
+    return len(updates), len(deletes)
+
+# API related imports
+from server import uchan
+from server.common.routines import calculate_authid
+from server.models import University, Board, User, UserBoard, Thread, ThreadUser, Post
+from server.models import ChatRequest, Chat, ChatInbox, Message
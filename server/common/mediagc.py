@@ -0,0 +1,102 @@
+from os import scandir, remove, path
+from time import time, sleep
+from threading import Thread as Worker
+
+# Referenced names are streamed from database in chunks of this size
+chunk_size = 1000
+
+
+def referenced_media():
+    """
+    Mark phase: streams every media name referenced by the database, in a single UNION ALL query
+    over thread.image, post.image, message.image and user.profilepic.
+
+    :return: Set of referenced media names
+    """
+    session = uchan.db.session
+    query   = session.query(Thread.image)\
+        .union_all(session.query(Post.image),
+                   session.query(Message.image),
+                   session.query(User.profilepic))
+
+    return {name for name, in query.yield_per(chunk_size) if name is not None}
+
+
+def sweep(folder: str, referenced: set, grace: float, batch: int, pause: float, dry_run=False):
+    """
+    Sweep phase: deletes unreferenced media files older than grace period, with their thumbnails.
+    Pauses every 'batch' deletions to bound disk I/O.
+
+    :param folder:     Media folder
+    :param referenced: Set of referenced media names (see referenced_media())
+    :param grace:      Grace period (seconds)
+    :param batch:      Deletions between pauses
+    :param pause:      Pause length (seconds)
+    :param dry_run:    Only list files that would be deleted
+    :return: List of deleted (or to be deleted) file names
+    """
+    deadline = time() - grace
+    deleted  = []
+
+    for entry in scandir(folder):
+        if not entry.is_file() or entry.name in referenced or entry.stat().st_mtime > deadline:
+            continue
+
+        deleted.append(entry.name)
+
+        if dry_run:
+            continue
+
+        remove(entry.path)
+
+        for fmt in thumbnails.extensions:
+            thumb = thumbnails.thumbnail_path(entry.name, fmt)
+            if path.exists(thumb):
+                remove(thumb)
+
+        if len(deleted) % batch == 0:
+            sleep(pause)
+
+    return deleted
+
+
+def collect(dry_run=False):
+    """
+    Runs a full mark-and-sweep media garbage collection, using application configuration.
+
+    :param dry_run: Only list files that would be deleted
+    :return: List of deleted (or to be deleted) file names
+    """
+    config = uchan.app.config
+
+    return sweep(config.get('UPLOAD_FOLDER'), referenced_media(), config.get('MEDIA_GC_GRACE'),
+                 config.get('MEDIA_GC_BATCH'), config.get('MEDIA_GC_PAUSE'), dry_run)
+
+
+def start_background(interval: float):
+    """
+    Starts media garbage collection as a background daemon thread, every 'interval' seconds.
+
+    :param interval: Seconds between runs
+    :return: Background thread
+    """
+    def loop():
+        while True:
+            sleep(interval)
+
+            with uchan.app.app_context():
+                try:
+                    collect()
+                except Exception:
+                    uchan.app.logger.exception('Media garbage collection failed')
+                finally:
+                    uchan.db.session.remove()
+
+    worker = Worker(target=loop, name='media-gc', daemon=True)
+    worker.start()
+    return worker
+
+# API related imports
+from server import uchan
+from server.common import thumbnails
+from server.models import User, Thread, Post, Message
@@ -0,0 +1,375 @@
+import logging
+from os import getpid
+from time import perf_counter
+from bisect import bisect_left
+from threading import Lock, local
+# Flask related imports
+from flask import request, g, has_app_context, Response
+# Database related imports
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Latency histogram buckets upper bounds (seconds)
+buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Metric name -> (type, help)
+described = {
+    'uchan_http_request_duration_seconds': ('histogram', 'Request latency, by resource method'),
+    'uchan_http_responses_total':          ('counter', 'Responses, by resource method and status code'),
+    'uchan_http_requests_in_flight':       ('gauge', 'Requests being processed by the WSGI app'),
+    'uchan_http_request_db_seconds_total': ('counter', 'Database time of requests, by resource method'),
+    'uchan_http_request_db_queries_total': ('counter', 'Database queries of requests, by resource method'),
+    'uchan_db_query_duration_seconds':     ('histogram', 'Database query latency'),
+    'uchan_cache_lookups_total':           ('counter', 'Cache lookups, by cache and result'),
+    'uchan_cache_hit_ratio':               ('gauge', 'Cache hits over lookups, by cache'),
+    'uchan_worker_info':                   ('gauge', 'Worker process answering this scrape'),
+    'uchan_outbox_emails_total':           ('counter', 'Outbox deliveries, by result')
+}
+
+
+class Shard:
+    """
+    Metrics recorded by a single thread.
+
+    Every thread only writes its own shard, so recording needs no lock; shards are summed when rendered.
+    Metrics are kept per worker process, scrapes of a prefork deployment reach one worker at a time
+    (see uchan_worker_info).
+    """
+    def __init__(self):
+        """
+        Construct empty shard.
+
+        :return: New Shard object
+        """
+        self.values     = {}    # (name, labels) -> counter or gauge value
+        self.histograms = {}    # (name, labels) -> [per bucket counts..., +Inf count, sum]
+
+
+# Thread shards (list is only locked when a thread records its first metric)
+shards      = []
+shards_lock = Lock()
+thread_data = local()
+
+# Functions returning additional (name, type, help, labels, value) samples, see add_collector()
+collectors = []
+
+
+def shard():
+    """
+    Returns calling thread shard, created on first use.
+
+    :return: Shard object
+    """
+    current = getattr(thread_data, 'shard', None)
+
+    if current is None:
+        current = thread_data.shard = Shard()
+
+        with shards_lock:
+            shards.append(current)
+
+    return current
+
+
+def reset():
+    """
+    Drops every recorded metric (e.g. inherited by a forked worker process).
+
+    :return: Nothing
+    """
+    with shards_lock:
+        shards.clear()
+        thread_data.__dict__.clear()
+
+
+def inc(name: str, labels=(), amount=1):
+    """
+    Adds amount to a counter or gauge.
+
+    :param name:   Metric name
+    :param labels: Tuple of (label, value) pairs
+    :param amount: Amount to add (negative for gauges decrements)
+    :return: Nothing
+    """
+    values = shard().values
+    key    = (name, labels)
+    values[key] = values.get(key, 0) + amount
+
+
+def observe(name: str, labels, value: float):
+    """
+    Records a value in a histogram.
+
+    :param name:   Metric name
+    :param labels: Tuple of (label, value) pairs
+    :param value:  Observed value (seconds)
+    :return: Nothing
+    """
+    histograms = shard().histograms
+    histogram  = histograms.get((name, labels))
+
+    if histogram is None:
+        histogram = histograms[(name, labels)] = [0] * (len(buckets) + 2)
+
+    histogram[bisect_left(buckets, value)] += 1
+    histogram[-1] += value
+
+
+def cache_lookup(cache: str, hit: bool):
+    """
+    Records a cache lookup result.
+
+    :param cache: Cache name
+    :param hit:   If lookup was a hit
+    :return: Nothing
+    """
+    inc('uchan_cache_lookups_total', (('cache', cache), ('result', 'hit' if hit else 'miss')))
+
+
+def add_collector(collector):
+    """
+    Adds a function returning samples computed at scrape time, as (name, type, help, labels, value) tuples.
+
+    :param collector: Collector function
+    :return: Nothing
+    """
+    collectors.append(collector)
+
+
+def snapshot():
+    """
+    Sums every thread shard.
+
+    :return: Tuple of values and histograms dictionaries
+    """
+    values, histograms = {}, {}
+
+    with shards_lock:
+        current = list(shards)
+
+    for item in current:
+        # Dictionaries copies are atomic, recording threads keep going
+        for key, value in dict(item.values).items():
+            values[key] = values.get(key, 0) + value
+
+        for key, histogram in dict(item.histograms).items():
+            total = histograms.setdefault(key, [0] * (len(buckets) + 2))
+            for i, count in enumerate(list(histogram)):
+                total[i] += count
+
+    return values, histograms
+
+
+def format_labels(labels):
+    """
+    Formats labels in text exposition format.
+
+    :param labels: Tuple of (label, value) pairs
+    :return: Labels string (empty if there are no labels)
+    """
+    if not labels:
+        return ''
+
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join('{0}="{1}"'.format(name, value) for (name, _), value in zip(labels, escaped)) + '}'
+
+
+def render():
+    """
+    Renders metrics of this worker process in Prometheus text exposition format.
+
+    :return: Metrics text
+    """
+    values, histograms = snapshot()
+
+    for (name, labels), value in list(values.items()):
+        if name == 'uchan_cache_lookups_total' and labels[1] == ('result', 'hit'):
+            lookups = value + values.get((name, (labels[0], ('result', 'miss'))), 0)
+            values[('uchan_cache_hit_ratio', labels[:1])] = value / lookups
+
+    values[('uchan_worker_info', (('pid', getpid()),))] = 1
+
+    for collector in collectors:
+        for name, kind, text, labels, value in collector():
+            described.setdefault(name, (kind, text))
+            values[(name, labels)] = value
+
+    samples = {}
+    for key in values:
+        samples.setdefault(key[0], []).append(key)
+    for key in histograms:
+        samples.setdefault(key[0], []).append(key)
+
+    lines = []
+
+    for name in sorted(samples):
+        kind, text = described.get(name, ('untyped', name))
+        lines.append('# HELP {0} {1}'.format(name, text))
+        lines.append('# TYPE {0} {1}'.format(name, kind))
+
+        for key in sorted(samples[name], key=lambda item: item[1]):
+            labels = key[1]
+
+            if key not in histograms:
+                lines.append('{0}{1} {2}'.format(name, format_labels(labels), values[key]))
+                continue
+
+            histogram, cumulative = histograms[key], 0
+
+            for bound, count in zip(buckets + ('+Inf',), histogram[:-1]):
+                cumulative += count
+                lines.append('{0}_bucket{1} {2}'.format(name, format_labels(labels + (('le', bound),)), cumulative))
+
+            lines.append('{0}_sum{1} {2}'.format(name, format_labels(labels), histogram[-1]))
+            lines.append('{0}_count{1} {2}'.format(name, format_labels(labels), cumulative))
+
+    return '\n'.join(lines) + '\n'
+
+
+def endpoint_name():
+    """
+    Returns current request metrics key: resource class and method (e.g. 'BoardAPI.get')
+    for Flask-RESTful resources, endpoint name for plain routes.
+
+    :return: Endpoint name
+    """
+    if request.url_rule is None:
+        return 'unmatched'
+
+    view = uchan.app.view_functions.get(request.url_rule.endpoint)
+    view_class = getattr(view, 'view_class', None)
+
+    if view_class is None:
+        return request.url_rule.endpoint
+
+    return '{0}.{1}'.format(view_class.__name__, request.method.lower())
+
+
+def request_started():
+    """
+    Starts request timing.
+
+    :return: Nothing
+    """
+    g.metrics_start   = perf_counter()
+    g.metrics_db      = 0.0
+    g.metrics_queries = 0
+    inc('uchan_http_requests_in_flight')
+
+
+def request_finished(response):
+    """
+    Records request latency, status code and database time.
+
+    :param response: Flask response
+    :return: Same response
+    """
+    start = g.get('metrics_start')
+
+    if start is not None:
+        labels = (('endpoint', endpoint_name()),)
+
+        observe('uchan_http_request_duration_seconds', labels, perf_counter() - start)
+        inc('uchan_http_responses_total', labels + (('code', response.status_code),))
+        inc('uchan_http_request_db_seconds_total', labels, g.metrics_db)
+        inc('uchan_http_request_db_queries_total', labels, g.metrics_queries)
+
+    return response
+
+
+def request_teardown(exception=None):
+    """
+    Ends in-flight request.
+
+    :param exception: Unhandled request exception
+    :return: Nothing
+    """
+    if g.pop('metrics_start', None) is not None:
+        inc('uchan_http_requests_in_flight', amount=-1)
+
+
+def query_started(conn, cursor, statement, parameters, context, executemany):
+    """
+    SQLAlchemy 'before_cursor_execute' listener, starts query timing.
+
+    :param conn: Connection object (other parameters are unused)
+    :return: Nothing
+    """
+    conn.info.setdefault('metrics_start', []).append(perf_counter())
+
+
+def query_finished(conn, cursor, statement, parameters, context, executemany):
+    """
+    SQLAlchemy 'after_cursor_execute' listener, records query time (and charges it to current request, if any).
+
+    :param conn: Connection object (other parameters are unused)
+    :return: Nothing
+    """
+    elapsed = perf_counter() - conn.info['metrics_start'].pop()
+    observe('uchan_db_query_duration_seconds', (), elapsed)
+
+    if has_app_context() and 'metrics_db' in g:
+        g.metrics_db      += elapsed
+        g.metrics_queries += 1
+
+
+def log_request(handler):
+    """
+    Tornado 'log_function': records requests served natively by Tornado handlers, then logs them like Tornado does.
+    Requests falling back to the WSGI app are never logged by Tornado, they're recorded by the Flask hooks.
+
+    :param handler: Tornado RequestHandler
+    :return: Nothing
+    """
+    from tornado.log import access_log
+
+    status = handler.get_status()
+    labels = (('endpoint', '{0}.{1}'.format(type(handler).__name__, handler.request.method.lower())),)
+
+    observe('uchan_http_request_duration_seconds', labels, handler.request.request_time())
+    inc('uchan_http_responses_total', labels + (('code', status),))
+
+    if status < 400:
+        log = access_log.info
+    elif status < 500:
+        log = access_log.warning
+    else:
+        log = access_log.error
+
+    if access_log.isEnabledFor(logging.INFO if status < 400 else logging.WARNING):
+        log('%d %s %s (%s) %.2fms', status, handler.request.method, handler.request.uri, handler.request.remote_ip,
+            1000.0 * handler.request.request_time())
+
+
+def metrics():
+    """
+    Metrics routing function.
+
+    :return: Metrics of the worker process, in Prometheus text exposition format
+    """
+    return Response(render(), mimetype='text/plain; version=0.0.4')
+
+
+def register(api):
+    """
+    Registers metrics hooks, database listeners and '/metrics' routing function, if METRICS is set.
+    Hooks are registered before any other, so that rejected requests are recorded too.
+
+    :param api: Flask-RESTful Api object
+    :return: Nothing
+    """
+    if not api.app.config.get('METRICS'):
+        return
+
+    api.app.before_request(request_started)
+    api.app.after_request(request_finished)
+    api.app.teardown_request(request_teardown)
+
+    if not event.contains(Engine, 'before_cursor_execute', query_started):
+        event.listen(Engine, 'before_cursor_execute', query_started)
+        event.listen(Engine, 'after_cursor_execute', query_finished)
+
+    api.app.add_url_rule('/metrics', 'metrics', metrics, methods=['GET'])
+
+# API related imports
+from server import uchan
@@ -0,0 +1,183 @@
+from math import ceil, log
+from time import monotonic
+from hashlib import blake2b
+from threading import Lock
+# API related imports
+from server import uchan
+from server.common import metrics
+from server.models import User
+
+# Nicknames are streamed from database in chunks of this size
+chunk_size = 10000
+
+
+class BloomFilter:
+    """
+    Bloom filter of strings: membership tests answer 'definitely not present' or 'maybe present'
+    (false positives at the configured rate, no false negatives).
+    """
+    def __init__(self, capacity: int, error: float):
+        """
+        Construct an empty Bloom filter, sized for 'capacity' keys at 'error' false positive rate.
+
+        :param capacity: Expected number of keys
+        :param error:    False positive rate, with 'capacity' keys
+        :return: New BloomFilter object
+        """
+        self.capacity = capacity
+        self.size     = max(64, ceil(-capacity * log(error) / log(2) ** 2))
+        self.hashes   = max(1, round(self.size / capacity * log(2)))
+        self.bits     = bytearray((self.size + 7) // 8)
+        self.count    = 0
+
+    def positions(self, key: str):
+        """
+        Returns bit positions of a key (double hashing of a 128 bit BLAKE2b digest).
+
+        :param key: Key
+        :return: List of bit positions
+        """
+        digest = blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key: str):
+        """
+        Adds a key.
+
+        :param key: Key
+        :return: Nothing
+        """
+        for position in self.positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+        self.count += 1
+
+    def __contains__(self, key: str):
+        """
+        Tests a key.
+
+        :param key: Key
+        :return: False if key is definitely not present, True if it may be present
+        """
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(key))
+
+
+class State:
+    """
+    Nicknames filter of this worker process, with the last user ID it has seen.
+    """
+    bloom     = None
+    last_id   = 0
+    refreshed = 0.0
+
+
+state = State()
+lock  = Lock()
+
+
+def stream(after: int):
+    """
+    Streams nicknames of users registered after a user ID.
+
+    :param after: User ID
+    :return: Iterator of (user ID, nickname)
+    """
+    return uchan.db.session.query(User.id, User.nickname).filter(User.id > after).order_by(User.id)\
+        .yield_per(chunk_size)
+
+
+def load():
+    """
+    Builds the filter from every registered nickname, twice as big as needed if NICKNAME_FILTER_CAPACITY
+    is exceeded. Called on first lookup and at deployment startup, by each worker.
+
+    :return: Nothing
+    """
+    config = uchan.app.config
+
+    with lock:
+        count   = uchan.db.session.query(User.id).count()
+        bloom   = BloomFilter(max(config.get('NICKNAME_FILTER_CAPACITY'), 2 * count),
+                              config.get('NICKNAME_FILTER_ERROR'))
+        last_id = 0
+
+        for last_id, nickname in stream(0):
+            bloom.add(nickname)
+
+        state.bloom, state.last_id, state.refreshed = bloom, last_id, monotonic()
+
+
+def refresh():
+    """
+    Adds nicknames registered since last load or refresh (e.g. by other worker processes),
+    rebuilding the filter if it's over capacity.
+
+    :return: Nothing
+    """
+    with lock:
+        last_id = state.last_id
+
+        for last_id, nickname in stream(state.last_id):
+            state.bloom.add(nickname)
+
+        state.last_id, state.refreshed = last_id, monotonic()
+        full = state.bloom.count > state.bloom.capacity
+
+    if full:
+        load()
+
+
+def reset():
+    """
+    Drops the filter, so that next lookup loads it again (e.g. after the database has been recreated).
+
+    :return: Nothing
+    """
+    with lock:
+        state.bloom, state.last_id, state.refreshed = None, 0, 0.0
+
+
+def add(nickname: str):
+    """
+    Adds a just registered nickname.
+
+    :param nickname: Nickname
+    :return: Nothing
+    """
+    with lock:
+        if state.bloom is not None:
+            state.bloom.add(nickname)
+
+
+def may_exist(nickname: str):
+    """
+    Tests a nickname against the filter, loading it or refreshing it every NICKNAME_FILTER_REFRESH seconds.
+
+    :param nickname: Nickname
+    :return: False if nickname is definitely not registered, True if it may be
+    """
+    if state.bloom is None:
+        load()
+    elif monotonic() - state.refreshed > uchan.app.config.get('NICKNAME_FILTER_REFRESH'):
+        refresh()
+
+    return nickname in state.bloom
+
+
+def is_available(nickname: str):
+    """
+    Checks if a nickname is not registered: only nicknames the filter may contain are looked up in database.
+    Nicknames registered by other workers since last refresh may be reported available, so registration
+    relies on the unique constraint in the end.
+
+    :param nickname: Nickname
+    :return: If nickname is available
+    """
+    if not may_exist(nickname):
+        metrics.cache_lookup('nicknames', True)
+        return True
+
+    metrics.cache_lookup('nicknames', False)
+    return uchan.db.session.query(User.id).filter_by(nickname=nickname).first() is None
@@ -0,0 +1,285 @@
+from time import sleep, monotonic
+from datetime import datetime, timedelta
+from threading import Thread as Worker
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+from smtplib import SMTP, SMTPException, SMTPServerDisconnected
+# API related imports
+from server import uchan
+from server.common import metrics
+from server.models import User, OutboxEmail
+
+activation_subject = 'uChan account activation'
+activation_text    = """Hi {nickname},
+
+welcome to uChan! Please activate your account by following this link:
+
+    {url}
+
+If you did not sign up, just ignore this email.
+"""
+
+
+def enqueue(recipient: str, subject: str, body: str):
+    """
+    Queues an email in the current database transaction: it's only delivered if the transaction commits.
+
+    :param recipient: Recipient email address
+    :param subject:   Email subject
+    :param body:      Email plain text body
+    :return: OutboxEmail object
+    """
+    email = OutboxEmail(recipient, subject, body)
+    uchan.add_to_db(email, False)
+    return email
+
+
+def enqueue_activation(user: User):
+    """
+    Queues activation email of a just registered user (see server.api.activation).
+
+    :param user: Registered User object
+    :return: OutboxEmail object
+    """
+    url = '{0}/api/activation/{1}'.format(uchan.app.config.get('MAIL_ACTIVATION_URL').rstrip('/'), user.token)
+    return enqueue(user.get_email(), activation_subject, activation_text.format(nickname=user.nickname, url=url))
+
+
+def due_emails(batch: int):
+    """
+    Returns emails due for delivery, oldest first.
+
+    :param batch: Max. emails returned
+    :return: List of OutboxEmail objects
+    """
+    return OutboxEmail.query.filter(OutboxEmail.due <= datetime.now()) \
+        .order_by(OutboxEmail.due, OutboxEmail.id).limit(batch).all()
+
+
+def claim(batch: int, lease: datetime):
+    """
+    Claims a batch of due emails before delivery, so that concurrent senders (background sender of each
+    deployment, send_outbox.py) never deliver the same email: their due time is moved to the lease expiration,
+    only if unchanged since read (else another sender claimed them first), and committed.
+    Emails of a sender dying mid-batch are due again when the lease expires.
+
+    :param batch: Max. emails claimed
+    :param lease: Lease expiration
+    :return: List of claimed OutboxEmail objects
+    """
+    claimed = []
+
+    for email in due_emails(batch):
+        if OutboxEmail.query.filter(OutboxEmail.id == email.id, OutboxEmail.due == email.due) \
+                .update({OutboxEmail.due: lease}, synchronize_session=False) == 1:
+            claimed.append(email)
+
+    uchan.commit()
+    return claimed
+
+
+def compose(email: OutboxEmail, sender: str):
+    """
+    Builds the message of an outbox email.
+
+    :param email:  OutboxEmail object
+    :param sender: Sender address
+    :return: EmailMessage object
+    """
+    message = EmailMessage()
+    message['From']       = sender
+    message['To']         = email.recipient
+    message['Subject']    = email.subject
+    message['Date']       = formatdate(localtime=True)
+    message['Message-ID'] = make_msgid('outbox{}'.format(email.id))
+    message.set_content(email.body)
+    return message
+
+
+def connect(config):
+    """
+    Opens an SMTP connection, with STARTTLS and login if configured.
+
+    :param config: Application configuration
+    :return: SMTP object
+    """
+    smtp = SMTP(config.get('MAIL_SERVER'), config.get('MAIL_PORT'), timeout=config.get('MAIL_TIMEOUT'))
+
+    try:
+        if config.get('MAIL_USE_TLS'):
+            smtp.starttls()
+        if config.get('MAIL_USERNAME') is not None:
+            smtp.login(config.get('MAIL_USERNAME'), config.get('MAIL_PASSWORD'))
+    except (OSError, SMTPException):
+        smtp.close()
+        raise
+
+    return smtp
+
+
+def delivered(email: OutboxEmail):
+    """
+    Marks an email as sent.
+
+    :param email: OutboxEmail object
+    :return: Nothing
+    """
+    email.sent  = datetime.now()
+    email.due   = None
+    email.error = None
+    metrics.inc('uchan_outbox_emails_total', (('result', 'sent'),))
+
+
+def failed(email: OutboxEmail, error: Exception):
+    """
+    Records a failed delivery attempt: the email is retried with exponential backoff
+    (MAIL_RETRY_DELAY, doubling every attempt), and given up after MAIL_MAX_ATTEMPTS attempts.
+
+    :param email: OutboxEmail object
+    :param error: Delivery error
+    :return: Nothing
+    """
+    config = uchan.app.config
+
+    email.attempts += 1
+    email.error     = '{}'.format(error)[:200]
+
+    if email.attempts >= config.get('MAIL_MAX_ATTEMPTS'):
+        email.due = None
+        uchan.app.logger.warning('Giving up email {0} to {1}: {2}'.format(email.id, email.recipient, email.error))
+        metrics.inc('uchan_outbox_emails_total', (('result', 'given_up'),))
+    else:
+        email.due = datetime.now() + timedelta(seconds=config.get('MAIL_RETRY_DELAY') * 2 ** (email.attempts - 1))
+        metrics.inc('uchan_outbox_emails_total', (('result', 'failed'),))
+
+
+def connection_lost(error: Exception):
+    """
+    Tells connection failures from rejected emails: SMTPException is an OSError subclass too.
+
+    :param error: Delivery error
+    :return: If the SMTP connection was lost
+    """
+    return isinstance(error, SMTPServerDisconnected) or not isinstance(error, SMTPException)
+
+
+def postpone(email: OutboxEmail, error: Exception):
+    """
+    Postpones an email after a connection failure (server unreachable, connection lost): it's retried after
+    MAIL_RETRY_DELAY, and it doesn't count as a delivery attempt.
+
+    :param email: OutboxEmail object
+    :param error: Connection error
+    :return: Nothing
+    """
+    email.due   = datetime.now() + timedelta(seconds=uchan.app.config.get('MAIL_RETRY_DELAY'))
+    email.error = '{}'.format(error)[:200]
+    metrics.inc('uchan_outbox_emails_total', (('result', 'postponed'),))
+
+
+def send_batch():
+    """
+    Delivers a batch of due emails (max. MAIL_BATCH) over a single SMTP connection, max. MAIL_RATE per second.
+    Emails are claimed for MAIL_LEASE seconds first (see claim()), and every delivery is committed on its own,
+    so that neither an interrupted batch nor a concurrent sender sends emails twice.
+
+    :return: Tuple of (sent, failed) emails
+    """
+    config = uchan.app.config
+    lease  = datetime.now() + timedelta(seconds=config.get('MAIL_LEASE'))
+    emails = claim(config.get('MAIL_BATCH'), lease)
+    sent   = 0
+
+    if len(emails) == 0:
+        return 0, 0
+
+    try:
+        smtp = connect(config)
+    except (OSError, SMTPException) as error:
+        # Server unreachable, the whole batch is retried later
+        for email in emails:
+            postpone(email, error)
+
+        uchan.commit()
+        return 0, len(emails)
+
+    interval = 1.0 / config.get('MAIL_RATE')
+
+    try:
+        for i, email in enumerate(emails):
+            start = monotonic()
+
+            if datetime.now() >= lease:
+                # Lease expired, remaining emails are due (and may be claimed by another sender)
+                return sent, i - sent
+
+            try:
+                smtp.send_message(compose(email, config.get('MAIL_SENDER')))
+            except (OSError, SMTPException) as error:
+                if not connection_lost(error):
+                    # Rejected recipient or message
+                    failed(email, error)
+                else:
+                    # Connection lost, remaining emails are due again
+                    postpone(email, error)
+
+                    for rest in emails[i + 1:]:
+                        rest.due = datetime.now()
+
+                    uchan.commit()
+                    return sent, i + 1 - sent
+            else:
+                delivered(email)
+                sent += 1
+
+            uchan.commit()
+            sleep(max(0.0, interval - (monotonic() - start)))
+    finally:
+        try:
+            smtp.quit()
+        except (OSError, SMTPException):
+            smtp.close()
+
+    return sent, len(emails) - sent
+
+
+def send_all():
+    """
+    Delivers every due email, batch after batch.
+
+    :return: Tuple of (sent, failed) emails
+    """
+    batch = uchan.app.config.get('MAIL_BATCH')
+    total_sent, total_failed = 0, 0
+
+    while True:
+        sent, failures = send_batch()
+        total_sent, total_failed = total_sent + sent, total_failed + failures
+
+        # Short batch: nothing else due (or server unreachable)
+        if sent + failures < batch or sent == 0:
+            return total_sent, total_failed
+
+
+def start_background(interval: float):
+    """
+    Starts outbox delivery as a background daemon thread: due emails are sent every 'interval' seconds.
+
+    :param interval: Seconds between runs
+    :return: Background thread
+    """
+    def loop():
+        while True:
+            with uchan.app.app_context():
+                try:
+                    send_all()
+                except Exception:
+                    uchan.app.logger.exception('Outbox delivery failed')
+                finally:
+                    uchan.db.session.remove()
+
+            sleep(interval)
+
+    worker = Worker(target=loop, name='outbox', daemon=True)
+    worker.start()
+    return worker
@@ -0,0 +1,106 @@
+from os import path, makedirs, getpid
+from time import perf_counter, strftime
+from random import random
+from cProfile import Profile
+# Flask related imports
+from flask import request, g
+from itsdangerous import TimestampSigner, BadSignature
+
+# Signed value of profiling tokens
+token_value = b'profile'
+
+
+def signer():
+    """
+    Returns profiling tokens signer, keyed with application SECRET_KEY.
+
+    :return: TimestampSigner object
+    """
+    return TimestampSigner(uchan.app.config.get('SECRET_KEY'), salt='uchan-profile')
+
+
+def new_token():
+    """
+    Returns a new profiling token, for the PROFILE_HEADER request header.
+
+    :return: Profiling token
+    """
+    return signer().sign(token_value).decode()
+
+
+def valid_token(token: str):
+    """
+    Checks a profiling token signature and age (see PROFILE_TOKEN_MAX_AGE).
+
+    :param token: Profiling token
+    :return: If token is valid
+    """
+    try:
+        return signer().unsign(token, max_age=uchan.app.config.get('PROFILE_TOKEN_MAX_AGE')) == token_value
+    except BadSignature:
+        return False
+
+
+def profile_started():
+    """
+    Starts profiling a sampled request (PROFILE_RATE), or a request carrying a valid profiling token.
+
+    :return: Nothing
+    """
+    token = request.headers.get(uchan.app.config.get('PROFILE_HEADER'))
+
+    if random() >= uchan.app.config.get('PROFILE_RATE') and (token is None or not valid_token(token)):
+        return
+
+    g.profiler      = Profile()
+    g.profile_start = perf_counter()
+    g.profiler.enable()
+
+
+def profile_finished(exception=None):
+    """
+    Stops profiling and writes request stats to PROFILE_FOLDER, named after resource method, duration,
+    time and worker process (e.g. 'BoardAPI.get-153ms-20160512T101500-4242.prof').
+
+    :param exception: Unhandled request exception
+    :return: Nothing
+    """
+    profiler = g.pop('profiler', None)
+
+    if profiler is None:
+        return
+
+    profiler.disable()
+
+    folder   = uchan.app.config.get('PROFILE_FOLDER')
+    duration = int((perf_counter() - g.pop('profile_start')) * 1000)
+    filename = '{0}-{1}ms-{2}-{3}.prof'.format(metrics.endpoint_name(), duration, strftime('%Y%m%dT%H%M%S'),
+                                               getpid())
+
+    try:
+        makedirs(folder, exist_ok=True)
+        profiler.dump_stats(path.join(folder, filename))
+    except OSError:
+        uchan.app.logger.exception('Cannot write request profile')
+
+
+def register(api):
+    """
+    Registers request profiling hooks, if PROFILE is set.
+    Nothing is registered otherwise, so disabled profiling has no overhead.
+
+    Only requests served by the WSGI app are profiled (not the ones served natively by Tornado handlers).
+    Stats files can be read with pstats or snakeviz.
+
+    :param api: Flask-RESTful Api object
+    :return: Nothing
+    """
+    if not api.app.config.get('PROFILE'):
+        return
+
+    api.app.before_request(profile_started)
+    api.app.teardown_request(profile_finished)
+
+# API related imports
+from server import uchan
+from server.common import metrics
@@ -0,0 +1,82 @@
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+from tornado.ioloop import IOLoop
+
+# Topic -> set of (callback, IOLoop) subscriptions
+subscribers      = {}
+subscribers_lock = Lock()
+
+# Database work of realtime handlers (chat sockets, thread events) runs here, never on the IOLoop
+executor = None
+
+
+def get_executor():
+    """
+    Returns realtime handlers thread pool, created on first use (after prefork).
+
+    :return: ThreadPoolExecutor object
+    """
+    global executor
+
+    if executor is None:
+        executor = ThreadPoolExecutor(max_workers=uchan.app.config.get('REALTIME_POOL_SIZE'))
+
+    return executor
+
+
+def thread_topic(thread_id: int):
+    """
+    Returns the topic of new posts in a thread.
+
+    :param thread_id: Thread ID
+    :return: Thread topic
+    """
+    return 'thread/{}'.format(thread_id)
+
+
+def subscribe(topic: str, callback):
+    """
+    Subscribes callback to topic.
+    Callback is always executed on the IOLoop of the subscribing thread.
+
+    :param topic:    Topic name
+    :param callback: Callable with a single data argument
+    :return: Nothing
+    """
+    with subscribers_lock:
+        subscribers.setdefault(topic, set()).add((callback, IOLoop.current()))
+
+
+def unsubscribe(topic: str, callback):
+    """
+    Unsubscribes callback from topic.
+
+    :param topic:    Topic name
+    :param callback: Subscribed callable
+    :return: Nothing
+    """
+    with subscribers_lock:
+        topic_subscribers = subscribers.get(topic, set())
+        topic_subscribers.difference_update({sub for sub in topic_subscribers if sub[0] == callback})
+
+        if not topic_subscribers:
+            subscribers.pop(topic, None)
+
+
+def publish(topic: str, data):
+    """
+    Publishes data to every topic subscriber, in this process.
+    Safe to call from any thread (e.g. WSGI handlers).
+
+    :param topic: Topic name
+    :param data:  Published data
+    :return: Nothing
+    """
+    with subscribers_lock:
+        topic_subscribers = list(subscribers.get(topic, ()))
+
+    for callback, loop in topic_subscribers:
+        loop.add_callback(callback, data)
+
+# API related imports
+from server import uchan
@@ -39,6 +39,8 @@ def client_error(code: int, details: str):
         error = 'Request Timeout'
     elif code == 409:
         error = 'Conflict'
+    elif code == 411:
+        error = 'Length Required'
     elif code == 401:
         error = 'Gone'
     elif code == 413:
@@ -47,6 +49,8 @@ def client_error(code: int, details: str):
         error = 'Unsupported Media Type'
     elif code == 422:
         error = 'Unprocessable Entity'
+    elif code == 429:
+        error = 'Too Many Requests'
     else:
         error = 'Client error'
 
@@ -1,24 +1,34 @@
 import re
 from uuid import uuid4
-from os import urandom, path
+from os import path
+from hmac import HMAC
 from hashlib import sha256
-from binascii import b2a_hex
-from base64 import b64encode, b64decode
-from crcmod.predefined import Crc
+from base64 import b64decode, urlsafe_b64encode
+
+# Keyed HMAC prototypes, by key: keying is done once, calculate_authid() only copies them
+authid_prototypes = {}
 
 
 def calculate_authid(tid: int, uid: int):
     """
-    Calculate anonymous authID from nickname and thread id.
+    Calculate anonymous authID from user and thread id: first 48 bits of HMAC-SHA256 of '<thread>:<user>',
+    keyed with AUTHID_KEY (required, see Uchan.configure()), Base64 URL-safe encoded (8 characters).
+    Being deterministic, it's computed at render time instead of being read from ThreadUser
+    (see Thread.keyed_authids).
 
     :param uid: Anonymous User ID
     :param tid: Thread ID
     :return: Anonymous authID
     """
-    rand  = str(b2a_hex(urandom(4)))[2:10]
-    crc16 = Crc('crc-16')
-    crc16.update((str(uid) + ":" + str(tid) + rand).encode('utf-8'))
-    return b64encode(crc16.hexdigest().encode('utf-8')).decode('utf-8')
+    key       = uchan.app.config.get('AUTHID_KEY')
+    prototype = authid_prototypes.get(key)
+
+    if prototype is None:
+        prototype = authid_prototypes[key] = HMAC(key.encode('utf-8'), digestmod=sha256)
+
+    mac = prototype.copy()
+    mac.update('{0}:{1}'.format(tid, uid).encode('utf-8'))
+    return urlsafe_b64encode(mac.digest()[:6]).decode('utf-8')
 
 
 def hashing_password(salt: str, password: str):
@@ -146,12 +156,14 @@ def get_user(user_id: int):
     return User.query.get(user_id)
 
 
-def get_request(thread, user):
+def get_request(thread, user, threadusers=None):
     """
     Get request URL from Thread and User author object.
+    ThreadUser IDs and authids can be passed if already loaded (see ThreadUser.get_ids()).
 
-    :param thread: Thread object
-    :param user:   User requested object
+    :param thread:      Thread object
+    :param user:        User requested object
+    :param threadusers: Dictionary of (Thread ID, User ID) -> (ThreadUser ID, authid)
     :return: Request URL (from endpoint) if exists, else None
     """
     if thread is None:
@@ -160,9 +172,13 @@ def get_request(thread, user):
     if user is None:
         raise ValueError('Invalid parameter: user')
 
-    threaduser = thread.get_threaduser(user.id)
+    if threadusers is not None:
+        threaduser = threadusers.get((thread.id, user.id), (None, None))[0]
+    else:
+        threaduser = thread.get_threaduser(user.id)
+        threaduser = threaduser.id if threaduser is not None else None
 
-    return 'chat/request/' + threaduser.id if threaduser is not None else None
+    return 'chat/request/{}'.format(threaduser) if threaduser is not None else None
 
 # API related imports
 from server import uchan
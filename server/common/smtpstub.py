@@ -0,0 +1,151 @@
+from threading import Thread as Worker, Lock
+from email import message_from_bytes
+from socketserver import ThreadingTCPServer, StreamRequestHandler
+
+
+class StubHandler(StreamRequestHandler):
+    """
+    SMTP session handler: accepts HELO/EHLO, MAIL, RCPT, DATA, RSET, NOOP and QUIT, without authentication or TLS.
+    """
+    def reply(self, code: int, text: str):
+        """
+        Sends a reply line.
+
+        :param code: SMTP reply code
+        :param text: Reply text
+        :return: Nothing
+        """
+        self.wfile.write('{0} {1}\r\n'.format(code, text).encode('utf-8'))
+
+    def read_data(self):
+        """
+        Reads message data, up to the lone dot line, removing dot stuffing.
+
+        :return: Message bytes (None if the connection dropped)
+        """
+        lines = []
+
+        while True:
+            line = self.rfile.readline()
+
+            if not line:
+                return None
+            if line in [b'.\r\n', b'.\n']:
+                return b''.join(lines)
+
+            lines.append(line[1:] if line.startswith(b'.') else line)
+
+    def handle(self):
+        """
+        Runs an SMTP session.
+
+        :return: Nothing
+        """
+        sender, recipients = None, []
+        self.reply(220, 'uChan SMTP stub')
+
+        while True:
+            line = self.rfile.readline()
+
+            if not line:
+                return
+
+            command, _, argument = line.decode('utf-8', 'replace').rstrip('\r\n').partition(' ')
+            command = command.upper()
+
+            if command in ['HELO', 'EHLO']:
+                self.reply(250, 'localhost')
+            elif command == 'MAIL':
+                sender, recipients = argument.partition(':')[2].strip('<> '), []
+                self.reply(250, 'OK')
+            elif command == 'RCPT':
+                recipient = argument.partition(':')[2].strip('<> ')
+
+                if recipient in self.server.refused:
+                    self.reply(550, 'Mailbox unavailable')
+                else:
+                    recipients.append(recipient)
+                    self.reply(250, 'OK')
+            elif command == 'DATA':
+                if sender is None or len(recipients) == 0:
+                    self.reply(503, 'Bad sequence of commands')
+                    continue
+
+                self.reply(354, 'End data with <CR><LF>.<CR><LF>')
+                data = self.read_data()
+
+                if data is None:
+                    return
+
+                self.server.deliver(sender, recipients, data)
+                sender, recipients = None, []
+                self.reply(250, 'OK')
+            elif command == 'RSET':
+                sender, recipients = None, []
+                self.reply(250, 'OK')
+            elif command == 'NOOP':
+                self.reply(250, 'OK')
+            elif command == 'QUIT':
+                self.reply(221, 'Bye')
+                return
+            else:
+                self.reply(502, 'Command not implemented')
+
+
+class StubSMTPServer(ThreadingTCPServer):
+    """
+    Local SMTP server stand-in, for development and tests (see smtp_stub.py): received messages are
+    kept in memory (and passed to an optional callback) instead of being delivered.
+    """
+    allow_reuse_address = True
+    daemon_threads      = True
+
+    def __init__(self, host='localhost', port=8025, callback=None):
+        """
+        Construct SMTP stub server, bound to host and port (port 0 picks a free one).
+
+        :param host:     Listening host
+        :param port:     Listening port
+        :param callback: Function called with every received (sender, recipients, message)
+        :return: New StubSMTPServer object
+        """
+        super().__init__((host, port), StubHandler)
+        self.messages = []
+        self.refused  = set()
+        self.callback = callback
+        self.lock     = Lock()
+
+    @property
+    def port(self):
+        """
+        Returns listening port.
+
+        :return: Port number
+        """
+        return self.server_address[1]
+
+    def deliver(self, sender: str, recipients: list, data: bytes):
+        """
+        Stores a received message.
+
+        :param sender:     Envelope sender
+        :param recipients: Envelope recipients
+        :param data:       Message bytes
+        :return: Nothing
+        """
+        message = message_from_bytes(data)
+
+        with self.lock:
+            self.messages.append((sender, recipients, message))
+
+        if self.callback is not None:
+            self.callback(sender, recipients, message)
+
+    def start(self):
+        """
+        Serves SMTP sessions on a background daemon thread.
+
+        :return: Self
+        """
+        Worker(target=self.serve_forever, name='smtp-stub', daemon=True).start()
+        return self
@@ -0,0 +1,154 @@
+import multiprocessing
+from os import path, makedirs, replace, remove
+from concurrent.futures import ProcessPoolExecutor, Future
+
+# Thumbnail format -> file extension
+extensions = {'JPEG': 'jpg', 'WEBP': 'webp'}
+
+# Process pool executor, lazily created (see get_executor())
+_executor = None
+
+
+def get_executor():
+    """
+    Returns the process pool used for thumbnail generation.
+    Pool is created on first use, so that it's never inherited by forked processes.
+
+    Workers are started by a forkserver (spawned where unavailable), never forked from the server: forking
+    while WSGI pool, realtime pool and background threads hold locks could deadlock the child.
+
+    :return: ProcessPoolExecutor object
+    """
+    global _executor
+
+    if _executor is None:
+        method    = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        _executor = ProcessPoolExecutor(max_workers=uchan.app.config.get('THUMBNAIL_WORKERS', 2),
+                                        mp_context=multiprocessing.get_context(method))
+
+    return _executor
+
+
+def thumbnail_name(image_name: str, fmt: str):
+    """
+    Returns thumbnail file name for specified image and format.
+
+    :param image_name: Original image name
+    :param fmt:        Thumbnail format (see extensions)
+    :return: Thumbnail file name
+    """
+    return image_name.rsplit('.', 1)[0] + '.' + extensions[fmt]
+
+
+def thumbnail_path(image_name: str, fmt: str):
+    """
+    Returns thumbnail file path for specified image and format.
+
+    :param image_name: Original image name
+    :param fmt:        Thumbnail format (see extensions)
+    :return: Thumbnail file path
+    """
+    return path.join(uchan.app.config.get('THUMBNAIL_FOLDER'), thumbnail_name(image_name, fmt))
+
+
+def generate_thumbnails(source: str, destinations: dict, size: tuple, quality: int):
+    """
+    Generates thumbnails for source image, one for each destination format.
+    Runs inside a process pool worker, so it must not touch application state.
+
+    Every thumbnail is written to a temporary file and then renamed, so a thumbnail path
+    either does not exist or contains a complete image.
+
+    :param source:       Original image path
+    :param destinations: Dictionary of format -> thumbnail path
+    :param size:         Thumbnail bounding box (width, height)
+    :param quality:      Encoding quality
+    :return: List of generated thumbnail paths
+    """
+    # Pillow is only needed by workers
+    from PIL import Image
+
+    generated = []
+
+    with Image.open(source) as image:
+        # Animated images are thumbnailed from their first frame
+        image.seek(0)
+        image = image.convert('RGB')
+        image.thumbnail(size)
+
+        for fmt, destination in destinations.items():
+            makedirs(path.dirname(destination), exist_ok=True)
+            temporary = destination + '.tmp'
+
+            try:
+                image.save(temporary, fmt, quality=quality)
+                replace(temporary, destination)
+                generated.append(destination)
+            except (IOError, OSError, KeyError):
+                if path.exists(temporary):
+                    remove(temporary)
+
+    return generated
+
+
+def log_failure(image_name: str):
+    """
+    Returns a done callback of a generation job, logging its failure (nobody waits for the job future).
+
+    :param image_name: Uploaded image name
+    :return: Callback function, taking the job Future object
+    """
+    def callback(future: Future):
+        if not future.cancelled() and future.exception() is not None:
+            uchan.app.logger.error('Thumbnail generation of {0} failed: {1!r}'.format(image_name, future.exception()))
+
+    return callback
+
+
+def submit(image_name: str, image_path: str):
+    """
+    Schedules thumbnails generation for a just uploaded image, outside the request thread.
+    Failures are logged (see log_failure()).
+
+    :param image_name: Uploaded image name
+    :param image_path: Uploaded image path
+    :return: Future object of generation job
+    """
+    destinations = {fmt: thumbnail_path(image_name, fmt) for fmt in uchan.app.config.get('THUMBNAIL_FORMATS')}
+
+    future = get_executor().submit(generate_thumbnails, image_path, destinations,
+                                   tuple(uchan.app.config.get('THUMBNAIL_SIZE')),
+                                   uchan.app.config.get('THUMBNAIL_QUALITY'))
+    future.add_done_callback(log_failure(image_name))
+    return future
+
+
+def find_thumbnail(image_name: str, accept: str):
+    """
+    Finds the best ready thumbnail for specified image.
+    WebP thumbnails are used only if client accepts them.
+
+    :param image_name: Original image name
+    :param accept:     Client Accept header value
+    :return: Thumbnail path if a thumbnail is ready, else None
+    """
+    others = [fmt for fmt in uchan.app.config.get('THUMBNAIL_FORMATS') if fmt != 'WEBP']
+
+    if accept is not None and 'image/webp' in accept:
+        formats = ['WEBP'] + others
+    else:
+        formats = others
+
+    for fmt in formats:
+        thumb = thumbnail_path(image_name, fmt)
+
+        if path.exists(thumb):
+            metrics.cache_lookup('thumbnail', True)
+            return thumb
+
+    metrics.cache_lookup('thumbnail', False)
+    return None
+
+# API related imports
+from server import uchan
+from server.common import metrics
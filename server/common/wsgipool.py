@@ -0,0 +1,139 @@
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+# Tornado related imports
+from tornado import httputil
+from tornado.wsgi import WSGIContainer
+from tornado.web import RequestHandler
+
+
+class PooledWSGIContainer(WSGIContainer):
+    """
+    WSGIContainer running WSGI calls on a bounded thread pool (its 'executor'), instead of the IOLoop thread,
+    so that a slow handler (database query, Base64 decoding...) does not block other connections.
+
+    Adds a bound on calls waiting for a free thread: requests exceeding 'queue' waiting calls are rejected
+    with 503 Service Unavailable. Pool metrics are kept for server.common.metrics and PoolStatsHandler.
+    """
+    def __init__(self, wsgi_application, workers: int, queue: int):
+        """
+        Construct pooled WSGI container.
+
+        :param wsgi_application: WSGI application
+        :param workers:          Thread pool size
+        :param queue:            Max. WSGI calls waiting for a free thread
+        :return: New PooledWSGIContainer object
+        """
+        super().__init__(self.call_application, executor=ThreadPoolExecutor(max_workers=workers))
+        self.application = wsgi_application
+        self.workers     = workers
+        self.queue       = queue
+        # Metrics
+        self.lock      = Lock()
+        self.queued    = 0
+        self.running   = 0
+        self.completed = 0
+        self.rejected  = 0
+
+    def stats(self):
+        """
+        Returns thread pool metrics.
+
+        :return: Dictionary with pool size, queue depth, running, completed and rejected calls
+        """
+        with self.lock:
+            return {
+                'workers':   self.workers,
+                'queued':    self.queued,
+                'running':   self.running,
+                'completed': self.completed,
+                'rejected':  self.rejected
+            }
+
+    def samples(self):
+        """
+        Returns thread pool metrics as samples for server.common.metrics.add_collector().
+
+        :return: List of (name, type, help, labels, value) tuples
+        """
+        stats = self.stats()
+
+        return [
+            ('uchan_wsgi_pool_workers', 'gauge', 'WSGI thread pool size', (), stats['workers']),
+            ('uchan_wsgi_pool_queued', 'gauge', 'WSGI calls waiting for a thread', (), stats['queued']),
+            ('uchan_wsgi_pool_running', 'gauge', 'WSGI calls running', (), stats['running']),
+            ('uchan_wsgi_pool_completed_total', 'counter', 'WSGI calls completed', (), stats['completed']),
+            ('uchan_wsgi_pool_rejected_total', 'counter', 'WSGI calls rejected (queue full)', (), stats['rejected'])
+        ]
+
+    def __call__(self, request: httputil.HTTPServerRequest):
+        """
+        Dispatches request to the thread pool, unless too many calls are already waiting for a thread.
+
+        :param request: Tornado HTTP request
+        :return: Nothing
+        """
+        with self.lock:
+            if self.queued >= self.queue:
+                self.rejected += 1
+                return self.reject(request)
+
+            self.queued += 1
+
+        return super().__call__(request)
+
+    def call_application(self, environ: dict, start_response):
+        """
+        Runs WSGI application, inside a pool thread.
+
+        :param environ:        WSGI environment
+        :param start_response: WSGI start_response callable
+        :return: WSGI application response
+        """
+        with self.lock:
+            self.queued  -= 1
+            self.running += 1
+
+        try:
+            return self.application(environ, start_response)
+        finally:
+            with self.lock:
+                self.running   -= 1
+                self.completed += 1
+
+    @staticmethod
+    def reject(request: httputil.HTTPServerRequest):
+        """
+        Answers 503 Service Unavailable, on the IOLoop.
+
+        :param request: Tornado HTTP request
+        :return: Nothing
+        """
+        body    = b'Service Unavailable'
+        headers = httputil.HTTPHeaders({'Content-Type': 'text/plain; charset=UTF-8', 'Content-Length': str(len(body))})
+
+        request.connection.write_headers(httputil.ResponseStartLine('HTTP/1.1', 503, 'Service Unavailable'), headers,
+                                         chunk=body if request.method != 'HEAD' else b'')
+        request.connection.finish()
+
+
+class PoolStatsHandler(RequestHandler):
+    """
+    Thread pool metrics (see PooledWSGIContainer.stats()), in JSON.
+    Only served if WSGI_POOL_STATUS is set, since it's not authenticated.
+    """
+    def initialize(self, container: PooledWSGIContainer):
+        """
+        Initializes handler with the monitored container.
+
+        :param container: PooledWSGIContainer object
+        :return: Nothing
+        """
+        self.container = container
+
+    def get(self):
+        """
+        GET method implementation for thread pool metrics.
+
+        :return: 200 OK - Thread pool metrics
+        """
+        self.write(self.container.stats())
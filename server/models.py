@@ -29,6 +29,7 @@ class User(db.Model):
     threads    = db.relationship('Thread', lazy='dynamic')
     # Need to fix this
     chats      = db.relationship('Chat', foreign_keys="Chat.user1", lazy='dynamic')
+    inbox      = db.relationship('ChatInbox', foreign_keys="ChatInbox.user", lazy='dynamic')
 
     def __init__(self, nickname: str, password: str, salt: str, university: int, email: str, gender: str,
                  activated: bool, token: str, admin=False):
@@ -102,28 +103,76 @@ class User(db.Model):
     def board_subscribed(self, bid: int):
         """
         Check if the user is subscribed to a certain board.
+        Activated users are implicitly subscribed to general boards (university.id = 1), unless they opted out:
+        only university boards subscriptions and opt-outs are stored as UserBoard rows.
 
         :param bid: Board ID
         :return: User subscription to Board
         """
-        return UserBoard.query.filter_by(user=self.id, board=bid).first() is not None
+        entry = next((ub for ub in self.boards if ub.board == bid), None)
+
+        if entry is not None:
+            return not entry.optout
+
+        board = Board.query.get(bid)
+        return bool(self.activated) and board is not None and board.university == 1
 
     def get_boards(self):
         """
-        Get user subscribed boards.
+        Get user subscribed boards: general boards (if activated, see board_subscribed()) and then
+        explicitly subscribed boards, with a single query.
 
         :return: List of all user subscribed boards
         """
-        return [Board.query.get(ub.board) for ub in self.boards]
+        subscribed = [ub.board for ub in self.boards if not ub.optout]
+        optouts    = [ub.board for ub in self.boards if ub.optout]
+        general    = db.and_(Board.university == 1, Board.id.notin_(optouts)) if self.activated else db.false()
+
+        return Board.query.filter(db.or_(general, Board.id.in_(subscribed))) \
+            .order_by(Board.university != 1, Board.id).all()
 
     def has_requested_chat(self, user: int):
-        return ChatRequest.query.filter_by(u_from=self.id, u_to=user).first() is not None
+        """
+        Checks if a chat request exists between this user and specified one, in either direction.
+
+        :param user: User ID
+        :return: If a chat request exists
+        """
+        return ChatRequest.between(self.id, user) is not None
 
     def get_requests(self):
-        return ChatRequest.query.filter_by(u_to=self.id, activated=False).all()
+        """
+        Returns pending chat requests sent to this user, with their sender and sender university name,
+        in a single query (pending requests partial index).
+
+        :return: List of (ChatRequest, sender User, sender University name)
+        """
+        return db.session.query(ChatRequest, User, University.name)\
+            .join(User, User.id == ChatRequest.u_from)\
+            .join(University, University.id == User.university)\
+            .filter(ChatRequest.u_to == self.id, ChatRequest.accepted.is_(False))\
+            .order_by(ChatRequest.id).all()
 
     def get_chats(self, page: int):
-        return self.chats.order_by(Chat.last.desc()).paginate(page, 10, False).items
+        """
+        Returns user chats inbox page, most recent first (index scan on chatinbox user, last).
+        Max. 10 chats per page.
+
+        :param page: Page list in pagination query
+        :return: ChatInbox list
+        """
+        return self.inbox.order_by(ChatInbox.last.desc()).paginate(page, 10, False).items
+
+    @staticmethod
+    def get_authors(ids):
+        """
+        Returns authors of a page of threads or posts, with their university name, in a single query.
+
+        :param ids: Author User IDs
+        :return: Dictionary of User ID -> (User, University name)
+        """
+        return {user.id: (user, name) for user, name in db.session.query(User, University.name)
+                .join(University, University.id == User.university).filter(User.id.in_(set(ids)))}
 
 
 class Moderator(db.Model):
@@ -299,19 +348,23 @@ class UserBoard(db.Model):
     __tablename__ = 'userboard'
 
     id = db.Column(db.Integer, primary_key=True)
-    user  = db.Column(db.Integer, db.ForeignKey('user.id'))
-    board = db.Column(db.Integer, db.ForeignKey('board.id'))
+    user   = db.Column(db.Integer, db.ForeignKey('user.id'))
+    board  = db.Column(db.Integer, db.ForeignKey('board.id'))
+    # General boards are implicit (see User.board_subscribed()), their rows are opt-outs
+    optout = db.Column(db.Boolean, default=False, nullable=False, server_default=db.false())
 
-    def __init__(self, user: int, board: int):
+    def __init__(self, user: int, board: int, optout=False):
         """
         Constructor for many-to-many relationship User-Board.
 
-        :param user:  Relationship user ID
-        :param board: Relationship board ID
+        :param user:   Relationship user ID
+        :param board:  Relationship board ID
+        :param optout: User opted out of this (general) board
         :return: UserBoard object
         """
-        self.user  = user
-        self.board = board
+        self.user   = user
+        self.board  = board
+        self.optout = optout
 
     def __repr__(self):
         """
@@ -342,6 +395,9 @@ class Thread(db.Model):
     # Placement related fields
     board   = db.Column(db.Integer, db.ForeignKey('board.id'))
     author  = db.Column(db.Integer, db.ForeignKey('user.id'))
+    # Authids computed at render time (see routines.calculate_authid()), instead of read from ThreadUser:
+    # older threads keep their stored (random) authids
+    keyed_authids = db.Column(db.Boolean, default=False)
     # Relationships
     posts   = db.relationship('Post', lazy='dynamic')
     users   = db.relationship('ThreadUser', lazy='dynamic')
@@ -370,6 +426,7 @@ class Thread(db.Model):
         # New object
         self.images  = 0
         self.replies = 0
+        self.keyed_authids = True
 
     def __repr__(self):
         """
@@ -387,12 +444,28 @@ class Thread(db.Model):
         """
         return 'media/' + self.image
 
-    def get_author_authid(self):
+    def get_thumbnail(self):
+        """
+        Returns thread image thumbnail.
+
+        :return: Thread image thumbnail route
+        """
+        return 'media/' + self.image + '?size=thumb'
+
+    def get_author_authid(self, threadusers=None):
         """
-        Returns author authid (first authid in the table entry)
+        Returns author authid: computed for keyed authids threads, else first authid in the table entry
+        (or in ThreadUser IDs and authids, if already loaded: see ThreadUser.get_ids()).
 
+        :param threadusers: Dictionary of (Thread ID, User ID) -> (ThreadUser ID, authid)
         :return: Author AuthID
         """
+        if self.keyed_authids:
+            return calculate_authid(self.id, self.author)
+
+        if threadusers is not None and (self.id, self.author) in threadusers:
+            return threadusers[(self.id, self.author)][1]
+
         return self.users.first().authid
 
     def get_authid(self, _user: int):
@@ -490,6 +563,31 @@ class ThreadUser(db.Model):
         """
         return '<Thread {0} - User {1} = UID {2}>'.format(self.thread, self.user, self.id)
 
+    @staticmethod
+    def get_ids(pairs):
+        """
+        Returns ThreadUser IDs and authids of a page of threads or posts authors (see routines.get_request(),
+        Thread.get_author_authid(), Post.get_authid()), in a single query.
+
+        :param pairs: (Thread ID, User ID) pairs
+        :return: Dictionary of (Thread ID, User ID) -> (first ThreadUser ID, its authid)
+        """
+        pairs, ids = set(pairs), {}
+
+        if len(pairs) == 0:
+            return ids
+
+        rows = db.session.query(ThreadUser.id, ThreadUser.thread, ThreadUser.user, ThreadUser.authid)\
+            .filter(ThreadUser.thread.in_({thread for thread, _ in pairs}),
+                    ThreadUser.user.in_({user for _, user in pairs}))\
+            .order_by(ThreadUser.id)
+
+        for id, thread, user, authid in rows:
+            if (thread, user) in pairs:
+                ids.setdefault((thread, user), (id, authid))
+
+        return ids
+
 
 class Post(db.Model):
     """
@@ -559,12 +657,32 @@ class Post(db.Model):
         """
         return 'media/' + self.image if self.image is not None else None
 
-    def get_authid(self):
+    def get_thumbnail(self):
         """
-        Returns poster authid.
+        Get post image thumbnail.
 
+        :return: Post image thumbnail route
+        """
+        return 'media/' + self.image + '?size=thumb' if self.image is not None else None
+
+    def get_authid(self, thread=None, threadusers=None):
+        """
+        Returns poster authid: computed for keyed authids threads, else read from thread table entry
+        (or from ThreadUser IDs and authids, if already loaded: see ThreadUser.get_ids()).
+
+        :param thread:      Thread parent object (queried if not specified)
+        :param threadusers: Dictionary of (Thread ID, User ID) -> (ThreadUser ID, authid)
         :return: Post author authid
         """
+        if thread is None:
+            thread = Thread.query.get(self.thread)
+
+        if thread.keyed_authids:
+            return calculate_authid(self.thread, self.author)
+
+        if threadusers is not None and (self.thread, self.author) in threadusers:
+            return threadusers[(self.thread, self.author)][1]
+
         return ThreadUser.query.filter_by(user=self.author, thread=self.thread).first().authid
 
 
@@ -575,16 +693,37 @@ class ChatRequest(db.Model):
     u_from   = db.Column(db.Integer, db.ForeignKey('user.id'))
     u_to     = db.Column(db.Integer, db.ForeignKey('user.id'))
     accepted = db.Column(db.Boolean)
+    # Unordered users pair, so that A -> B and B -> A requests conflict
+    u_low    = db.Column(db.Integer)
+    u_high   = db.Column(db.Integer)
+
+    # Pending requests queue is a partial index, accepted requests are left out
+    __table_args__ = (db.UniqueConstraint('u_low', 'u_high', name='uq_chatrequest_pair'),
+                      db.Index('ix_chatrequest_pending', 'u_to', 'id',
+                               sqlite_where=accepted.is_(False), postgresql_where=accepted.is_(False)))
 
     def __init__(self, user_from: int, user_to: int):
         self.u_from   = user_from
         self.u_to     = user_to
+        self.u_low    = min(user_from, user_to)
+        self.u_high   = max(user_from, user_to)
         self.accepted = False
         self.chat     = None
 
     def accept(self):
         self.accepted = True
 
+    @staticmethod
+    def between(user1: int, user2: int):
+        """
+        Returns chat request between two users, whoever sent it.
+
+        :param user1: User ID
+        :param user2: User ID
+        :return: ChatRequest object if exists, else None
+        """
+        return ChatRequest.query.filter_by(u_low=min(user1, user2), u_high=max(user1, user2)).first()
+
 
 class Chat(db.Model):
     __tablename__ = 'chat'
@@ -593,22 +732,171 @@ class Chat(db.Model):
     user1    = db.Column(db.Integer, db.ForeignKey('user.id'))
     user2    = db.Column(db.Integer, db.ForeignKey('user.id'))
     last     = db.Column(db.DateTime)
+    # Sequence number of last message sent in this chat
+    seq      = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     messages = db.relationship('Message', lazy='dynamic')
 
     def __init__(self, user1: int, user2: int):
         self.user1 = user1
         self.user2 = user2
         self.last  = datetime.now()
+        self.seq   = 0
 
     def get_messages(self, page: int):
         return self.messages.order_by(Message.sent.desc()).paginate(page, 20, False).items
 
+    def get_messages_since(self, seq: int, limit=100):
+        """
+        Returns messages newer than specified sequence number, oldest first (index range scan on chat, seq).
+
+        :param seq:   Last sequence number known by client
+        :param limit: Max. messages returned
+        :return: Messages list
+        """
+        return self.messages.filter(Message.seq > seq).order_by(Message.seq).limit(limit).all()
+
+    def other(self, user: int):
+        """
+        Returns the other chat participant.
+
+        :param user: Chat participant User ID
+        :return: Other participant User ID
+        """
+        return self.user1 if self.user2 == user else self.user2
+
+    def has_user(self, user: int):
+        """
+        Checks if specified user is a chat participant.
+
+        :param user: User ID
+        :return: If user is a participant of this chat
+        """
+        return user in [self.user1, self.user2]
+
+    def add_message(self, mfrom: int, text: str, image=None):
+        """
+        Adds new message to this chat, sent by one of the participants to the other one.
+        Does not commit.
+
+        Chat sequence number and last message time are updated with a single atomic UPDATE,
+        so concurrent senders always get distinct, increasing sequence numbers.
+
+        :param mfrom: Sender User ID
+        :param text:  Message text
+        :param image: Message image
+        :return: New Message object
+        """
+        message = Message(self.id, mfrom, self.other(mfrom), text, image)
+
+        Chat.query.filter_by(id=self.id)\
+            .update({Chat.seq: db.func.coalesce(Chat.seq, 0) + 1, Chat.last: message.sent},
+                    synchronize_session=False)
+        message.seq = db.session.query(Chat.seq).filter_by(id=self.id).scalar()
+        db.session.expire(self, ['seq', 'last'])
+
+        # Move chat on top of both participants inbox, and count it as unread for recipient
+        ChatInbox.query.filter_by(chat=self.id)\
+            .update({ChatInbox.last: message.sent, ChatInbox.seq: message.seq}, synchronize_session=False)
+        ChatInbox.query.filter_by(chat=self.id, user=message.u_to)\
+            .update({ChatInbox.unread: ChatInbox.unread + 1}, synchronize_session=False)
+
+        db.session.add(message)
+        return message
+
+
+class ChatInbox(db.Model):
+    """
+    Denormalized chat participant inbox: one entry per chat participant, ordered by last message,
+    with unread messages counter and a summary of the other participant.
+    A user inbox page is a single index scan on (user, last).
+    """
+    __tablename__ = 'chatinbox'
+    __table_args__ = (db.Index('ix_chatinbox_user_last', 'user', 'last'),
+                      db.UniqueConstraint('user', 'chat'))
+
+    id = db.Column(db.Integer, primary_key=True)
+    user   = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    chat   = db.Column(db.Integer, db.ForeignKey('chat.id'), nullable=False)
+    last   = db.Column(db.DateTime)
+    seq    = db.Column(db.Integer, nullable=False)
+    unread = db.Column(db.Integer, nullable=False)
+    # Other participant summary
+    other            = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    other_nickname   = db.Column(db.String(20))
+    other_university = db.Column(db.String(30))
+    other_gender     = db.Column(db.Boolean)
+    other_profilepic = db.Column(db.String(36))
+
+    def __init__(self, chat: Chat, user: User, other: User):
+        """
+        Construct inbox entry of a chat for one of its participants.
+
+        :param chat:  Chat object
+        :param user:  Inbox owner User object
+        :param other: Other participant User object
+        :return: New ChatInbox object
+        """
+        self.user   = user.id
+        self.chat   = chat.id
+        self.last   = chat.last
+        self.seq    = chat.seq
+        self.unread = 0
+        self.other            = other.id
+        self.other_nickname   = other.nickname
+        self.other_university = University.query.get(other.university).name
+        self.other_gender     = other.gender
+        self.other_profilepic = other.profilepic
+
+    def __repr__(self):
+        """
+        ChatInbox representation for interactive mode.
+
+        :return: ChatInbox object representation
+        """
+        return '<ChatInbox {0} - Chat {1}: {2} unread>'.format(self.user, self.chat, self.unread)
+
+    @staticmethod
+    def add_chat(chat: Chat):
+        """
+        Adds inbox entries of a new chat, for both participants.
+        Chat needs to be flushed first (chat.id is required). Does not commit.
+
+        :param chat: New Chat object
+        :return: Nothing
+        """
+        user1, user2 = User.query.get(chat.user1), User.query.get(chat.user2)
+
+        db.session.add(ChatInbox(chat, user1, user2))
+        db.session.add(ChatInbox(chat, user2, user1))
+
+    @staticmethod
+    def mark_read(chat: int, user: int):
+        """
+        Resets unread messages counter of a chat in user inbox, if not already read. Does not commit.
+
+        :param chat: Chat ID
+        :param user: User ID
+        :return: Nothing
+        """
+        ChatInbox.query.filter(ChatInbox.chat == chat, ChatInbox.user == user, ChatInbox.unread > 0)\
+            .update({ChatInbox.unread: 0}, synchronize_session=False)
+
+    def get_gender(self):
+        """
+        Returns other participant gender.
+
+        :return: 'm' if other participant is male, 'f' if female
+        """
+        return 'f' if self.other_gender else 'm'
+
 
 class Message(db.Model):
     __tablename__ = 'message'
+    __table_args__ = (db.Index('ix_message_chat_seq', 'chat', 'seq', unique=True),)
 
     id = db.Column(db.Integer, primary_key=True)
     chat   = db.Column(db.Integer, db.ForeignKey('chat.id'))
+    seq    = db.Column(db.Integer)
     u_from = db.Column(db.Integer, db.ForeignKey('user.id'))
     u_to   = db.Column(db.Integer, db.ForeignKey('user.id'))
     text   = db.Column(db.String(1250), nullable=False)
@@ -616,9 +904,57 @@ class Message(db.Model):
     sent   = db.Column(db.DateTime)
 
     def __init__(self, chat: int, mfrom: int, mto: int, text: str, image=None):
-        self.chat  = chat
-        self.mfrom = mfrom
-        self.mto   = mto
-        self.text  = text
-        self.image = image
-        self.sent  = datetime.now()
+        self.chat   = chat
+        self.u_from = mfrom
+        self.u_to   = mto
+        self.text   = text
+        self.image  = image
+        self.sent   = datetime.now()
+
+
+class OutboxEmail(db.Model):
+    """
+    Model for outgoing emails, queued by requests and delivered by a background sender (see server.common.outbox).
+    """
+    __tablename__ = 'outbox'
+
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(100), nullable=False)
+    subject   = db.Column(db.String(100), nullable=False)
+    body      = db.Column(db.Text, nullable=False)
+    created   = db.Column(db.DateTime)
+    attempts  = db.Column(db.Integer, default=0, nullable=False)
+    # Next delivery attempt, None once sent or given up
+    due       = db.Column(db.DateTime)
+    sent      = db.Column(db.DateTime)
+    error     = db.Column(db.String(200))
+
+    # Delivery queue is a partial index, sent and given up emails are left out
+    __table_args__ = (db.Index('ix_outbox_due', 'due', 'id',
+                               sqlite_where=due.isnot(None), postgresql_where=due.isnot(None)),)
+
+    def __init__(self, recipient: str, subject: str, body: str):
+        """
+        Constructor for outbox entry table.
+
+        :param recipient: Recipient email address
+        :param subject:   Email subject
+        :param body:      Email plain text body
+        :return: OutboxEmail object
+        """
+        self.recipient = recipient
+        self.subject   = subject
+        self.body      = body
+        self.created   = datetime.now()
+        self.attempts  = 0
+        self.due       = self.created
+        self.sent      = None
+        self.error     = None
+
+    def __repr__(self):
+        """
+        OutboxEmail representation for interactive mode.
+
+        :return: OutboxEmail object representation
+        """
+        return '<OutboxEmail {0} - {1}>'.format(self.id, self.recipient)
@@ -0,0 +1,28 @@
+#!flask/bin/python
+from sys import argv
+from server.common.smtpstub import StubSMTPServer
+
+help = """
+    Usage: smtp_stub.py [port]
+
+    Local SMTP server stand-in (default port 8025, see MAIL_PORT of development and testing configurations):
+    received emails are printed instead of being delivered.
+"""
+
+
+def show(sender: str, recipients: list, message):
+    print('From {0} to {1}: {2}'.format(sender, ', '.join(recipients), message['Subject']))
+    print(message.get_payload(decode=True).decode('utf-8', 'replace'))
+
+
+if __name__ == '__main__' and len(argv) <= 2 and all(arg.isdigit() for arg in argv[1:]):
+    server = StubSMTPServer(port=int(argv[1]) if len(argv) == 2 else 8025, callback=show)
+    print('SMTP stub listening on port {}'.format(server.port))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+else:
+    print(help)
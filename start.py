@@ -1,9 +1,21 @@
 #!flask/bin/python
 import sys
-from server import uchan
+from server import create_app
+
+# Configuration from UCHAN_CONFIG environment variable (default: DevelopmentConfig)
+uchan = create_app()
+
+help = """
+    Usage: start.py [port]                      Development server (Flask builtin)
+           start.py [port] deploy [workers]     Deployment server (Tornado), 'workers' processes
+                                                (default 1 = single process, 0 = CPU count; more than one
+                                                process breaks real-time chat and thread events)
+"""
 
 if __name__ == '__main__':
-    if len(sys.argv) != 2:
-        print("Error: start.py [port]")
-    else:
+    if len(sys.argv) == 2:
         uchan.development_start(int(sys.argv[1]))
+    elif len(sys.argv) in [3, 4] and sys.argv[2] == 'deploy':
+        uchan.deployment_start(int(sys.argv[1]), int(sys.argv[3]) if len(sys.argv) == 4 else 1)
+    else:
+        print(help)
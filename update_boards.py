@@ -1,7 +1,10 @@
 #!flask/bin/python
 from sys import argv
-from server import uchan
-from server.models import User, Board, UserBoard
+from server import create_app
+from server.models import Board
+
+# Database and models only, API resources are not needed
+uchan = create_app(resources=False)
 
 help = """
     Usage: update_boards.py [memo board] [name board]
@@ -11,13 +14,8 @@ if __name__ == '__main__' and len(argv) == 3:
     memo = argv[1]
     name = argv[2]
 
+    # Activated users are implicitly subscribed to general boards (see User.board_subscribed())
     uchan.add_to_db(Board(memo, name, 1))
-    board = Board.query.order_by(Board.id.desc()).first()
-
-    for user in User.query.all():
-        uchan.add_to_db(UserBoard(user.id, board.id), False)
-
-    uchan.commit()
 
 else:
     print(help)